@@ -0,0 +1,498 @@
+"""
+Domain decomposition: one periodic world split across worker processes.
+
+The world is cut into vertical strips of equal width, one per worker
+process. Every worker owns the particles inside its strip; their arrays
+live in `multiprocessing.shared_memory` blocks, so neighbours and the
+parent read them without copies through pipes. A step on a worker:
+
+    1. barrier, then copy the halo: the particles of the two neighbour
+       strips that can come within the interaction radius of this strip
+    2. barrier (nobody reads the owned arrays any more), then one step of
+       the usual kernel on own + halo particles, keep the own results
+    3. particles that left the strip go to the outbox, barrier, and every
+       worker takes in the outbox entries addressed to it
+
+The force on an owned particle sees every neighbour within its radius,
+the integrator and the jitter stream (per particle id and step) are the
+ones of ParticleSystem, so the physics is that of update_system. With
+config.deterministic the local arrays are put in id order before the step,
+which makes the summation order, and so the result, bit identical to a
+ParticleSystem whose arrays are in id order (sort_interval = 0).
+
+Not across workers: sleeping, adaptive dt, Verlet lists, the hashed grid
+and grid tuning (each worker uses the fixed grid of radius * 0.6).
+
+Workers are started with the "spawn" method, so scripts must create the
+system under `if __name__ == "__main__":`.
+
+    with DistributedSystem.from_system(system, workers=8) as world:
+        world.step_n(1000, 0.05)
+        state = world.snapshot()
+"""
+from multiprocessing import get_context
+from multiprocessing.shared_memory import SharedMemory
+from typing import Dict, List
+import os
+import traceback
+import numpy as np
+from simulation_config import SimulationConfig
+from force_profiles import tabulate
+from particle_system import ParticleSystem, substep_count, step_factors
+from kernels import NUMBA_OK, EULER, VELOCITY_VERLET, grid_geometry, integrator_id, precision_dtype
+from numpy_engine import compute_forces_numpy, step_numpy
+
+if NUMBA_OK:
+    from kernels import compute_forces_numba, step_numba
+
+# per-particle fields in the shared blocks: (name, dtype or None = precision dtype)
+FIELDS = (("x", None), ("y", None), ("vx", None), ("vy", None), ("fx", None), ("fy", None),
+          ("type", np.int32), ("id", np.int64))
+# outbox entries carry the worker they move to
+OUTBOX_FIELDS = FIELDS + (("dest", np.int32),)
+# seconds between liveness checks of the workers while the parent waits
+POLL_INTERVAL = 0.5
+
+
+def _layout(fields: tuple, capacity: int, dtype) -> tuple:
+    """(name, dtype, byte offset) of every field and the total size, 8-byte aligned."""
+    offset = 0
+    entries = []
+    for name, field_dtype in fields:
+        field_dtype = np.dtype(dtype if field_dtype is None else field_dtype)
+        entries.append((name, field_dtype, offset))
+        offset += -(-capacity * field_dtype.itemsize // 8) * 8
+    return entries, max(offset, 8)
+
+
+def _field_arrays(shm: SharedMemory, fields: tuple, capacity: int, dtype) -> Dict[str, np.ndarray]:
+    """Named array views on a shared block laid out by _layout."""
+    entries, _ = _layout(fields, capacity, dtype)
+    return {name: np.ndarray(capacity, dtype=field_dtype, buffer=shm.buf, offset=offset)
+            for name, field_dtype, offset in entries}
+
+
+def _strip_distance(xs: np.ndarray, x0: float, x1: float, width: float) -> np.ndarray:
+    """Periodic distance along x from every xs to the strip [x0, x1)."""
+    center = 0.5 * (x0 + x1)
+    dx = (xs - center + 0.5 * width) % width - 0.5 * width
+    return np.maximum(np.abs(dx) - 0.5 * (x1 - x0), 0.0)
+
+
+def _drift(vx: np.ndarray, fx: np.ndarray, dt: float, method: int) -> np.ndarray:
+    """How far along x the integrator moves particles before the forces are taken."""
+    if method == EULER:
+        return np.zeros(vx.shape[0])
+    if method == VELOCITY_VERLET:
+        return np.abs(vx + fx * (0.5 * dt)) * dt
+    return np.abs(vx) * (0.5 * dt)
+
+
+class _Worker:
+    """One strip of the world: runs in its own process (see _worker_main)."""
+
+    def __init__(self, rank: int, workers: int, names: List[str], capacity: int, precision: str,
+                 width: float, height: float, barrier):
+        self.rank = rank
+        self.workers = workers
+        self.capacity = capacity
+        self.dtype = precision_dtype(precision)
+        self.width = width
+        self.height = height
+        self.barrier = barrier
+        self.blocks = [SharedMemory(name=name) for name in names]
+        self.control = np.ndarray((2, workers), dtype=np.int64, buffer=self.blocks[0].buf)
+        self.owned = [_field_arrays(self.blocks[1 + w], FIELDS, capacity, self.dtype) for w in range(workers)]
+        self.outboxes = [_field_arrays(self.blocks[1 + workers + w], OUTBOX_FIELDS, capacity, self.dtype)
+                         for w in range(workers)]
+        self.strip = width / workers
+        self.x0 = rank * self.strip
+        self.x1 = (rank + 1) * self.strip
+        # with two workers both sides are the same neighbour
+        self.neighbours = sorted({(rank - 1) % workers, (rank + 1) % workers} - {rank})
+        self.params = None
+        self.grid = None
+        self.grid_key = None
+        self.work = None
+
+    def close(self):
+        # the views must go before the blocks can be closed
+        self.control = self.owned = self.outboxes = None
+        for block in self.blocks:
+            block.close()
+
+    def run(self, conn):
+        """Serves the parent's commands until "stop"."""
+        while True:
+            message = conn.recv()
+            if message[0] == "stop":
+                return
+            if message[0] == "params":
+                self.params = message[1]
+            else:
+                _, steps, start = message
+                if self.params["prime"]:
+                    self.prime_forces()
+                for k in range(steps):
+                    self.step(start + k)
+            conn.send(("ok",))
+
+    def _local_state(self) -> tuple:
+        """Own particles followed by the halo, as fresh arrays, and the own count."""
+        p = self.params
+        n = int(self.control[0, self.rank])
+        own = self.owned[self.rank]
+        search = p["search"]
+        if search <= 0.0 or not self.neighbours:
+            return {name: own[name][:n].copy() for name, _ in FIELDS}, n
+        # a halo particle is needed if, after the drift of both, it can be
+        # within the search radius of some own particle
+        reach = search + float(_drift(own["vx"][:n], own["fx"][:n], p["dt"], p["method"]).max(initial=0.0))
+        reach += 1e-3 * search
+        parts = [{name: own[name][:n] for name, _ in FIELDS}]
+        for w in self.neighbours:
+            other = self.owned[w]
+            m = int(self.control[0, w])
+            xs = other["x"][:m]
+            limit = reach + _drift(other["vx"][:m], other["fx"][:m], p["dt"], p["method"])
+            # beyond one strip the halo would reach past the neighbours (the slack aside)
+            if float(limit.max(initial=0.0)) > self.strip + 1e-3 * search:
+                raise RuntimeError("Strips are narrower than the interaction radius: use fewer workers")
+            take = _strip_distance(xs, self.x0, self.x1, self.width) <= limit
+            parts.append({name: other[name][:m][take] for name, _ in FIELDS})
+        return {name: np.concatenate([part[name] for part in parts]) for name, _ in FIELDS}, n
+
+    def _prepare(self, local: Dict[str, np.ndarray], n: int) -> tuple:
+        """Puts the local arrays in id order when deterministic, returns them and the own mask."""
+        own = np.zeros(local["x"].shape[0], dtype=bool)
+        own[:n] = True
+        if self.params["deterministic"]:
+            order = np.argsort(local["id"], kind="stable")
+            local = {name: values[order] for name, values in local.items()}
+            own = own[order]
+        search = self.params["search"]
+        key = (search,)
+        if key != self.grid_key:
+            cell_size = search * 0.6 if search > 0.0 else max(self.width, self.height)
+            self.grid = grid_geometry(self.width, self.height, search, cell_size)
+            self.grid_key = key
+        return local, own
+
+    def _buffers(self, count: int) -> tuple:
+        """Grid work buffers (cell_of, cell_start, cell_items, calm) for `count` local particles, reused."""
+        ncell = self.grid.nx * self.grid.ny
+        if self.work is None or self.work[0].shape[0] < count or self.work[1].shape[0] < ncell + 1:
+            capacity = max(count, 2 * self.work[0].shape[0]) if self.work is not None else count
+            self.work = (np.empty(capacity, dtype=np.int32), np.empty(ncell + 1, dtype=np.int32),
+                         np.empty(capacity, dtype=np.int32), np.zeros(capacity, dtype=np.int32))
+        return self.work
+
+    def prime_forces(self):
+        """Forces of the current positions for the owned particles (velocity Verlet start)."""
+        self.barrier.wait()
+        local, n = self._local_state()
+        self.barrier.wait()
+        local, own = self._prepare(local, n)
+        p = self.params
+        grid = self.grid
+        if NUMBA_OK:
+            cell_of, cell_start, cell_items, calm = self._buffers(local["x"].shape[0])
+            compute_forces_numba(
+                local["x"], local["y"], local["type"], p["table"], local["fx"], local["fy"],
+                cell_of, cell_start, cell_items, grid.stencil, False,
+                grid.nx, grid.ny, grid.inv_cw, grid.inv_ch, p["radii"], self.width, self.height, calm, 0,
+            )
+        else:
+            compute_forces_numpy(local["x"], local["y"], local["type"], p["table"], local["fx"], local["fy"],
+                                 grid, p["radii"], self.width, self.height)
+        mine = self.owned[self.rank]
+        mine["fx"][:n] = local["fx"][own]
+        mine["fy"][:n] = local["fy"][own]
+
+    def step(self, step: int):
+        p = self.params
+        self.barrier.wait()
+        local, n = self._local_state()
+        # everybody has its halo: the owned arrays may change now
+        self.barrier.wait()
+        local, own = self._prepare(local, n)
+        grid = self.grid
+        if NUMBA_OK:
+            cell_of, cell_start, cell_items, calm = self._buffers(local["x"].shape[0])
+            half_shell = p["half_shell"]
+            step_numba(
+                local["x"], local["y"], local["vx"], local["vy"], local["type"], p["table"],
+                local["fx"], local["fy"], cell_of, cell_start, cell_items,
+                grid.half_stencil if half_shell else grid.stencil, half_shell,
+                grid.nx, grid.ny, grid.inv_cw, grid.inv_ch, p["radii"], self.width, self.height,
+                p["dt"], p["damp"], p["rm"], p["max_velocity"], p["method"], calm, (0, 0.0, 0.0),
+                local["id"], (p["seed"], step),
+            )
+        else:
+            step_numpy(
+                local["x"], local["y"], local["vx"], local["vy"], local["type"], p["table"],
+                local["fx"], local["fy"], grid, p["radii"], self.width, self.height,
+                p["dt"], p["damp"], p["rm"], p["max_velocity"], p["method"],
+                local["id"], (p["seed"], step),
+            )
+        self._migrate({name: values[own] for name, values in local.items()})
+        self.barrier.wait()
+        self._take_in()
+
+    def _migrate(self, result: Dict[str, np.ndarray]):
+        """Keeps the particles still in the strip, puts the others in the outbox."""
+        dest = np.minimum((result["x"] / self.strip).astype(np.int64), self.workers - 1).astype(np.int32)
+        leave = dest != self.rank
+        stay = ~leave
+        mine = self.owned[self.rank]
+        outbox = self.outboxes[self.rank]
+        kept = int(stay.sum())
+        moved = result["x"].shape[0] - kept
+        for name, _ in FIELDS:
+            mine[name][:kept] = result[name][stay]
+            outbox[name][:moved] = result[name][leave]
+        outbox["dest"][:moved] = dest[leave]
+        self.control[0, self.rank] = kept
+        self.control[1, self.rank] = moved
+
+    def _take_in(self):
+        """Appends the outbox entries of all workers that are addressed to this one."""
+        mine = self.owned[self.rank]
+        n = int(self.control[0, self.rank])
+        for w in range(self.workers):
+            moved = int(self.control[1, w])
+            if w == self.rank or moved == 0:
+                continue
+            outbox = self.outboxes[w]
+            take = outbox["dest"][:moved] == self.rank
+            count = int(take.sum())
+            for name, _ in FIELDS:
+                mine[name][n:n + count] = outbox[name][:moved][take]
+            n += count
+        # nobody reads this count before the next step's first barrier
+        self.control[0, self.rank] = n
+
+
+def _worker_main(rank: int, workers: int, names: List[str], capacity: int, precision: str,
+                 width: float, height: float, barrier, conn):
+    worker = _Worker(rank, workers, names, capacity, precision, width, height, barrier)
+    try:
+        worker.run(conn)
+    except Exception:
+        # wake the others from the barrier, they stop with BrokenBarrierError
+        barrier.abort()
+        conn.send(("error", traceback.format_exc()))
+    finally:
+        worker.close()
+        conn.close()
+
+
+class DistributedSystem:
+    """
+    A ParticleSystem split into vertical strips, one worker process each,
+    with the particle arrays in shared memory (see the module docstring).
+
+    Attributes:
+    ---------------------------------------
+    config: SimulationConfig
+        Shared configuration; changes apply from the next step_n call
+
+    workers: int
+        Number of worker processes (= strips)
+
+    step_count: int
+        Steps taken so far (the jitter stream position)
+    """
+
+    def __init__(self, config: SimulationConfig, width: int, height: int, state: Dict[str, np.ndarray],
+                 workers: int = 0, noise_seed: int = None, step: int = 0):
+        """
+        Starts `workers` processes (0 = one per CPU) for the particles in
+        state ("x", "y", "vx", "vy", "type" and optionally "id" arrays, as
+        from ParticleSystem.step_n snapshots). noise_seed keys the jitter
+        stream (default: drawn from config.seed like ParticleSystem), step
+        is the step number the run continues from.
+        """
+        workers = int(workers) if workers > 0 else (os.cpu_count() or 1)
+        search = float(config.radius_matrix().max(initial=0.0))
+        if width / workers < search:
+            raise ValueError("Strips are narrower than the interaction radius: use fewer workers")
+        self.config = config
+        self.width = width
+        self.height = height
+        self.workers = workers
+        self.step_count = int(step)
+        self.dtype = precision_dtype(config.precision)
+        if noise_seed is None:
+            noise_seed = int(np.random.default_rng(config.seed).integers(0, 2 ** 63 - 1))
+        self.noise_seed = int(noise_seed)
+        self._params_key = None
+        self._table = None
+        self._table_key = None
+        self._forces_key = None
+
+        xs = np.asarray(state["x"], dtype=self.dtype)
+        n = xs.shape[0]
+        ids = np.asarray(state["id"], dtype=np.int64) if "id" in state else np.arange(n, dtype=np.int64)
+        # every worker can hold all particles; untouched pages of the
+        # blocks are never allocated, so this costs only what is used
+        self.capacity = max(n, 1)
+        self._blocks = [SharedMemory(create=True, size=2 * workers * 8)]
+        self._blocks += [SharedMemory(create=True, size=_layout(FIELDS, self.capacity, self.dtype)[1])
+                         for _ in range(workers)]
+        self._blocks += [SharedMemory(create=True, size=_layout(OUTBOX_FIELDS, self.capacity, self.dtype)[1])
+                         for _ in range(workers)]
+        self._control = np.ndarray((2, workers), dtype=np.int64, buffer=self._blocks[0].buf)
+        self._owned = [_field_arrays(self._blocks[1 + w], FIELDS, self.capacity, self.dtype) for w in range(workers)]
+
+        values = {"x": xs, "y": state["y"], "vx": state["vx"], "vy": state["vy"],
+                  "fx": np.zeros(n), "fy": np.zeros(n), "type": state["type"], "id": ids}
+        owner = np.minimum((xs / (width / workers)).astype(np.int64), workers - 1)
+        self._control[:] = 0
+        for w in range(workers):
+            take = owner == w
+            count = int(take.sum())
+            for name, _ in FIELDS:
+                self._owned[w][name][:count] = np.asarray(values[name])[take]
+            self._control[0, w] = count
+
+        context = get_context("spawn")
+        self._barrier = context.Barrier(workers)
+        self._conns = []
+        self._processes = []
+        names = [block.name for block in self._blocks]
+        for rank in range(workers):
+            parent_end, child_end = context.Pipe()
+            process = context.Process(
+                target=_worker_main, daemon=True,
+                args=(rank, workers, names, self.capacity, config.precision,
+                      float(width), float(height), self._barrier, child_end),
+            )
+            process.start()
+            child_end.close()
+            self._conns.append(parent_end)
+            self._processes.append(process)
+        self._closed = False
+
+    @classmethod
+    def from_system(cls, system: ParticleSystem, workers: int = 0) -> "DistributedSystem":
+        """Continues `system` (state, jitter stream, step count) on `workers` processes."""
+        seed, step = system.noise_state()
+        return cls(system.config, system.width, system.height, system.snapshot(), workers,
+                   noise_seed=seed, step=step)
+
+    def __len__(self) -> int:
+        return int(self._control[0].sum())
+
+    def __enter__(self) -> "DistributedSystem":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def worker_counts(self) -> np.ndarray:
+        """How many particles every worker owns right now."""
+        return self._control[0].copy()
+
+    def update_system(self, dt: float):
+        """One step of size dt on all workers (fixed dt, see the module docstring)."""
+        self.step_n(1, dt)
+
+    def step_n(self, steps: int, dt: float):
+        """
+        Advances the world by `steps` steps of size dt (split into
+        substeps like ParticleSystem.step_n); the workers run them without
+        coming back to the parent.
+        """
+        if self._closed:
+            raise RuntimeError("The distributed system is closed")
+        config = self.config
+        sub = substep_count(config, dt)
+        h = dt / sub
+        steps = int(steps) * sub
+        if steps <= 0:
+            return
+        params = self._params(h)
+        prime = params["method"] == VELOCITY_VERLET and self._forces_key != self._params_key
+        self._send(("params", dict(params, prime=prime)))
+        self._send(("step", steps, self.step_count))
+        self.step_count += steps
+        self._forces_key = self._params_key if params["method"] == VELOCITY_VERLET else None
+
+    def _params(self, dt: float) -> dict:
+        """What the workers need for a step of size dt; the table is rebuilt only when it changed."""
+        config = self.config
+        key = (
+            config.force_profile, float(config.beta), float(config.force_scale),
+            tuple(map(tuple, config.interaction_matrix.matrix)),
+        )
+        if key != self._table_key:
+            self._table = tabulate(config.force_profile, config.interaction_matrix.matrix,
+                                   config.beta, config.force_scale, dtype=self.dtype)
+            self._table_key = key
+        radii = config.radius_matrix(self.dtype)
+        search = float(radii.max(initial=0.0))
+        if self.width / self.workers < search:
+            raise ValueError("Strips are narrower than the interaction radius: use fewer workers")
+        damp, rm = step_factors(config, dt)
+        # forces left by velocity Verlet stay valid while table and radii do
+        self._params_key = (key, radii.tobytes())
+        seed = self.noise_seed
+        if config.deterministic:
+            seed = int(config.seed or 0) & 0x7FFFFFFFFFFFFFFF
+        return {
+            "table": self._table, "radii": radii, "search": search,
+            "dt": float(dt), "damp": float(damp), "rm": float(rm),
+            "max_velocity": float(config.max_velocity), "method": integrator_id(config.integrator),
+            "half_shell": bool(config.half_shell) and not config.deterministic,
+            "deterministic": bool(config.deterministic), "seed": seed,
+        }
+
+    def _send(self, message: tuple):
+        for conn in self._conns:
+            conn.send(message)
+        errors = []
+        for rank, (conn, process) in enumerate(zip(self._conns, self._processes)):
+            while not conn.poll(POLL_INTERVAL):
+                if not process.is_alive():
+                    self._barrier.abort()
+                    errors.append("worker %d exited with code %s" % (rank, process.exitcode))
+                    break
+            else:
+                reply = conn.recv()
+                if reply[0] == "error":
+                    errors.append(reply[1])
+        if errors:
+            # a worker failed mid-step: the strips are no longer consistent
+            self.close()
+            raise RuntimeError("Distributed step failed:\n" + "\n".join(errors))
+
+    def snapshot(self) -> Dict[str, np.ndarray]:
+        """Copy of all particles (x, y, vx, vy, type, id arrays) in id order."""
+        parts = [{name: self._owned[w][name][:int(self._control[0, w])] for name, _ in FIELDS}
+                 for w in range(self.workers)]
+        state = {name: np.concatenate([part[name] for part in parts]) for name, _ in FIELDS}
+        order = np.argsort(state["id"], kind="stable")
+        return {name: state[name][order] for name in ("x", "y", "vx", "vy", "type", "id")}
+
+    def close(self):
+        """Stops the workers and frees the shared memory (also on leaving a with block)."""
+        if self._closed:
+            return
+        self._closed = True
+        for conn, process in zip(self._conns, self._processes):
+            if process.is_alive():
+                try:
+                    conn.send(("stop",))
+                except OSError:
+                    pass
+        for conn, process in zip(self._conns, self._processes):
+            process.join(5.0)
+            if process.is_alive():
+                process.terminate()
+                process.join()
+            conn.close()
+        self._control = self._owned = None
+        for block in self._blocks:
+            block.close()
+            block.unlink()
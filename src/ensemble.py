@@ -0,0 +1,223 @@
+"""
+Ensembles: many small universes of one preset, stepped together.
+
+Statistics over a preset need hundreds of short runs (a few hundred to a
+few thousand particles each) that only differ in their seed. As separate
+ParticleSystems every step is one small kernel call per universe, too
+small to keep a core busy. An Ensemble stores all K universes in one set
+of arrays (universe u owns the particles offsets[u]:offsets[u + 1]) and
+advances them all with one compiled call, one universe per thread. The
+universes share the config, world size and force table; each has its own
+particles, grid counts and random stream.
+
+    ensemble = Ensemble(config, 400, 400, universes=200, particles=1000, seed=1)
+    ensemble.step_n(500, 0.05)
+    ensemble.stats()["kinetic_energy_mean"]
+"""
+from typing import Dict, NamedTuple, Sequence, Union
+import numpy as np
+from simulation_config import SimulationConfig
+from force_profiles import tabulate
+from particle_system import substep_count, step_factors, use_half_shell, force_table_key
+from kernels import NUMBA_OK, VELOCITY_VERLET, grid_geometry, integrator_id, precision_dtype
+from numpy_engine import compute_forces_numpy, step_numpy
+
+if NUMBA_OK:
+    from kernels import run_ensemble, compute_forces_ensemble
+
+
+class UniverseView(NamedTuple):
+    """Array views on the particles of one universe (writes go to the ensemble)."""
+    xs: np.ndarray
+    ys: np.ndarray
+    vxs: np.ndarray
+    vys: np.ndarray
+    types: np.ndarray
+
+
+class Ensemble:
+    """
+    K independent universes of the same preset in one batched array set.
+
+    Attributes:
+    ---------------------------------------
+    config: SimulationConfig
+        Shared preset (matrix, force profile, friction, integrator, ...)
+
+    xs, ys, vxs, vys, types: np.ndarray
+        State of all particles, universe after universe
+
+    offsets: np.ndarray
+        Universe u owns the particles offsets[u]:offsets[u + 1]
+
+    seeds: np.ndarray
+        Seed of every universe (start state and random motion stream)
+    """
+
+    def __init__(self, config: SimulationConfig, width: int, height: int, universes: int,
+                 particles: Union[int, Sequence[int]], types: Sequence[int] = None, seed: int = None):
+        """
+        Creates `universes` universes with `particles` particles each (or
+        particles[u] in universe u) of the given types (default: all
+        config.num_types), placed at random from each universe's seed. The
+        seeds are drawn from `seed` (default config.seed, None = entropy).
+        """
+        counts = np.broadcast_to(np.asarray(particles, dtype=np.int64), (universes,))
+        if universes < 1 or counts.min() < 1:
+            raise ValueError("An ensemble needs at least one universe and one particle per universe")
+        self.config = config
+        self.width = width
+        self.height = height
+        self.rng = np.random.default_rng(config.seed if seed is None else seed)
+        self.seeds = self.rng.integers(0, 2 ** 63 - 1, size=universes, dtype=np.int64)
+        self.offsets = np.concatenate(([0], np.cumsum(counts))).astype(np.int64)
+        self.step_count = 0
+
+        dtype = precision_dtype(config.precision)
+        types = list(range(config.num_types)) if types is None else list(types)
+        parts = [self._start_state(int(s), int(c), types) for s, c in zip(self.seeds, counts)]
+        self.xs, self.ys, self.vxs, self.vys = (
+            np.concatenate([p[k] for p in parts]).astype(dtype) for k in range(4)
+        )
+        self.types = np.concatenate([p[4] for p in parts]).astype(np.int32)
+        # particle ids inside their universe (the key of their jitter stream)
+        self.ids = np.concatenate([np.arange(c, dtype=np.int64) for c in counts])
+
+        n = self.xs.shape[0]
+        self._fx = np.zeros(n, dtype=dtype)
+        self._fy = np.zeros(n, dtype=dtype)
+        self._cell_of = np.empty(n, dtype=np.int32)
+        self._cell_items = np.empty(n, dtype=np.int32)
+        self._cell_start = np.empty(0, dtype=np.int32)
+        self._calm = np.zeros(n, dtype=np.int32)
+        self._params_key = None
+        self._table = None
+        self._table_key = None
+        self._forces_key = None
+
+    def _start_state(self, seed: int, count: int, types: Sequence[int]) -> tuple:
+        # same distribution as ParticleSystem.add_particles
+        rng = np.random.default_rng(seed)
+        return (
+            rng.uniform(0, self.width, count), rng.uniform(0, self.height, count),
+            rng.uniform(-0.5, 0.5, count), rng.uniform(-0.5, 0.5, count),
+            rng.choice(np.asarray(types), count),
+        )
+
+    def __len__(self) -> int:
+        return self.offsets.shape[0] - 1
+
+    @property
+    def engine(self) -> str:
+        """Which implementation runs the steps: "numba" or "numpy" (fallback)."""
+        return "numba" if NUMBA_OK else "numpy"
+
+    def universe(self, u: int) -> UniverseView:
+        """Views on the particle arrays of universe u."""
+        if not 0 <= u < len(self):
+            raise IndexError("universe index out of range")
+        a, b = self.offsets[u], self.offsets[u + 1]
+        return UniverseView(self.xs[a:b], self.ys[a:b], self.vxs[a:b], self.vys[a:b], self.types[a:b])
+
+    def step_n(self, steps: int, dt: float):
+        """
+        Advances every universe by `steps` steps of size dt (split into
+        substeps like ParticleSystem.step_n) in one compiled call.
+        """
+        config = self.config
+        sub = substep_count(config, dt)
+        h = dt / sub
+        steps = int(steps) * sub
+        if steps <= 0:
+            return
+        damp, rm = step_factors(config, h)
+        method = integrator_id(config.integrator)
+        table, radii, grid, half_shell = self._prepare()
+        # the shared sleep settings (kernels._update_sleep), Numba only
+        sleep = (max(int(config.sleep_steps), 0), float(config.sleep_speed) ** 2, float(config.sleep_force) ** 2)
+        width, height = float(self.width), float(self.height)
+        stencil = grid.half_stencil if half_shell else grid.stencil
+
+        if not NUMBA_OK:
+            self._step_numpy(steps, table, radii, grid, h, damp, rm, method)
+        else:
+            if method == VELOCITY_VERLET and self._forces_key != self._params_key:
+                # velocity Verlet starts with the forces of the current positions
+                compute_forces_ensemble(
+                    self.xs, self.ys, self.types, table, self._fx, self._fy, self.offsets,
+                    self._cell_of, self._cell_start, self._cell_items, stencil, half_shell,
+                    grid.nx, grid.ny, grid.inv_cw, grid.inv_ch, radii, width, height, self._calm, sleep[0],
+                )
+            run_ensemble(
+                self.xs, self.ys, self.vxs, self.vys, self.types, table, self._fx, self._fy, self.offsets,
+                self._cell_of, self._cell_start, self._cell_items, stencil, half_shell,
+                grid.nx, grid.ny, grid.inv_cw, grid.inv_ch, radii, width, height,
+                float(h), float(damp), float(rm), float(config.max_velocity), method, self._calm, sleep,
+                self.ids, self.seeds, self.step_count, steps,
+            )
+        self.step_count += steps
+        self._forces_key = self._params_key if method == VELOCITY_VERLET else None
+
+    def _step_numpy(self, steps, table, radii, grid, dt, damp, rm, method):
+        # NumPy engine: one universe after the other
+        config = self.config
+        for u in range(len(self)):
+            a, b = self.offsets[u], self.offsets[u + 1]
+            fx, fy = self._fx[a:b], self._fy[a:b]
+            if method == VELOCITY_VERLET and self._forces_key != self._params_key:
+                compute_forces_numpy(self.xs[a:b], self.ys[a:b], self.types[a:b], table, fx, fy, grid, radii,
+                                     float(self.width), float(self.height))
+            for k in range(steps):
+                step_numpy(
+                    self.xs[a:b], self.ys[a:b], self.vxs[a:b], self.vys[a:b], self.types[a:b],
+                    table, fx, fy, grid, radii, float(self.width), float(self.height),
+                    float(dt), float(damp), float(rm), float(config.max_velocity), method,
+                    self.ids[a:b], (int(self.seeds[u]), self.step_count + k),
+                )
+
+    def _prepare(self) -> tuple:
+        """Force table (cached), pair radii, grid geometry and half-shell flag for the current config."""
+        config = self.config
+        dtype = self.xs.dtype
+        key = force_table_key(config, dtype)
+        if key != self._table_key:
+            self._table = tabulate(config.force_profile, config.interaction_matrix.matrix,
+                                   config.beta, config.force_scale, dtype=dtype)
+            self._table_key = key
+        radii = config.radius_matrix(dtype)
+        # forces left by velocity Verlet, and the sleep counters, stay
+        # valid while table and radii do; a change wakes every universe
+        params_key = (key, radii.tobytes())
+        if params_key != self._params_key:
+            self._calm[:] = 0
+            self._params_key = params_key
+        search = float(radii.max(initial=0.0))
+        # same fixed cell size as ParticleSystem (no autotuning per universe)
+        cell_size = search * 0.6 if search > 0.0 else max(self.width, self.height)
+        grid = grid_geometry(self.width, self.height, search, cell_size)
+        ncell = grid.nx * grid.ny
+        if self._cell_start.shape[0] < len(self) * (ncell + 1):
+            self._cell_start = np.empty(len(self) * (ncell + 1), dtype=np.int32)
+        return self._table, radii, grid, use_half_shell(config)
+
+    def stats(self) -> Dict[str, Union[np.ndarray, float]]:
+        """
+        Per-universe observables and their mean / standard deviation over
+        the ensemble: mean_speed and kinetic_energy (per particle, unit
+        mass) are arrays with one value per universe, the *_mean / *_std
+        entries aggregate them.
+        """
+        counts = np.diff(self.offsets)
+        speed2 = self.vxs.astype(np.float64) ** 2 + self.vys.astype(np.float64) ** 2
+        starts = self.offsets[:-1]
+        observables = {
+            "mean_speed": np.add.reduceat(np.sqrt(speed2), starts) / counts,
+            "kinetic_energy": 0.5 * np.add.reduceat(speed2, starts) / counts,
+        }
+        stats: Dict[str, Union[np.ndarray, float]] = dict(observables)
+        for name, values in observables.items():
+            stats[name + "_mean"] = float(values.mean())
+            stats[name + "_std"] = float(values.std())
+        stats["universes"] = len(self)
+        stats["particles"] = int(counts.sum())
+        return stats
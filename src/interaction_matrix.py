@@ -1,16 +1,25 @@
 import random
+import numpy as np
 
 class InteractionMatrix:
-    """Manages the 2D matrix of interaction forces between particle types."""
+    """
+    Manages the 2D matrix of interaction forces between particle types,
+    and next to it the matrix of interaction radii per type pair.
+    A radius of None means the pair uses the global interaction radius.
+    """
     def __init__(self, num_types):
-        """Initializes a matrix of a given size, filled with zeros."""
+        """Initializes a matrix of a given size, filled with zeros (radii with None)."""
         self.num_types = num_types
         self.matrix = []
+        self.radii = []
         for i in range(num_types):
             row = []
+            radius_row = []
             for j in range(num_types):
                 row.append(0.0)
+                radius_row.append(None)
             self.matrix.append(row)
+            self.radii.append(radius_row)
 
     def set_interaction(self, type1, type2, value):
         """Sets the interaction force from type1 to type2."""
@@ -23,6 +32,28 @@ class InteractionMatrix:
             return self.matrix[type1][type2]
         return 0.0
 
+    def set_radius(self, type1, type2, value):
+        """Sets the interaction radius from type1 to type2 (None = global radius)."""
+        if 0 <= type1 < self.num_types and 0 <= type2 < self.num_types:
+            self.radii[type1][type2] = None if value is None else max(float(value), 0.0)
+
+    def get_radius(self, type1, type2, default=None):
+        """Gets the interaction radius from type1 to type2, `default` if it is not set or out of bounds."""
+        if 0 <= type1 < self.num_types and 0 <= type2 < self.num_types:
+            value = self.radii[type1][type2]
+            if value is not None:
+                return value
+        return default
+
+    def radius_array(self, default, dtype=np.float32):
+        """All radii as a num_types x num_types array, unset ones replaced by `default`."""
+        radii = np.full((self.num_types, self.num_types), float(default), dtype=dtype)
+        for i in range(self.num_types):
+            for j in range(self.num_types):
+                if self.radii[i][j] is not None:
+                    radii[i, j] = self.radii[i][j]
+        return radii
+
     def randomize(self):
         """Fills the entire matrix with random values between -1.0 and 1.0."""
         for i in range(self.num_types):
@@ -0,0 +1,1358 @@
+"""
+Compiled simulation kernels (Numba).
+
+All kernels work in place on the ParticleStore arrays and on work buffers
+owned by the ParticleSystem, so a steady-state frame does not allocate.
+The spatial grid is a uniform grid over the periodic world. Particles
+are binned with a counting sort: the particles of cell c are
+cell_items[cell_start[c]:cell_start[c + 1]]. When the particle arrays
+themselves are kept sorted by cell (ParticleSystem reorders them every
+few frames) these ranges are contiguous in memory as well.
+
+The force law is not hard-coded: kernels get a per-type-pair table of
+the force profile (see force_profiles.tabulate) and interpolate it at
+the normalized distance of each pair. The interaction radius is per type
+pair too (radius[ti, tj], see InteractionMatrix.radii): the grid is sized
+for the largest one and every pair is rejected against its own radius
+before any square root or table lookup.
+"""
+import math
+from typing import NamedTuple
+import numpy as np
+
+try:
+    import numba
+    from numba import njit, prange
+    NUMBA_OK = True
+except Exception:
+    NUMBA_OK = False
+
+
+# fast-math flags of every kernel: fastmath=True without "reassoc" and
+# "contract". Those two let LLVM regroup sums and fuse multiply-adds
+# differently in every compiled function, so the serial, parallel and
+# hashed kernels could round the same force sum differently, which would
+# break the bit-identical deterministic mode.
+FASTMATH = {"nnan", "ninf", "nsz", "arcp", "afn"}
+
+
+# integration schemes (SimulationConfig.integrator -> id passed to the kernels)
+EULER = 0
+VELOCITY_VERLET = 1
+LEAPFROG = 2
+INTEGRATORS = {"euler": EULER, "verlet": VELOCITY_VERLET, "leapfrog": LEAPFROG}
+
+
+# random motion: a counter-based stream, the jitter of (seed, particle id,
+# step, axis) is a hash of those alone, so it is drawn inside the compiled
+# step without generator state and does not depend on the thread or the
+# particle's array slot (the seed comes from the ParticleSystem's generator)
+NOISE_GOLDEN = 0x9E3779B97F4A7C15
+NOISE_MIX1 = 0xBF58476D1CE4E5B9
+NOISE_MIX2 = 0x94D049BB133111EB
+
+
+# storage / kernel precision (SimulationConfig.precision -> array dtype);
+# the kernels are compiled once per dtype
+PRECISIONS = {"float32": np.float32, "float64": np.float64}
+
+
+def precision_dtype(name: str) -> np.dtype:
+    """Array dtype of a precision name (see PRECISIONS)."""
+    if name not in PRECISIONS:
+        raise ValueError(f"Unknown precision: {name} (available: {', '.join(PRECISIONS)})")
+    return np.dtype(PRECISIONS[name])
+
+
+def integrator_id(name: str) -> int:
+    """Kernel id of an integrator name (see INTEGRATORS)."""
+    if name not in INTEGRATORS:
+        raise ValueError(f"Unknown integrator: {name} (available: {', '.join(INTEGRATORS)})")
+    return INTEGRATORS[name]
+
+
+def grid_shape(width: float, height: float, cell_size: float) -> tuple:
+    """
+    Number of grid cells per axis.
+
+    The cells tile the world exactly (so wrapping a cell index matches
+    wrapping a position), each cell is at least `cell_size` wide.
+    """
+    nx = max(1, int(width // cell_size))
+    ny = max(1, int(height // cell_size))
+    return nx, ny
+
+
+def build_stencil(nx: int, ny: int, range_x: int, range_y: int) -> np.ndarray:
+    """
+    Cell offsets (dx, dy) to visit around a particle's cell.
+
+    Offsets that land on the same cell after periodic wrap are removed,
+    so small grids never visit a cell (and a pair) twice.
+    """
+    xs = range(-range_x, range_x + 1) if 2 * range_x + 1 <= nx else range(nx)
+    ys = range(-range_y, range_y + 1) if 2 * range_y + 1 <= ny else range(ny)
+
+    seen = set()
+    offsets = []
+    for oy in ys:
+        for ox in xs:
+            key = (ox % nx, oy % ny)
+            if key in seen:
+                continue
+            seen.add(key)
+            offsets.append((ox, oy))
+    return np.array(offsets, dtype=np.int32).reshape(-1, 2)
+
+
+def cull_stencil(stencil: np.ndarray, nx: int, ny: int, cell_width: float, cell_height: float,
+                 search_radius: float) -> np.ndarray:
+    """
+    Drops the stencil cells that lie entirely outside search_radius of
+    the own cell (the corners of the block on fine grids), so the force
+    walk only visits cells that can hold a neighbour.
+
+    A cell dx cells away (nearest periodic image) is at least
+    (|dx| - 1) * cell_width away from any point of the own cell.
+    """
+    keep = []
+    # a little slack for particles binned one cell off by float rounding
+    limit = search_radius * (1.0 + 1e-4)
+    for ox, oy in stencil.tolist():
+        gx = abs(ox) % nx
+        gy = abs(oy) % ny
+        gx = min(gx, nx - gx)
+        gy = min(gy, ny - gy)
+        dx = max(gx - 1, 0) * cell_width
+        dy = max(gy - 1, 0) * cell_height
+        keep.append(dx * dx + dy * dy <= limit * limit)
+    return stencil[np.array(keep, dtype=bool)].reshape(-1, 2)
+
+
+def build_half_stencil(stencil: np.ndarray, nx: int, ny: int) -> np.ndarray:
+    """
+    Half of a (deduplicated) stencil for visiting every unordered pair once.
+
+    Rows are (dx, dy, tie). Of every pair of opposite offsets only one is
+    kept. The own cell and offsets that are their own opposite after
+    wrapping (possible on small grids) have tie = 1: there a pair is only
+    taken when j > i, otherwise it would be seen from both cells.
+    """
+    rows = []
+    for ox, oy in stencil.tolist():
+        key = (ox % nx, oy % ny)
+        opposite = ((-ox) % nx, (-oy) % ny)
+        if key == opposite:
+            rows.append((ox, oy, 1))
+        elif (key[1], key[0]) > (opposite[1], opposite[0]):
+            rows.append((ox, oy, 0))
+    return np.array(rows, dtype=np.int32).reshape(-1, 3)
+
+
+class GridGeometry(NamedTuple):
+    """Cell layout of the uniform grid for one (radius, width, height)."""
+    nx: int
+    ny: int
+    inv_cw: float
+    inv_ch: float
+    stencil: np.ndarray
+    half_stencil: np.ndarray
+
+
+# multiplier of the cell hash (Knuth's multiplicative hashing)
+HASH_MULTIPLIER = 2654435761
+
+
+def hash_table_size(count: int) -> int:
+    """Power-of-two hash table size for `count` keys (load factor <= 1/2)."""
+    size = 16
+    while size < 2 * count:
+        size *= 2
+    return size
+
+
+def grid_geometry(width: float, height: float, search_radius: float, cell_size: float) -> GridGeometry:
+    """
+    Grid of cells at least `cell_size` wide, with a stencil covering
+    `search_radius` (circle-culled, see cull_stencil).
+    """
+    nx, ny = grid_shape(width, height, cell_size)
+    inv_cw = nx / width
+    inv_ch = ny / height
+    if search_radius > 0.0:
+        stencil = build_stencil(nx, ny, int(math.ceil(search_radius * inv_cw)), int(math.ceil(search_radius * inv_ch)))
+        stencil = cull_stencil(stencil, nx, ny, width / nx, height / ny, search_radius)
+    else:
+        stencil = np.empty((0, 2), dtype=np.int32)
+    return GridGeometry(nx, ny, inv_cw, inv_ch, stencil, build_half_stencil(stencil, nx, ny))
+
+
+def cell_keys(xs: np.ndarray, ys: np.ndarray, grid: GridGeometry) -> np.ndarray:
+    """Cell of every particle (cx + cy * nx), as int64."""
+    cx = np.floor(xs.astype(np.float64) * grid.inv_cw).astype(np.int64) % grid.nx
+    cy = np.floor(ys.astype(np.float64) * grid.inv_ch).astype(np.int64) % grid.ny
+    return cx + cy * grid.nx
+
+
+def cell_counts(xs: np.ndarray, ys: np.ndarray, grid: GridGeometry) -> tuple:
+    """Occupied cells (sorted keys) and the number of particles in each."""
+    return np.unique(cell_keys(xs, ys, grid), return_counts=True)
+
+
+def occupancy_stats(keys: np.ndarray, counts: np.ndarray, grid: GridGeometry) -> dict:
+    """
+    Occupancy of a grid given its occupied cells (see cell_counts).
+
+    particle_occupancy is the mean number of particles in a particle's
+    own cell (sum of squared counts / n): it grows when the system
+    condenses into blobs. candidates_per_particle is the number of
+    particles the full stencil walk visits per particle, i.e. the
+    distance checks the force kernel does.
+    """
+    counts = counts.astype(np.int64)
+    n = int(counts.sum())
+    cx = keys % grid.nx
+    cy = keys // grid.nx
+    around = np.zeros(keys.shape[0], dtype=np.int64)
+    for ox, oy in (grid.stencil.tolist() if n else []):
+        # around[c] += count of cell c + (ox, oy)
+        other = (cx + ox) % grid.nx + ((cy + oy) % grid.ny) * grid.nx
+        pos = np.minimum(np.searchsorted(keys, other), keys.shape[0] - 1)
+        around += np.where(keys[pos] == other, counts[pos], 0)
+    candidates = int((counts * around).sum()) - n
+    return {
+        "cells": grid.nx * grid.ny,
+        "occupied_cells": int(keys.shape[0]),
+        "max_occupancy": int(counts.max()) if n else 0,
+        "mean_occupancy": float(counts.mean()) if n else 0.0,
+        "particle_occupancy": float((counts ** 2).sum() / n) if n else 0.0,
+        "candidates_per_particle": candidates / n if n else 0.0,
+    }
+
+
+if NUMBA_OK:
+    # The kernels the engines call from Python are nogil: they release the
+    # GIL while they run, so a physics thread (physics_thread.py) steps
+    # while the render thread keeps going.
+
+    # Several serial kernels call parallel ones (the multi-step runners,
+    # step_parallel ...). Compiling them starts Numba's threading layer,
+    # loading them from the on-disk cache does not, and a serial cached
+    # function entering a parallel region without it crashes the process.
+    # Start the thread pool here, before any kernel runs.
+    numba.get_num_threads()
+
+    @njit(fastmath=FASTMATH, cache=True, inline="always")
+    def _cell_index(x, inv_cell, n): # pragma: no cover
+        c = int(math.floor(x * inv_cell)) % n
+        return c
+
+    @njit(fastmath=FASTMATH, cache=True, inline="always")
+    def _wrap_delta(d, size, half): # pragma: no cover
+        # minimum image: particles interact across borders correctly
+        if d > half:
+            d -= size
+        elif d < -half:
+            d += size
+        return d
+
+    @njit(fastmath=FASTMATH, cache=True, inline="always")
+    def _sample_force(table, ti, tj, q): # pragma: no cover
+        # force strength at normalized distance q (0..1), linearly
+        # interpolated from the type pair's row of the profile table
+        last = table.shape[2] - 1
+        x = q * last
+        m = int(x)
+        if m > last - 1:
+            m = last - 1
+        lo = table[ti, tj, m]
+        return lo + (table[ti, tj, m + 1] - lo) * (x - m)
+
+    @njit(fastmath=FASTMATH, cache=True, inline="always")
+    def _mix64(z): # pragma: no cover
+        # splitmix64 finalizer
+        z = (z ^ (z >> np.uint64(30))) * np.uint64(NOISE_MIX1)
+        z = (z ^ (z >> np.uint64(27))) * np.uint64(NOISE_MIX2)
+        return z ^ (z >> np.uint64(31))
+
+    @njit(fastmath=FASTMATH, cache=True, inline="always")
+    def _counter_uniform(seed, pid, counter): # pragma: no cover
+        # uniform in [-1, 1) from (seed, particle id, counter) alone,
+        # numpy_engine.counter_uniform_numpy gives the same bits
+        z = _mix64(np.uint64(seed) * np.uint64(NOISE_GOLDEN) + np.uint64(pid))
+        z = _mix64(z + np.uint64(counter) * np.uint64(NOISE_GOLDEN))
+        return float(z >> np.uint64(11)) * (1.0 / 4503599627370496.0) - 1.0
+
+    @njit(fastmath=FASTMATH, cache=True)
+    def counter_uniform(seed, ids, counter, out): # pragma: no cover
+        """out[i] = deterministic jitter in [-1, 1) of particle ids[i] (see _counter_uniform)."""
+        for i in range(ids.shape[0]):
+            out[i] = _counter_uniform(seed, ids[i], counter)
+
+    @njit(fastmath=FASTMATH, cache=True, inline="always")
+    def _update_velocity(vx, vy, f_x, f_y, dt, damp, random_motion, max_velocity,
+                         seed, pid, step): # pragma: no cover
+        # same order as Particle.update_position: force, friction, jitter, clamp
+        # (the jitter of particle pid at this step, see _counter_uniform)
+        vx = (vx + f_x * dt) * damp
+        vy = (vy + f_y * dt) * damp
+        if random_motion > 0.0:
+            vx += random_motion * _counter_uniform(seed, pid, 2 * step)
+            vy += random_motion * _counter_uniform(seed, pid, 2 * step + 1)
+        speed2 = vx * vx + vy * vy
+        if speed2 > max_velocity * max_velocity:
+            scale = max_velocity / math.sqrt(speed2)
+            vx *= scale
+            vy *= scale
+        return vx, vy
+
+    @njit(fastmath=FASTMATH, cache=True, inline="always")
+    def _wrap_position(x, size): # pragma: no cover
+        x = x % size
+        # float rounding can turn tiny negative values into exactly size
+        if x >= size:
+            x = 0.0
+        return x
+
+    # A step is split around the force evaluation: _step_start moves the
+    # particle to where the new forces are taken, _step_finish applies them.
+    #   euler:    forces at x;           v += f dt, x += v dt
+    #   verlet:   v += f dt/2, x += v dt; forces; v += f dt/2
+    #             (velocity Verlet, the first half kick reuses the forces
+    #             of the previous step, which fx / fy still hold)
+    #   leapfrog: x += v dt/2; forces; v += f dt, x += v dt/2
+    # Friction, jitter and the speed clamp follow the last kick in all three.
+
+    @njit(fastmath=FASTMATH, cache=True, inline="always")
+    def _step_start(x, y, vx, vy, f_x, f_y, dt, method, width, height): # pragma: no cover
+        if dt > 0.0:
+            if method == VELOCITY_VERLET:
+                vx += f_x * (0.5 * dt)
+                vy += f_y * (0.5 * dt)
+                x = _wrap_position(x + vx * dt, width)
+                y = _wrap_position(y + vy * dt, height)
+            elif method == LEAPFROG:
+                x = _wrap_position(x + vx * (0.5 * dt), width)
+                y = _wrap_position(y + vy * (0.5 * dt), height)
+        return x, y, vx, vy
+
+    @njit(fastmath=FASTMATH, cache=True, inline="always")
+    def _step_finish(x, y, vx, vy, f_x, f_y, dt, damp, random_motion, max_velocity,
+                     method, width, height, seed, pid, step): # pragma: no cover
+        if dt > 0.0:
+            kick = 0.5 * dt if method == VELOCITY_VERLET else dt
+            vx, vy = _update_velocity(vx, vy, f_x, f_y, kick, damp, random_motion, max_velocity,
+                                      seed, pid, step)
+            if method == EULER:
+                x += vx * dt
+                y += vy * dt
+            elif method == LEAPFROG:
+                x += vx * (0.5 * dt)
+                y += vy * (0.5 * dt)
+        # WRAP-AROUND POSITION
+        return _wrap_position(x, width), _wrap_position(y, height), vx, vy
+
+    @njit(fastmath=FASTMATH, cache=True, inline="always")
+    def _asleep(calm, i, sleep_steps): # pragma: no cover
+        # sleeping particles are frozen: no forces received, not integrated
+        return sleep_steps > 0 and calm[i] > sleep_steps
+
+    @njit(fastmath=FASTMATH, cache=True)
+    def _integrate_start(xs, ys, vxs, vys, fx, fy, dt, method, width, height, calm, sleep_steps): # pragma: no cover
+        # first part of the step, before the forces (nothing to do for euler)
+        if method == EULER:
+            return
+        for i in range(xs.shape[0]):
+            if _asleep(calm, i, sleep_steps):
+                continue
+            xs[i], ys[i], vxs[i], vys[i] = _step_start(
+                xs[i], ys[i], vxs[i], vys[i], fx[i], fy[i], dt, method, width, height,
+            )
+
+    @njit(fastmath=FASTMATH, cache=True, parallel=True)
+    def _integrate_start_parallel(xs, ys, vxs, vys, fx, fy, dt, method, width, height,
+                                  calm, sleep_steps): # pragma: no cover
+        # multi-threaded _integrate_start
+        if method == EULER:
+            return
+        for i in prange(xs.shape[0]):
+            if _asleep(calm, i, sleep_steps):
+                continue
+            xs[i], ys[i], vxs[i], vys[i] = _step_start(
+                xs[i], ys[i], vxs[i], vys[i], fx[i], fy[i], dt, method, width, height,
+            )
+
+    @njit(fastmath=FASTMATH, cache=True)
+    def _integrate(xs, ys, vxs, vys, fx, fy, dt, damp, random_motion, max_velocity,
+                   method, width, height, calm, sleep_steps, ids, rng): # pragma: no cover
+        # velocity update from the forces, then move + WRAP-AROUND POSITION
+        # rng = (seed, step) of the jitter
+        seed, step = rng
+        for i in range(xs.shape[0]):
+            if _asleep(calm, i, sleep_steps):
+                continue
+            xs[i], ys[i], vxs[i], vys[i] = _step_finish(
+                xs[i], ys[i], vxs[i], vys[i], fx[i], fy[i],
+                dt, damp, random_motion, max_velocity, method, width, height, seed, ids[i], step,
+            )
+
+    @njit(fastmath=FASTMATH, cache=True, parallel=True)
+    def _integrate_parallel(xs, ys, vxs, vys, fx, fy, dt, damp, random_motion, max_velocity,
+                            method, width, height, calm, sleep_steps, ids, rng): # pragma: no cover
+        # multi-threaded _integrate
+        seed, step = rng
+        for i in prange(xs.shape[0]):
+            if _asleep(calm, i, sleep_steps):
+                continue
+            xs[i], ys[i], vxs[i], vys[i] = _step_finish(
+                xs[i], ys[i], vxs[i], vys[i], fx[i], fy[i],
+                dt, damp, random_motion, max_velocity, method, width, height, seed, ids[i], step,
+            )
+
+    @njit(fastmath=FASTMATH, cache=True)
+    def _sleep_level(calm, sleep): # pragma: no cover
+        # sleep steps while some particle sleeps, else 0: with nobody asleep
+        # the force loops have nobody to skip or wake and drop those checks
+        steps = sleep[0]
+        if steps > 0:
+            for i in range(calm.shape[0]):
+                if calm[i] > steps:
+                    return steps
+        return 0
+
+    @njit(fastmath=FASTMATH, cache=True)
+    def _update_sleep(vxs, vys, fx, fy, calm, sleep): # pragma: no cover
+        # sleep = (steps, speed2, force2): calm[i] counts the steps in a row
+        # particle i stayed under both thresholds, above `steps` it sleeps
+        # (velocity zeroed). 0 means it moved in the last step, which is
+        # what wakes sleeping neighbours (see _wake_sleepers).
+        sleep_steps, speed2, force2 = sleep
+        if sleep_steps <= 0:
+            return
+        for i in range(vxs.shape[0]):
+            if calm[i] > sleep_steps:
+                continue
+            if vxs[i] * vxs[i] + vys[i] * vys[i] < speed2 and fx[i] * fx[i] + fy[i] * fy[i] < force2:
+                calm[i] += 1
+                if calm[i] > sleep_steps:
+                    vxs[i] = 0.0
+                    vys[i] = 0.0
+            else:
+                calm[i] = 0
+
+    # Waking up: a sleeping particle j wakes when a particle that moved in
+    # the last step (calm == 0) is within j's pair radius. This runs as a
+    # pass of its own after the grid build and before the forces, decided
+    # from the sleeper's side into a flag per particle: every particle only
+    # writes its own flag, so the result is the same in any visiting order
+    # and on any number of threads, and every particle's sleep state is
+    # fixed before any force is taken. (The flags are allocated per pass,
+    # only while some particle sleeps.)
+
+    @njit(fastmath=FASTMATH, cache=True)
+    def _wake_up(woken, calm): # pragma: no cover
+        for j in range(calm.shape[0]):
+            if woken[j]:
+                calm[j] = 1
+
+    @njit(fastmath=FASTMATH, cache=True)
+    def _woken(j, xs, ys, types, cell_start, cell_items, stencil,
+               nx, ny, inv_cw, inv_ch, radius, width, height, calm): # pragma: no cover
+        # whether a particle that moved in the last step is within reach of j
+        xj = xs[j]
+        yj = ys[j]
+        row = radius[types[j]]
+        cxj = _cell_index(xj, inv_cw, nx)
+        cyj = _cell_index(yj, inv_ch, ny)
+        half_w = 0.5 * width
+        half_h = 0.5 * height
+        for s in range(stencil.shape[0]):
+            gx = (cxj + stencil[s, 0]) % nx
+            gy = (cyj + stencil[s, 1]) % ny
+            cell = gx + gy * nx
+            for p in range(cell_start[cell], cell_start[cell + 1]):
+                i = cell_items[p]
+                if i == j or calm[i] != 0:
+                    continue
+                dx = _wrap_delta(xs[i] - xj, width, half_w)
+                dy = _wrap_delta(ys[i] - yj, height, half_h)
+                r = row[types[i]]
+                if dx * dx + dy * dy <= r * r:
+                    return True
+        return False
+
+    @njit(fastmath=FASTMATH, cache=True)
+    def _wake_sleepers(xs, ys, types, cell_start, cell_items, stencil,
+                       nx, ny, inv_cw, inv_ch, radius, width, height, calm, sleep_steps): # pragma: no cover
+        # the wake-up pass on the dense grid (sleep_steps from _sleep_level:
+        # 0 while nobody sleeps, then there is nothing to do)
+        if sleep_steps <= 0:
+            return
+        n = xs.shape[0]
+        woken = np.zeros(n, dtype=np.bool_)
+        for j in range(n):
+            if _asleep(calm, j, sleep_steps):
+                woken[j] = _woken(j, xs, ys, types, cell_start, cell_items, stencil,
+                                  nx, ny, inv_cw, inv_ch, radius, width, height, calm)
+        _wake_up(woken, calm)
+
+    @njit(fastmath=FASTMATH, cache=True, parallel=True)
+    def _wake_sleepers_parallel(xs, ys, types, cell_start, cell_items, stencil,
+                                nx, ny, inv_cw, inv_ch, radius, width, height, calm, sleep_steps): # pragma: no cover
+        # multi-threaded _wake_sleepers
+        if sleep_steps <= 0:
+            return
+        n = xs.shape[0]
+        woken = np.zeros(n, dtype=np.bool_)
+        for j in prange(n):
+            if _asleep(calm, j, sleep_steps):
+                woken[j] = _woken(j, xs, ys, types, cell_start, cell_items, stencil,
+                                  nx, ny, inv_cw, inv_ch, radius, width, height, calm)
+        _wake_up(woken, calm)
+
+    @njit(fastmath=FASTMATH, cache=True, nogil=True)
+    def bin_particles(xs, ys, inv_cw, inv_ch, nx, ny, cell_of, cell_start, cell_items): # pragma: no cover
+        """
+        Counting sort of particle indices by cell into the reusable buffers:
+        the particles of cell c are cell_items[cell_start[c]:cell_start[c + 1]],
+        in ascending index order.
+        """
+        n = xs.shape[0]
+        ncell = nx * ny
+        for c in range(ncell + 1):
+            cell_start[c] = 0
+        for i in range(n):
+            c = _cell_index(xs[i], inv_cw, nx) + _cell_index(ys[i], inv_ch, ny) * nx
+            cell_of[i] = c
+            cell_start[c + 1] += 1
+        for c in range(ncell):
+            cell_start[c + 1] += cell_start[c]
+        # scatter, using cell_of as the running write position of each cell
+        for i in range(n):
+            c = cell_of[i]
+            cell_of[i] = cell_start[c]
+            cell_start[c] += 1
+            cell_items[cell_of[i]] = i
+        # the scatter moved every start to the next cell's start: shift back
+        for c in range(ncell, 0, -1):
+            cell_start[c] = cell_start[c - 1]
+        cell_start[0] = 0
+
+    @njit(fastmath=FASTMATH, cache=True)
+    def _particle_force(i, xs, ys, types, table, cell_start, cell_items, stencil,
+                        nx, ny, inv_cw, inv_ch, radius, width, height, calm, sleep_steps): # pragma: no cover
+        # sums the forces of all neighbours within their pair radius on particle i,
+        # walking the dense [start, end) range of every stencil cell
+        if _asleep(calm, i, sleep_steps):
+            return 0.0, 0.0
+        xi = xs[i]
+        yi = ys[i]
+        ti = types[i]
+        cxi = _cell_index(xi, inv_cw, nx)
+        cyi = _cell_index(yi, inv_ch, ny)
+
+        half_w = 0.5 * width
+        half_h = 0.5 * height
+        fx = 0.0
+        fy = 0.0
+
+        for s in range(stencil.shape[0]):
+            gx = (cxi + stencil[s, 0]) % nx
+            gy = (cyi + stencil[s, 1]) % ny
+            cell = gx + gy * nx
+            for p in range(cell_start[cell], cell_start[cell + 1]):
+                j = cell_items[p]
+                if j == i:
+                    continue
+                dx = _wrap_delta(xs[j] - xi, width, half_w)
+                dy = _wrap_delta(ys[j] - yi, height, half_h)
+                d2 = dx * dx + dy * dy
+
+                tj = types[j]
+                rij = radius[ti, tj]
+                if d2 > 1e-6 and d2 <= rij * rij:
+                    inv_d = 1.0 / math.sqrt(d2)
+                    strength = _sample_force(table, ti, tj, d2 * inv_d / rij)
+                    fx += dx * inv_d * strength
+                    fy += dy * inv_d * strength
+        return fx, fy
+
+    @njit(fastmath=FASTMATH, cache=True)
+    def _forces_half_shell(xs, ys, types, table, fx, fy, cell_start, cell_items, half_stencil,
+                           nx, ny, radius, width, height): # pragma: no cover
+        # Visits every unordered pair once and applies the force in both
+        # directions: the geometry (dx, dy, d2, sqrt) is shared, only the
+        # table rows [ti, tj] and [tj, ti] differ.
+        for i in range(xs.shape[0]):
+            fx[i] = 0.0
+            fy[i] = 0.0
+
+        half_w = 0.5 * width
+        half_h = 0.5 * height
+
+        for cy in range(ny):
+            for cx in range(nx):
+                c = cx + cy * nx
+                for pi in range(cell_start[c], cell_start[c + 1]):
+                    i = cell_items[pi]
+                    xi = xs[i]
+                    yi = ys[i]
+                    ti = types[i]
+                    fxi = 0.0
+                    fyi = 0.0
+                    for s in range(half_stencil.shape[0]):
+                        tie = half_stencil[s, 2] == 1
+                        gx = (cx + half_stencil[s, 0]) % nx
+                        gy = (cy + half_stencil[s, 1]) % ny
+                        cell = gx + gy * nx
+                        for pj in range(cell_start[cell], cell_start[cell + 1]):
+                            j = cell_items[pj]
+                            if tie and j <= i:
+                                continue
+                            dx = _wrap_delta(xs[j] - xi, width, half_w)
+                            dy = _wrap_delta(ys[j] - yi, height, half_h)
+                            d2 = dx * dx + dy * dy
+
+                            if d2 <= 1e-6:
+                                continue
+                            # the pair's radius can differ per direction
+                            tj = types[j]
+                            r_ij = radius[ti, tj]
+                            r_ji = radius[tj, ti]
+                            in_ij = d2 <= r_ij * r_ij
+                            in_ji = d2 <= r_ji * r_ji
+                            if in_ij or in_ji:
+                                d = math.sqrt(d2)
+                                ux = dx / d
+                                uy = dy / d
+                                if in_ij:
+                                    s_ij = _sample_force(table, ti, tj, d / r_ij)
+                                    fxi += ux * s_ij
+                                    fyi += uy * s_ij
+                                if in_ji:
+                                    # j sees i in the opposite direction
+                                    s_ji = _sample_force(table, tj, ti, d / r_ji)
+                                    fx[j] -= ux * s_ji
+                                    fy[j] -= uy * s_ji
+                    fx[i] += fxi
+                    fy[i] += fyi
+
+    @njit(fastmath=FASTMATH, cache=True)
+    def _compute_forces(xs, ys, types, table, fx, fy, cell_of, cell_start, cell_items, stencil, half_shell,
+                        nx, ny, inv_cw, inv_ch, radius, width, height, calm, sleep_steps): # pragma: no cover
+        bin_particles(xs, ys, inv_cw, inv_ch, nx, ny, cell_of, cell_start, cell_items)
+        if half_shell:
+            _forces_half_shell(xs, ys, types, table, fx, fy, cell_start, cell_items, stencil,
+                               nx, ny, radius, width, height)
+        else:
+            _wake_sleepers(xs, ys, types, cell_start, cell_items, stencil,
+                           nx, ny, inv_cw, inv_ch, radius, width, height, calm, sleep_steps)
+            for i in range(xs.shape[0]):
+                fx[i], fy[i] = _particle_force(
+                    i, xs, ys, types, table, cell_start, cell_items, stencil,
+                    nx, ny, inv_cw, inv_ch, radius, width, height, calm, sleep_steps,
+                )
+
+    @njit(fastmath=FASTMATH, cache=True, nogil=True)
+    def compute_forces_numba(xs, ys, types, table, fx, fy, cell_of, cell_start, cell_items, stencil, half_shell,
+                             nx, ny, inv_cw, inv_ch, radius, width, height, calm, sleep_steps): # pragma: no cover
+        """
+        Fills fx / fy with the net force on every particle.
+        With half_shell the stencil must come from build_half_stencil().
+        """
+        _compute_forces(xs, ys, types, table, fx, fy, cell_of, cell_start, cell_items, stencil, half_shell,
+                        nx, ny, inv_cw, inv_ch, radius, width, height, calm, sleep_steps)
+
+    @njit(fastmath=FASTMATH, cache=True)
+    def step_numba(xs, ys, vxs, vys, types, table, fx, fy, cell_of, cell_start, cell_items, stencil, half_shell,
+                   nx, ny, inv_cw, inv_ch, radius, width, height,
+                   dt, damp, random_motion, max_velocity, method, calm, sleep, ids, rng): # pragma: no cover
+        """
+        One full simulation step: grid build, forces, integration, wrap.
+        With half_shell the stencil must come from build_half_stencil().
+        method is the integrator id (EULER, VELOCITY_VERLET or LEAPFROG).
+        rng = (seed, step): the jitter comes from the counter-based stream
+        of every particle's id at this step (same bits with any thread count).
+        """
+        sleeping = _sleep_level(calm, sleep)
+        _integrate_start(xs, ys, vxs, vys, fx, fy, dt, method, width, height, calm, sleeping)
+        _compute_forces(xs, ys, types, table, fx, fy, cell_of, cell_start, cell_items, stencil, half_shell,
+                        nx, ny, inv_cw, inv_ch, radius, width, height, calm, sleeping)
+        _integrate(xs, ys, vxs, vys, fx, fy, dt, damp, random_motion, max_velocity, method,
+                   width, height, calm, sleeping, ids, rng)
+        _update_sleep(vxs, vys, fx, fy, calm, sleep)
+
+    # -------------------- parallel --------------------
+
+    @njit(fastmath=FASTMATH, cache=True, parallel=True)
+    def _bin_particles_parallel(xs, ys, inv_cw, inv_ch, nx, ny, nchunks,
+                                cell_of, chunk_counts, cell_start, cell_items): # pragma: no cover
+        # Multi-threaded bin_particles. Each chunk of particles counts and
+        # scatters on its own thread; the order inside a cell is always
+        # ascending particle index, whatever the number of chunks.
+        n = xs.shape[0]
+        ncell = nx * ny
+        chunk = (n + nchunks - 1) // nchunks
+
+        for c in prange(nchunks):
+            base = c * ncell
+            for k in range(ncell):
+                chunk_counts[base + k] = 0
+            for i in range(c * chunk, min(n, (c + 1) * chunk)):
+                cell = _cell_index(xs[i], inv_cw, nx) + _cell_index(ys[i], inv_ch, ny) * nx
+                cell_of[i] = cell
+                chunk_counts[base + cell] += 1
+
+        # exclusive prefix sum, cell-major so every cell is one contiguous range
+        total = 0
+        for cell in range(ncell):
+            cell_start[cell] = total
+            for c in range(nchunks):
+                k = c * ncell + cell
+                count = chunk_counts[k]
+                chunk_counts[k] = total
+                total += count
+        cell_start[ncell] = total
+
+        for c in prange(nchunks):
+            base = c * ncell
+            for i in range(c * chunk, min(n, (c + 1) * chunk)):
+                k = base + cell_of[i]
+                cell_items[chunk_counts[k]] = i
+                chunk_counts[k] += 1
+
+    @njit(fastmath=FASTMATH, cache=True, parallel=True, nogil=True)
+    def compute_forces_parallel(xs, ys, types, table, fx, fy, nchunks,
+                                cell_of, chunk_counts, cell_start, cell_items, stencil,
+                                nx, ny, inv_cw, inv_ch, radius, width, height, calm, sleep_steps): # pragma: no cover
+        """Multi-threaded compute_forces_numba."""
+        _bin_particles_parallel(xs, ys, inv_cw, inv_ch, nx, ny, nchunks,
+                              cell_of, chunk_counts, cell_start, cell_items)
+        _wake_sleepers_parallel(xs, ys, types, cell_start, cell_items, stencil,
+                                nx, ny, inv_cw, inv_ch, radius, width, height, calm, sleep_steps)
+        for i in prange(xs.shape[0]):
+            fx[i], fy[i] = _particle_force(
+                i, xs, ys, types, table, cell_start, cell_items, stencil,
+                nx, ny, inv_cw, inv_ch, radius, width, height, calm, sleep_steps,
+            )
+
+    @njit(fastmath=FASTMATH, cache=True, parallel=True)
+    def step_parallel(xs, ys, vxs, vys, types, table, fx, fy, nchunks,
+                      cell_of, chunk_counts, cell_start, cell_items, stencil,
+                      nx, ny, inv_cw, inv_ch, radius, width, height,
+                      dt, damp, random_motion, max_velocity, method, calm, sleep, ids, rng): # pragma: no cover
+        """
+        Multi-threaded step_numba: every particle only writes its own
+        force and velocity, so the particle loops need no locking.
+        """
+        sleeping = _sleep_level(calm, sleep)
+        _integrate_start_parallel(xs, ys, vxs, vys, fx, fy, dt, method, width, height, calm, sleeping)
+        _bin_particles_parallel(xs, ys, inv_cw, inv_ch, nx, ny, nchunks,
+                                cell_of, chunk_counts, cell_start, cell_items)
+        _wake_sleepers_parallel(xs, ys, types, cell_start, cell_items, stencil,
+                                nx, ny, inv_cw, inv_ch, radius, width, height, calm, sleeping)
+        for i in prange(xs.shape[0]):
+            fx[i], fy[i] = _particle_force(
+                i, xs, ys, types, table, cell_start, cell_items, stencil,
+                nx, ny, inv_cw, inv_ch, radius, width, height, calm, sleeping,
+            )
+        _integrate_parallel(xs, ys, vxs, vys, fx, fy, dt, damp, random_motion, max_velocity, method,
+                            width, height, calm, sleeping, ids, rng)
+        _update_sleep(vxs, vys, fx, fy, calm, sleep)
+
+    # -------------------- Verlet neighbour lists --------------------
+    # nbr_idx[nbr_start[i]:nbr_start[i + 1]] are the particles within the
+    # list radius (pair interaction radius + skin) of particle i when the lists
+    # were built. The lists stay valid until some particle moved more than
+    # skin / 2, so the grid is not needed in between.
+
+    @njit(fastmath=FASTMATH, cache=True)
+    def _neighbors_of(i, xs, ys, types, cell_start, cell_items, stencil, nx, ny, inv_cw, inv_ch,
+                      radius2, width, height, nbr_idx, pos): # pragma: no cover
+        # counts the neighbours of i (within radius2[ti, tj]); also writes
+        # them from nbr_idx[pos] if pos >= 0
+        xi = xs[i]
+        yi = ys[i]
+        row = radius2[types[i]]
+        cxi = _cell_index(xi, inv_cw, nx)
+        cyi = _cell_index(yi, inv_ch, ny)
+        half_w = 0.5 * width
+        half_h = 0.5 * height
+        count = 0
+        for s in range(stencil.shape[0]):
+            gx = (cxi + stencil[s, 0]) % nx
+            gy = (cyi + stencil[s, 1]) % ny
+            cell = gx + gy * nx
+            for p in range(cell_start[cell], cell_start[cell + 1]):
+                j = cell_items[p]
+                if j == i:
+                    continue
+                dx = _wrap_delta(xs[j] - xi, width, half_w)
+                dy = _wrap_delta(ys[j] - yi, height, half_h)
+                if dx * dx + dy * dy <= row[types[j]]:
+                    if pos >= 0:
+                        nbr_idx[pos + count] = j
+                    count += 1
+        return count
+
+    @njit(fastmath=FASTMATH, cache=True, parallel=True, nogil=True)
+    def count_neighbors(xs, ys, types, cell_start, cell_items, stencil, nx, ny, inv_cw, inv_ch,
+                        radius, width, height, nbr_start, nbr_idx): # pragma: no cover
+        """
+        First pass of the list build: fills nbr_start (prefix sums) and
+        returns the total number of list entries (size needed for nbr_idx).
+        radius[ti, tj] is the list radius of each type pair.
+        """
+        n = xs.shape[0]
+        radius2 = radius * radius
+        nbr_start[0] = 0
+        for i in prange(n):
+            nbr_start[i + 1] = _neighbors_of(i, xs, ys, types, cell_start, cell_items, stencil, nx, ny,
+                                             inv_cw, inv_ch, radius2, width, height, nbr_idx, -1)
+        for i in range(n):
+            nbr_start[i + 1] += nbr_start[i]
+        return nbr_start[n]
+
+    @njit(fastmath=FASTMATH, cache=True, parallel=True, nogil=True)
+    def fill_neighbors(xs, ys, types, cell_start, cell_items, stencil, nx, ny, inv_cw, inv_ch,
+                       radius, width, height, nbr_start, nbr_idx): # pragma: no cover
+        """Second pass of the list build: writes the neighbour indices."""
+        radius2 = radius * radius
+        for i in prange(xs.shape[0]):
+            _neighbors_of(i, xs, ys, types, cell_start, cell_items, stencil, nx, ny,
+                          inv_cw, inv_ch, radius2, width, height, nbr_idx, nbr_start[i])
+
+    @njit(fastmath=FASTMATH, cache=True)
+    def _woken_list(j, xs, ys, types, nbr_start, nbr_idx, radius, width, height, calm): # pragma: no cover
+        # _woken over the neighbour list of j
+        xj = xs[j]
+        yj = ys[j]
+        row = radius[types[j]]
+        half_w = 0.5 * width
+        half_h = 0.5 * height
+        for p in range(nbr_start[j], nbr_start[j + 1]):
+            i = nbr_idx[p]
+            if calm[i] != 0:
+                continue
+            dx = _wrap_delta(xs[i] - xj, width, half_w)
+            dy = _wrap_delta(ys[i] - yj, height, half_h)
+            r = row[types[i]]
+            if dx * dx + dy * dy <= r * r:
+                return True
+        return False
+
+    @njit(fastmath=FASTMATH, cache=True)
+    def _wake_sleepers_list(xs, ys, types, nbr_start, nbr_idx, radius, width, height,
+                            calm, sleep_steps): # pragma: no cover
+        # _wake_sleepers over the neighbour lists
+        if sleep_steps <= 0:
+            return
+        n = xs.shape[0]
+        woken = np.zeros(n, dtype=np.bool_)
+        for j in range(n):
+            if _asleep(calm, j, sleep_steps):
+                woken[j] = _woken_list(j, xs, ys, types, nbr_start, nbr_idx, radius, width, height, calm)
+        _wake_up(woken, calm)
+
+    @njit(fastmath=FASTMATH, cache=True, parallel=True)
+    def _wake_sleepers_list_parallel(xs, ys, types, nbr_start, nbr_idx, radius, width, height,
+                                     calm, sleep_steps): # pragma: no cover
+        # multi-threaded _wake_sleepers_list
+        if sleep_steps <= 0:
+            return
+        n = xs.shape[0]
+        woken = np.zeros(n, dtype=np.bool_)
+        for j in prange(n):
+            if _asleep(calm, j, sleep_steps):
+                woken[j] = _woken_list(j, xs, ys, types, nbr_start, nbr_idx, radius, width, height, calm)
+        _wake_up(woken, calm)
+
+    @njit(fastmath=FASTMATH, cache=True)
+    def _particle_force_list(i, xs, ys, types, table, nbr_start, nbr_idx,
+                             radius, width, height, calm, sleep_steps): # pragma: no cover
+        # same as _particle_force, over the neighbour list of i
+        if _asleep(calm, i, sleep_steps):
+            return 0.0, 0.0
+        xi = xs[i]
+        yi = ys[i]
+        ti = types[i]
+        half_w = 0.5 * width
+        half_h = 0.5 * height
+        fx = 0.0
+        fy = 0.0
+        for p in range(nbr_start[i], nbr_start[i + 1]):
+            j = nbr_idx[p]
+            dx = _wrap_delta(xs[j] - xi, width, half_w)
+            dy = _wrap_delta(ys[j] - yi, height, half_h)
+            d2 = dx * dx + dy * dy
+
+            tj = types[j]
+            rij = radius[ti, tj]
+            if d2 > 1e-6 and d2 <= rij * rij:
+                inv_d = 1.0 / math.sqrt(d2)
+                strength = _sample_force(table, ti, tj, d2 * inv_d / rij)
+                fx += dx * inv_d * strength
+                fy += dy * inv_d * strength
+        return fx, fy
+
+    @njit(fastmath=FASTMATH, cache=True)
+    def step_verlet(xs, ys, vxs, vys, types, table, fx, fy, nbr_start, nbr_idx,
+                    radius, width, height,
+                    dt, damp, random_motion, max_velocity, method, calm, sleep, ids, rng): # pragma: no cover
+        """step_numba using the neighbour lists instead of the grid."""
+        sleeping = _sleep_level(calm, sleep)
+        _integrate_start(xs, ys, vxs, vys, fx, fy, dt, method, width, height, calm, sleeping)
+        _wake_sleepers_list(xs, ys, types, nbr_start, nbr_idx, radius, width, height, calm, sleeping)
+        for i in range(xs.shape[0]):
+            fx[i], fy[i] = _particle_force_list(i, xs, ys, types, table, nbr_start, nbr_idx,
+                                                radius, width, height, calm, sleeping)
+        _integrate(xs, ys, vxs, vys, fx, fy, dt, damp, random_motion, max_velocity, method,
+                   width, height, calm, sleeping, ids, rng)
+        _update_sleep(vxs, vys, fx, fy, calm, sleep)
+
+    @njit(fastmath=FASTMATH, cache=True, parallel=True)
+    def step_verlet_parallel(xs, ys, vxs, vys, types, table, fx, fy, nbr_start, nbr_idx,
+                             radius, width, height,
+                             dt, damp, random_motion, max_velocity, method, calm, sleep, ids, rng): # pragma: no cover
+        """Multi-threaded step_verlet."""
+        sleeping = _sleep_level(calm, sleep)
+        _integrate_start_parallel(xs, ys, vxs, vys, fx, fy, dt, method, width, height, calm, sleeping)
+        _wake_sleepers_list_parallel(xs, ys, types, nbr_start, nbr_idx, radius, width, height, calm, sleeping)
+        for i in prange(xs.shape[0]):
+            fx[i], fy[i] = _particle_force_list(i, xs, ys, types, table, nbr_start, nbr_idx,
+                                                radius, width, height, calm, sleeping)
+        _integrate_parallel(xs, ys, vxs, vys, fx, fy, dt, damp, random_motion, max_velocity, method,
+                            width, height, calm, sleeping, ids, rng)
+        _update_sleep(vxs, vys, fx, fy, calm, sleep)
+
+    @njit(fastmath=FASTMATH, cache=True)
+    def max_displacement2(xs, ys, vxs, vys, fx, fy, dt, method, x0, y0, width, height): # pragma: no cover
+        """
+        Largest squared (wrapped) distance of a particle from its reference
+        position, at the point where the next step evaluates the forces
+        (after _step_start of the integrator; the arrays are not changed).
+        """
+        half_w = 0.5 * width
+        half_h = 0.5 * height
+        best = 0.0
+        for i in range(xs.shape[0]):
+            x, y, _, _ = _step_start(xs[i], ys[i], vxs[i], vys[i], fx[i], fy[i], dt, method, width, height)
+            dx = _wrap_delta(x - x0[i], width, half_w)
+            dy = _wrap_delta(y - y0[i], height, half_h)
+            d2 = dx * dx + dy * dy
+            if d2 > best:
+                best = d2
+        return best
+
+
+    # -------------------- hashed grid --------------------
+    # For large, sparsely populated worlds: instead of cell_start over all
+    # nx * ny cells, an open-addressing hash table (table_keys -> table_slots)
+    # numbers the occupied cells only, and cell_start / cell_items are over
+    # these slots. Memory and clearing cost grow with the particle count,
+    # not with the world area. Cell keys, stencil and wrap are the same as
+    # for the dense grid.
+
+    @njit(fastmath=FASTMATH, cache=True, inline="always")
+    def _hash_cell(cell, mask): # pragma: no cover
+        # multiplicative hash: consecutive cells land in different buckets
+        return (cell * HASH_MULTIPLIER) & mask
+
+    @njit(fastmath=FASTMATH, cache=True)
+    def _find_slot(cell, table_keys, table_slots): # pragma: no cover
+        # slot of an occupied cell, -1 if the cell is empty
+        mask = table_keys.shape[0] - 1
+        h = _hash_cell(cell, mask)
+        while True:
+            key = table_keys[h]
+            if key == cell:
+                return table_slots[h]
+            if key == -1:
+                return -1
+            h = (h + 1) & mask
+
+    @njit(fastmath=FASTMATH, cache=True, nogil=True)
+    def bin_particles_hashed(xs, ys, inv_cw, inv_ch, nx, ny, table_keys, table_slots,
+                             cell_of, cell_start, cell_items): # pragma: no cover
+        """
+        Counting sort of particle indices by cell, with the occupied cells
+        numbered through the hash table (size: power of two > number of
+        particles). The particles of slot s are
+        cell_items[cell_start[s]:cell_start[s + 1]], in ascending index order.
+        Returns the number of occupied cells.
+        """
+        n = xs.shape[0]
+        mask = table_keys.shape[0] - 1
+        table_keys[:] = -1
+        nslots = 0
+        cell_start[0] = 0
+        for i in range(n):
+            cell = _cell_index(xs[i], inv_cw, nx) + _cell_index(ys[i], inv_ch, ny) * nx
+            h = _hash_cell(cell, mask)
+            while True:
+                key = table_keys[h]
+                if key == cell:
+                    slot = table_slots[h]
+                    break
+                if key == -1:
+                    slot = nslots
+                    table_keys[h] = cell
+                    table_slots[h] = slot
+                    cell_start[slot + 1] = 0
+                    nslots += 1
+                    break
+                h = (h + 1) & mask
+            cell_of[i] = slot
+            cell_start[slot + 1] += 1
+        for s in range(nslots):
+            cell_start[s + 1] += cell_start[s]
+        # scatter, same as bin_particles
+        for i in range(n):
+            slot = cell_of[i]
+            cell_of[i] = cell_start[slot]
+            cell_start[slot] += 1
+            cell_items[cell_of[i]] = i
+        for s in range(nslots, 0, -1):
+            cell_start[s] = cell_start[s - 1]
+        cell_start[0] = 0
+        return nslots
+
+    @njit(fastmath=FASTMATH, cache=True)
+    def _woken_hashed(j, xs, ys, types, table_keys, table_slots, cell_start, cell_items, stencil,
+                      nx, ny, inv_cw, inv_ch, radius, width, height, calm): # pragma: no cover
+        # _woken, looking the stencil cells up in the hash table
+        xj = xs[j]
+        yj = ys[j]
+        row = radius[types[j]]
+        cxj = _cell_index(xj, inv_cw, nx)
+        cyj = _cell_index(yj, inv_ch, ny)
+        half_w = 0.5 * width
+        half_h = 0.5 * height
+        for s in range(stencil.shape[0]):
+            gx = (cxj + stencil[s, 0]) % nx
+            gy = (cyj + stencil[s, 1]) % ny
+            slot = _find_slot(gx + gy * nx, table_keys, table_slots)
+            if slot < 0:
+                continue
+            for p in range(cell_start[slot], cell_start[slot + 1]):
+                i = cell_items[p]
+                if i == j or calm[i] != 0:
+                    continue
+                dx = _wrap_delta(xs[i] - xj, width, half_w)
+                dy = _wrap_delta(ys[i] - yj, height, half_h)
+                r = row[types[i]]
+                if dx * dx + dy * dy <= r * r:
+                    return True
+        return False
+
+    @njit(fastmath=FASTMATH, cache=True)
+    def _wake_sleepers_hashed(xs, ys, types, table_keys, table_slots, cell_start, cell_items, stencil,
+                              nx, ny, inv_cw, inv_ch, radius, width, height, calm, sleep_steps): # pragma: no cover
+        # _wake_sleepers on the hashed grid
+        if sleep_steps <= 0:
+            return
+        n = xs.shape[0]
+        woken = np.zeros(n, dtype=np.bool_)
+        for j in range(n):
+            if _asleep(calm, j, sleep_steps):
+                woken[j] = _woken_hashed(j, xs, ys, types, table_keys, table_slots, cell_start, cell_items,
+                                         stencil, nx, ny, inv_cw, inv_ch, radius, width, height, calm)
+        _wake_up(woken, calm)
+
+    @njit(fastmath=FASTMATH, cache=True, parallel=True)
+    def _wake_sleepers_hashed_parallel(xs, ys, types, table_keys, table_slots, cell_start, cell_items, stencil,
+                                       nx, ny, inv_cw, inv_ch, radius, width, height,
+                                       calm, sleep_steps): # pragma: no cover
+        # multi-threaded _wake_sleepers_hashed
+        if sleep_steps <= 0:
+            return
+        n = xs.shape[0]
+        woken = np.zeros(n, dtype=np.bool_)
+        for j in prange(n):
+            if _asleep(calm, j, sleep_steps):
+                woken[j] = _woken_hashed(j, xs, ys, types, table_keys, table_slots, cell_start, cell_items,
+                                         stencil, nx, ny, inv_cw, inv_ch, radius, width, height, calm)
+        _wake_up(woken, calm)
+
+    @njit(fastmath=FASTMATH, cache=True)
+    def _particle_force_hashed(i, xs, ys, types, table, table_keys, table_slots, cell_start, cell_items,
+                               stencil, nx, ny, inv_cw, inv_ch, radius, width, height, calm, sleep_steps): # pragma: no cover
+        # _particle_force, looking the stencil cells up in the hash table
+        if _asleep(calm, i, sleep_steps):
+            return 0.0, 0.0
+        xi = xs[i]
+        yi = ys[i]
+        ti = types[i]
+        cxi = _cell_index(xi, inv_cw, nx)
+        cyi = _cell_index(yi, inv_ch, ny)
+
+        half_w = 0.5 * width
+        half_h = 0.5 * height
+        fx = 0.0
+        fy = 0.0
+
+        for s in range(stencil.shape[0]):
+            gx = (cxi + stencil[s, 0]) % nx
+            gy = (cyi + stencil[s, 1]) % ny
+            slot = _find_slot(gx + gy * nx, table_keys, table_slots)
+            if slot < 0:
+                continue
+            for p in range(cell_start[slot], cell_start[slot + 1]):
+                j = cell_items[p]
+                if j == i:
+                    continue
+                dx = _wrap_delta(xs[j] - xi, width, half_w)
+                dy = _wrap_delta(ys[j] - yi, height, half_h)
+                d2 = dx * dx + dy * dy
+
+                tj = types[j]
+                rij = radius[ti, tj]
+                if d2 > 1e-6 and d2 <= rij * rij:
+                    inv_d = 1.0 / math.sqrt(d2)
+                    strength = _sample_force(table, ti, tj, d2 * inv_d / rij)
+                    fx += dx * inv_d * strength
+                    fy += dy * inv_d * strength
+        return fx, fy
+
+    @njit(fastmath=FASTMATH, cache=True, nogil=True)
+    def compute_forces_hashed(xs, ys, types, table, fx, fy, table_keys, table_slots,
+                              cell_of, cell_start, cell_items, stencil,
+                              nx, ny, inv_cw, inv_ch, radius, width, height, calm, sleep_steps): # pragma: no cover
+        """compute_forces_numba on the hashed grid."""
+        bin_particles_hashed(xs, ys, inv_cw, inv_ch, nx, ny, table_keys, table_slots,
+                             cell_of, cell_start, cell_items)
+        _wake_sleepers_hashed(xs, ys, types, table_keys, table_slots, cell_start, cell_items, stencil,
+                              nx, ny, inv_cw, inv_ch, radius, width, height, calm, sleep_steps)
+        for i in range(xs.shape[0]):
+            fx[i], fy[i] = _particle_force_hashed(
+                i, xs, ys, types, table, table_keys, table_slots, cell_start, cell_items,
+                stencil, nx, ny, inv_cw, inv_ch, radius, width, height, calm, sleep_steps,
+            )
+
+    @njit(fastmath=FASTMATH, cache=True, parallel=True, nogil=True)
+    def compute_forces_hashed_parallel(xs, ys, types, table, fx, fy, table_keys, table_slots,
+                                       cell_of, cell_start, cell_items, stencil,
+                                       nx, ny, inv_cw, inv_ch, radius, width, height, calm, sleep_steps): # pragma: no cover
+        """Multi-threaded compute_forces_hashed (the grid build stays serial, it is O(n))."""
+        bin_particles_hashed(xs, ys, inv_cw, inv_ch, nx, ny, table_keys, table_slots,
+                             cell_of, cell_start, cell_items)
+        _wake_sleepers_hashed_parallel(xs, ys, types, table_keys, table_slots, cell_start, cell_items, stencil,
+                                       nx, ny, inv_cw, inv_ch, radius, width, height, calm, sleep_steps)
+        for i in prange(xs.shape[0]):
+            fx[i], fy[i] = _particle_force_hashed(
+                i, xs, ys, types, table, table_keys, table_slots, cell_start, cell_items,
+                stencil, nx, ny, inv_cw, inv_ch, radius, width, height, calm, sleep_steps,
+            )
+
+    @njit(fastmath=FASTMATH, cache=True)
+    def _neighbors_of_hashed(i, xs, ys, types, table_keys, table_slots, cell_start, cell_items, stencil,
+                             nx, ny, inv_cw, inv_ch, radius2, width, height, nbr_idx, pos): # pragma: no cover
+        # _neighbors_of on the hashed grid
+        xi = xs[i]
+        yi = ys[i]
+        row = radius2[types[i]]
+        cxi = _cell_index(xi, inv_cw, nx)
+        cyi = _cell_index(yi, inv_ch, ny)
+        half_w = 0.5 * width
+        half_h = 0.5 * height
+        count = 0
+        for s in range(stencil.shape[0]):
+            gx = (cxi + stencil[s, 0]) % nx
+            gy = (cyi + stencil[s, 1]) % ny
+            slot = _find_slot(gx + gy * nx, table_keys, table_slots)
+            if slot < 0:
+                continue
+            for p in range(cell_start[slot], cell_start[slot + 1]):
+                j = cell_items[p]
+                if j == i:
+                    continue
+                dx = _wrap_delta(xs[j] - xi, width, half_w)
+                dy = _wrap_delta(ys[j] - yi, height, half_h)
+                if dx * dx + dy * dy <= row[types[j]]:
+                    if pos >= 0:
+                        nbr_idx[pos + count] = j
+                    count += 1
+        return count
+
+    @njit(fastmath=FASTMATH, cache=True, parallel=True, nogil=True)
+    def count_neighbors_hashed(xs, ys, types, table_keys, table_slots, cell_start, cell_items, stencil,
+                               nx, ny, inv_cw, inv_ch, radius, width, height, nbr_start, nbr_idx): # pragma: no cover
+        """count_neighbors on the hashed grid."""
+        n = xs.shape[0]
+        radius2 = radius * radius
+        nbr_start[0] = 0
+        for i in prange(n):
+            nbr_start[i + 1] = _neighbors_of_hashed(i, xs, ys, types, table_keys, table_slots, cell_start, cell_items,
+                                                    stencil, nx, ny, inv_cw, inv_ch, radius2, width, height,
+                                                    nbr_idx, -1)
+        for i in range(n):
+            nbr_start[i + 1] += nbr_start[i]
+        return nbr_start[n]
+
+    @njit(fastmath=FASTMATH, cache=True, parallel=True, nogil=True)
+    def fill_neighbors_hashed(xs, ys, types, table_keys, table_slots, cell_start, cell_items, stencil,
+                              nx, ny, inv_cw, inv_ch, radius, width, height, nbr_start, nbr_idx): # pragma: no cover
+        """fill_neighbors on the hashed grid."""
+        radius2 = radius * radius
+        for i in prange(xs.shape[0]):
+            _neighbors_of_hashed(i, xs, ys, types, table_keys, table_slots, cell_start, cell_items, stencil,
+                                 nx, ny, inv_cw, inv_ch, radius2, width, height, nbr_idx, nbr_start[i])
+
+    # -------------------- multi-step runners --------------------
+    # Advance several steps in one call, so long headless runs do not pay
+    # the Python dispatch of every single step.
+
+    @njit(fastmath=FASTMATH, cache=True, nogil=True)
+    def run_numba(xs, ys, vxs, vys, types, table, fx, fy, cell_of, cell_start, cell_items, stencil, half_shell,
+                  nx, ny, inv_cw, inv_ch, radius, width, height,
+                  dt, damp, random_motion, max_velocity, method, calm, sleep, ids, rng, steps): # pragma: no cover
+        """`steps` times step_numba."""
+        for k in range(steps):
+            step_numba(xs, ys, vxs, vys, types, table, fx, fy, cell_of, cell_start, cell_items, stencil, half_shell,
+                       nx, ny, inv_cw, inv_ch, radius, width, height,
+                       dt, damp, random_motion, max_velocity, method, calm, sleep, ids, (rng[0], rng[1] + k))
+
+    @njit(fastmath=FASTMATH, cache=True, nogil=True)
+    def run_parallel(xs, ys, vxs, vys, types, table, fx, fy, nchunks,
+                     cell_of, chunk_counts, cell_start, cell_items, stencil,
+                     nx, ny, inv_cw, inv_ch, radius, width, height,
+                     dt, damp, random_motion, max_velocity, method, calm, sleep, ids, rng, steps): # pragma: no cover
+        """`steps` times step_parallel."""
+        for k in range(steps):
+            step_parallel(xs, ys, vxs, vys, types, table, fx, fy, nchunks,
+                          cell_of, chunk_counts, cell_start, cell_items, stencil,
+                          nx, ny, inv_cw, inv_ch, radius, width, height,
+                          dt, damp, random_motion, max_velocity, method, calm, sleep, ids, (rng[0], rng[1] + k))
+
+    @njit(fastmath=FASTMATH, cache=True, nogil=True)
+    def run_hashed(xs, ys, vxs, vys, types, table, fx, fy, table_keys, table_slots,
+                   cell_of, cell_start, cell_items, stencil,
+                   nx, ny, inv_cw, inv_ch, radius, width, height,
+                   dt, damp, random_motion, max_velocity, method, calm, sleep, ids, rng, steps): # pragma: no cover
+        """`steps` full steps on the hashed grid."""
+        for k in range(steps):
+            sleeping = _sleep_level(calm, sleep)
+            _integrate_start(xs, ys, vxs, vys, fx, fy, dt, method, width, height, calm, sleeping)
+            compute_forces_hashed(xs, ys, types, table, fx, fy, table_keys, table_slots,
+                                  cell_of, cell_start, cell_items, stencil,
+                                  nx, ny, inv_cw, inv_ch, radius, width, height, calm, sleeping)
+            _integrate(xs, ys, vxs, vys, fx, fy, dt, damp, random_motion, max_velocity, method,
+                       width, height, calm, sleeping, ids, (rng[0], rng[1] + k))
+            _update_sleep(vxs, vys, fx, fy, calm, sleep)
+
+    @njit(fastmath=FASTMATH, cache=True, nogil=True)
+    def run_hashed_parallel(xs, ys, vxs, vys, types, table, fx, fy, table_keys, table_slots,
+                            cell_of, cell_start, cell_items, stencil,
+                            nx, ny, inv_cw, inv_ch, radius, width, height,
+                            dt, damp, random_motion, max_velocity, method, calm, sleep, ids, rng, steps): # pragma: no cover
+        """Multi-threaded run_hashed."""
+        for k in range(steps):
+            sleeping = _sleep_level(calm, sleep)
+            _integrate_start_parallel(xs, ys, vxs, vys, fx, fy, dt, method, width, height, calm, sleeping)
+            compute_forces_hashed_parallel(xs, ys, types, table, fx, fy, table_keys, table_slots,
+                                           cell_of, cell_start, cell_items, stencil,
+                                           nx, ny, inv_cw, inv_ch, radius, width, height, calm, sleeping)
+            _integrate_parallel(xs, ys, vxs, vys, fx, fy, dt, damp, random_motion, max_velocity, method,
+                                width, height, calm, sleeping, ids, (rng[0], rng[1] + k))
+            _update_sleep(vxs, vys, fx, fy, calm, sleep)
+
+    @njit(fastmath=FASTMATH, cache=True, nogil=True)
+    def run_verlet(xs, ys, vxs, vys, types, table, fx, fy, nbr_start, nbr_idx, parallel,
+                   radius, width, height,
+                   dt, damp, random_motion, max_velocity, method, calm, sleep, ids, rng,
+                   x0, y0, max_move2, steps): # pragma: no cover
+        """
+        Up to `steps` times step_verlet (or step_verlet_parallel).
+        Stops early as soon as a particle moved more than sqrt(max_move2)
+        from its list-build position x0 / y0, so the caller can rebuild
+        the lists. Returns the number of steps done.
+        """
+        for k in range(steps):
+            if max_displacement2(xs, ys, vxs, vys, fx, fy, dt, method, x0, y0, width, height) > max_move2:
+                return k
+            step_rng = (rng[0], rng[1] + k)
+            if parallel:
+                step_verlet_parallel(xs, ys, vxs, vys, types, table, fx, fy, nbr_start, nbr_idx,
+                                     radius, width, height,
+                                     dt, damp, random_motion, max_velocity, method, calm, sleep, ids, step_rng)
+            else:
+                step_verlet(xs, ys, vxs, vys, types, table, fx, fy, nbr_start, nbr_idx,
+                            radius, width, height,
+                            dt, damp, random_motion, max_velocity, method, calm, sleep, ids, step_rng)
+        return steps
+
+    # -------------------- ensembles --------------------
+    # K independent universes in one array set (see ensemble.py): universe u
+    # owns the particles offsets[u]:offsets[u + 1] and the cell counts
+    # cell_start[u * (ncell + 1):(u + 1) * (ncell + 1)] of a shared grid
+    # shape. One thread runs one universe with the serial kernels.
+
+    @njit(fastmath=FASTMATH, cache=True, parallel=True, nogil=True)
+    def run_ensemble(xs, ys, vxs, vys, types, table, fx, fy, offsets, cell_of, cell_start, cell_items,
+                     stencil, half_shell, nx, ny, inv_cw, inv_ch, radius, width, height,
+                     dt, damp, random_motion, max_velocity, method, calm, sleep, ids, seeds, step,
+                     steps): # pragma: no cover
+        """
+        `steps` times step_numba on every universe. Universe u draws its
+        jitter with seeds[u], the first step is number `step`.
+        """
+        ncell = nx * ny
+        for u in prange(offsets.shape[0] - 1):
+            a = offsets[u]
+            b = offsets[u + 1]
+            c = u * (ncell + 1)
+            for k in range(steps):
+                step_numba(xs[a:b], ys[a:b], vxs[a:b], vys[a:b], types[a:b], table, fx[a:b], fy[a:b],
+                           cell_of[a:b], cell_start[c:c + ncell + 1], cell_items[a:b], stencil, half_shell,
+                           nx, ny, inv_cw, inv_ch, radius, width, height,
+                           dt, damp, random_motion, max_velocity, method, calm[a:b], sleep,
+                           ids[a:b], (seeds[u], step + k))
+
+    @njit(fastmath=FASTMATH, cache=True, parallel=True, nogil=True)
+    def compute_forces_ensemble(xs, ys, types, table, fx, fy, offsets, cell_of, cell_start, cell_items,
+                                stencil, half_shell, nx, ny, inv_cw, inv_ch, radius, width, height,
+                                calm, sleep_steps): # pragma: no cover
+        """compute_forces_numba on every universe (positions are not changed)."""
+        ncell = nx * ny
+        for u in prange(offsets.shape[0] - 1):
+            a = offsets[u]
+            b = offsets[u + 1]
+            c = u * (ncell + 1)
+            compute_forces_numba(xs[a:b], ys[a:b], types[a:b], table, fx[a:b], fy[a:b],
+                                 cell_of[a:b], cell_start[c:c + ncell + 1], cell_items[a:b], stencil, half_shell,
+                                 nx, ny, inv_cw, inv_ch, radius, width, height, calm[a:b], sleep_steps)
+
+    @njit(fastmath=FASTMATH, cache=True, nogil=True)
+    def motion_extremes(vxs, vys, fx, fy): # pragma: no cover
+        """Largest squared speed and largest squared force of any particle (for the dt controller)."""
+        v2 = 0.0
+        f2 = 0.0
+        for i in range(vxs.shape[0]):
+            s = vxs[i] * vxs[i] + vys[i] * vys[i]
+            if s > v2:
+                v2 = s
+            s = fx[i] * fx[i] + fy[i] * fy[i]
+            if s > f2:
+                f2 = s
+        return v2, f2
+
+
+def max_threads() -> int:
+    """Number of threads the parallel kernels can use on this host."""
+    if not NUMBA_OK:
+        return 1
+    return int(numba.config.NUMBA_NUM_THREADS)
+
+
+def set_threads(num_threads: int) -> int:
+    """
+    Caps the threads used by the parallel kernels.
+    0 (or anything above the host limit) means all available threads.
+    Returns the number of threads actually used.
+    """
+    limit = max_threads()
+    if num_threads <= 0 or num_threads > limit:
+        num_threads = limit
+    if NUMBA_OK:
+        numba.set_num_threads(num_threads)
+    return num_threads
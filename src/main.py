@@ -146,6 +146,11 @@ def main() -> None:
     width, height = 800, 600
 
     config = create_or_load_config()
+    # performance features of the engine, off in a plain config: keep the
+    # arrays sorted by cell, size the grid by density, hash sparse worlds
+    config.sort_interval = 20
+    config.adaptive_grid = True
+    config.grid_mode = "auto"
 
     system = ParticleSystem(
         particles=[],
@@ -165,6 +170,7 @@ def main() -> None:
         height,
         target_fps=60,
         speed_factor=4.0,
+        threaded=True,
     )
     visualizer.run()
 
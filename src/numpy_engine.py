@@ -0,0 +1,206 @@
+"""
+NumPy implementation of the simulation step, used when Numba is not
+available.
+
+It uses the same grid (see kernels.py), force profile table, periodic
+wrap and integrator as the compiled kernels. Instead of looping over particles it
+works on blocks of cell pairs: for every offset of the half stencil all
+(particle, neighbour-cell particle) pairs are expanded into flat index
+arrays, evaluated at once and summed back with np.bincount. Each
+unordered pair is visited once and applies the force in both directions,
+like the half-shell kernel. Only occupied cells are stored (sorted cell
+keys), so memory does not depend on the world size.
+"""
+import numpy as np
+from kernels import GridGeometry, cell_keys, EULER, VELOCITY_VERLET, LEAPFROG
+from kernels import NOISE_GOLDEN, NOISE_MIX1, NOISE_MIX2
+
+# upper bound for the number of candidate pairs expanded at once
+PAIR_BLOCK = 1 << 18
+
+
+def _sample_force(table, ti, tj, q):
+    # linear interpolation in the profile table (kernels._sample_force)
+    last = table.shape[2] - 1
+    x = q * last
+    m = np.minimum(x.astype(np.int64), last - 1)
+    lo = table[ti, tj, m]
+    return lo + (table[ti, tj, m + 1] - lo) * (x - m)
+
+
+def _wrap_delta(d, size):
+    # minimum image
+    half = 0.5 * size
+    d = np.where(d > half, d - size, d)
+    return np.where(d < -half, d + size, d)
+
+
+def compute_forces_numpy(xs, ys, types, table, fx, fy, grid: GridGeometry, radius, width, height) -> None:
+    """
+    Fills fx / fy with the total force on every particle (positions are
+    not changed). radius[ti, tj] is the interaction radius of each type pair.
+    """
+    n = xs.shape[0]
+    nx, ny = grid.nx, grid.ny
+    acc_x = np.zeros(n)
+    acc_y = np.zeros(n)
+    x = xs.astype(np.float64)
+    y = ys.astype(np.float64)
+    radius = np.asarray(radius, dtype=np.float64)
+    radius2 = float(radius.max()) ** 2 if radius.size else 0.0
+
+    # particles sorted by cell; cells[c] is the c-th occupied cell, its
+    # particles are items[starts[c]:starts[c] + counts[c]]
+    keys = cell_keys(xs, ys, grid)
+    items = np.argsort(keys, kind="stable")
+    slot_cell = keys[items]
+    cells, starts, counts = np.unique(slot_cell, return_index=True, return_counts=True)
+    slot_cx = slot_cell % nx
+    slot_cy = slot_cell // nx
+
+    for ox, oy, tie in grid.half_stencil.tolist():
+        other = (slot_cx + ox) % nx + ((slot_cy + oy) % ny) * nx
+        pos = np.minimum(np.searchsorted(cells, other), cells.shape[0] - 1)
+        found = cells[pos] == other
+        partners = np.where(found, counts[pos], 0)
+        other_start = starts[pos]
+        ends = np.cumsum(partners)
+
+        a = 0
+        while a < n:
+            base = ends[a - 1] if a else 0
+            b = max(a + 1, int(np.searchsorted(ends, base + PAIR_BLOCK, side="right")))
+            block = partners[a:b]
+            total = int(block.sum())
+            if total:
+                # expand slot s into partners[s] pairs with every particle of its neighbour cell
+                slot = np.repeat(np.arange(a, b), block)
+                offset = np.arange(total) - np.repeat(np.cumsum(block) - block, block)
+                i = items[slot]
+                j = items[other_start[slot] + offset]
+                if tie:
+                    keep = j > i
+                    i = i[keep]
+                    j = j[keep]
+
+                dx = _wrap_delta(x[j] - x[i], width)
+                dy = _wrap_delta(y[j] - y[i], height)
+                d2 = dx * dx + dy * dy
+                near = (d2 > 1e-6) & (d2 <= radius2)
+                i = i[near]
+                j = j[near]
+                d2 = d2[near]
+                d = np.sqrt(d2)
+                ux = dx[near] / d
+                uy = dy[near] / d
+
+                # each direction has its own pair radius (zero force outside it)
+                ti = types[i]
+                tj = types[j]
+                r_ij = radius[ti, tj]
+                r_ji = radius[tj, ti]
+                q_ij = np.minimum(d / np.maximum(r_ij, 1e-12), 1.0)
+                q_ji = np.minimum(d / np.maximum(r_ji, 1e-12), 1.0)
+                s_ij = np.where(d2 <= r_ij * r_ij, _sample_force(table, ti, tj, q_ij), 0.0)
+                s_ji = np.where(d2 <= r_ji * r_ji, _sample_force(table, tj, ti, q_ji), 0.0)
+                # j sees i in the opposite direction
+                acc_x += np.bincount(i, ux * s_ij, minlength=n) - np.bincount(j, ux * s_ji, minlength=n)
+                acc_y += np.bincount(i, uy * s_ij, minlength=n) - np.bincount(j, uy * s_ji, minlength=n)
+            a = b
+
+    fx[:n] = acc_x
+    fy[:n] = acc_y
+
+
+def motion_extremes_numpy(vxs, vys, fx, fy) -> tuple:
+    """Largest squared speed and squared force (kernels.motion_extremes)."""
+    if vxs.shape[0] == 0:
+        return 0.0, 0.0
+    n = vxs.shape[0]
+    v2 = vxs.astype(np.float64) ** 2 + vys.astype(np.float64) ** 2
+    f2 = fx[:n].astype(np.float64) ** 2 + fy[:n].astype(np.float64) ** 2
+    return float(v2.max()), float(f2.max())
+
+
+def _mix64(z):
+    # splitmix64 finalizer (kernels._mix64), uint64 arrays wrap silently
+    z = (z ^ (z >> np.uint64(30))) * np.uint64(NOISE_MIX1)
+    z = (z ^ (z >> np.uint64(27))) * np.uint64(NOISE_MIX2)
+    return z ^ (z >> np.uint64(31))
+
+
+def counter_uniform_numpy(seed: int, ids: np.ndarray, counter: int) -> np.ndarray:
+    """
+    Deterministic jitter in [-1, 1) of every particle id for one counter
+    value, bit-identical to kernels._counter_uniform.
+    """
+    golden = np.uint64(NOISE_GOLDEN)
+    z = np.full(ids.shape[0], seed, dtype=np.uint64) * golden + ids.astype(np.uint64)
+    z = _mix64(z)
+    z = _mix64(z + np.full(ids.shape[0], counter, dtype=np.uint64) * golden)
+    return (z >> np.uint64(11)).astype(np.float64) * (1.0 / 4503599627370496.0) - 1.0
+
+
+def _wrap_positions(xs, ys, width, height) -> None:
+    for pos, size in ((xs, width), (ys, height)):
+        pos %= size
+        # float rounding can turn tiny negative values into exactly size
+        pos[pos >= size] = 0.0
+
+
+def integrate_start_numpy(xs, ys, vxs, vys, fx, fy, dt, method, width, height) -> None:
+    """Part of the step before the forces (kernels._integrate_start)."""
+    n = xs.shape[0]
+    if dt <= 0.0 or method == EULER:
+        return
+    if method == VELOCITY_VERLET:
+        vxs += fx[:n] * (0.5 * dt)
+        vys += fy[:n] * (0.5 * dt)
+        xs += vxs * dt
+        ys += vys * dt
+    else:
+        xs += vxs * (0.5 * dt)
+        ys += vys * (0.5 * dt)
+    _wrap_positions(xs, ys, width, height)
+
+
+def integrate_numpy(xs, ys, vxs, vys, fx, fy, dt, damp, random_motion, max_velocity, width, height,
+                    method=EULER, ids=None, rng=(0, 0)) -> None:
+    """
+    Velocity update from the forces, then move and wrap (kernels._integrate).
+    rng = (seed, step): the jitter comes from the counter-based stream of
+    the particle ids (ids=None: their array index), like in the kernels.
+    """
+    n = xs.shape[0]
+    if dt > 0.0:
+        kick = 0.5 * dt if method == VELOCITY_VERLET else dt
+        vx = (vxs + fx[:n] * kick) * damp
+        vy = (vys + fy[:n] * kick) * damp
+        if random_motion > 0.0:
+            seed, step = rng
+            if ids is None:
+                ids = np.arange(n)
+            vx += random_motion * counter_uniform_numpy(seed, ids, 2 * step)
+            vy += random_motion * counter_uniform_numpy(seed, ids, 2 * step + 1)
+        speed2 = vx * vx + vy * vy
+        too_fast = speed2 > max_velocity * max_velocity
+        scale = np.ones(n)
+        scale[too_fast] = max_velocity / np.sqrt(speed2[too_fast])
+        vxs[:] = vx * scale
+        vys[:] = vy * scale
+        if method == EULER:
+            xs += vxs * dt
+            ys += vys * dt
+        elif method == LEAPFROG:
+            xs += vxs * (0.5 * dt)
+            ys += vys * (0.5 * dt)
+    _wrap_positions(xs, ys, width, height)
+
+
+def step_numpy(xs, ys, vxs, vys, types, table, fx, fy, grid: GridGeometry, radius, width, height,
+               dt, damp, random_motion, max_velocity, method=EULER, ids=None, rng=(0, 0)) -> None:
+    """One full step: forces, then integration (kernels.step_numba)."""
+    integrate_start_numpy(xs, ys, vxs, vys, fx, fy, dt, method, width, height)
+    compute_forces_numpy(xs, ys, types, table, fx, fy, grid, radius, width, height)
+    integrate_numpy(xs, ys, vxs, vys, fx, fy, dt, damp, random_motion, max_velocity, width, height, method,
+                    ids, rng)
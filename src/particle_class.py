@@ -49,4 +49,94 @@ class Particle:
         
         # Update the position
         self.position_x += self.velocity_x * dt
-        self.position_y += self.velocity_y * dt
\ No newline at end of file
+        self.position_y += self.velocity_y * dt
+
+
+class ParticleView(Particle):
+    """
+    Thin view on one particle inside a ParticleStore.
+
+    The fields are not copied: reading or writing an attribute goes
+    straight to the store arrays, so the simulation sees every change.
+    The view follows the particle by its id, so it stays valid when the
+    store grows or reorders its particles.
+    Used where single particles are needed (UI selection, tests).
+    """
+
+    def __init__(self, store, particle_id: int):
+        self._store = store
+        self._id = particle_id
+
+    @property
+    def index(self) -> int:
+        """Current index of the particle in the store arrays."""
+        return self._store.index_of(self._id)
+
+    # ------------------------ fields ------------------------
+
+    @property
+    def position_x(self) -> float:
+        return float(self._store.xs[self.index])
+
+    @position_x.setter
+    def position_x(self, value: float):
+        self._store.xs[self.index] = value
+
+    @property
+    def position_y(self) -> float:
+        return float(self._store.ys[self.index])
+
+    @position_y.setter
+    def position_y(self, value: float):
+        self._store.ys[self.index] = value
+
+    @property
+    def velocity_x(self) -> float:
+        return float(self._store.vxs[self.index])
+
+    @velocity_x.setter
+    def velocity_x(self, value: float):
+        self._store.vxs[self.index] = value
+
+    @property
+    def velocity_y(self) -> float:
+        return float(self._store.vys[self.index])
+
+    @velocity_y.setter
+    def velocity_y(self, value: float):
+        self._store.vys[self.index] = value
+
+    @property
+    def particle_type(self) -> int:
+        return int(self._store.types[self.index])
+
+    @particle_type.setter
+    def particle_type(self, value: int):
+        self._store.types[self.index] = value
+
+    @property
+    def color(self) -> str:
+        # colors are per type, the store keeps only the palette
+        return self._store.colors[self.particle_type]
+
+    # ------------------------ comparison ------------------------
+
+    _FIELDS = ("position_x", "position_y", "velocity_x", "velocity_y", "particle_type", "color")
+
+    def __eq__(self, other):
+        if isinstance(other, ParticleView) and other._store is self._store:
+            return other._id == self._id
+        # compare by value with plain particles (duck typed, the class may be imported twice)
+        try:
+            return all(getattr(self, f) == getattr(other, f) for f in self._FIELDS)
+        except AttributeError:
+            return NotImplemented
+
+    def __hash__(self):
+        return hash((id(self._store), self._id))
+
+    def __repr__(self):
+        return (f"ParticleView(id={self._id}, position_x={self.position_x}, "
+                f"position_y={self.position_y}, velocity_x={self.velocity_x}, "
+                f"velocity_y={self.velocity_y}, particle_type={self.particle_type}, "
+                f"color={self.color!r})")
@@ -0,0 +1,176 @@
+from typing import Iterable, Iterator, Sequence
+import numpy as np
+from particle_class import Particle, ParticleView
+
+
+class ParticleStore:
+    """
+    Structure-of-arrays storage for all particles of a ParticleSystem.
+
+    Positions, velocities and types are kept in contiguous NumPy arrays
+    (x, y, vx, vy as float32 or float64, type as int32) that the compiled
+    kernels read and write in place. The store still behaves like a list of
+    particles: indexing or iterating returns ParticleView objects.
+
+    Attributes:
+    ---------------------------------------
+    xs, ys, vxs, vys: np.ndarray
+        Positions and velocities of the active particles (length == len(store))
+
+    types: np.ndarray
+        Particle type of each active particle
+
+    ids: np.ndarray
+        Stable id of the particle at each index. Indices change when the
+        store is reordered, ids (and the views built on them) do not.
+
+    colors: sequence of str
+        Color per particle type (palette shared with SimulationConfig)
+    """
+
+    def __init__(self, colors: Sequence[str], capacity: int = 0, dtype=np.float32):
+        self.colors = colors
+        self.dtype = np.dtype(dtype)
+        self._n = 0
+        self._allocate(capacity)
+
+    # -------------- helpers ------------------
+
+    def _allocate(self, capacity: int) -> None:
+        old_n = self._n
+        old = None
+        if hasattr(self, "_xs"):
+            old = (self._xs, self._ys, self._vxs, self._vys, self._types, self._ids, self._slots)
+
+        self._xs = np.zeros(capacity, dtype=self.dtype)
+        self._ys = np.zeros(capacity, dtype=self.dtype)
+        self._vxs = np.zeros(capacity, dtype=self.dtype)
+        self._vys = np.zeros(capacity, dtype=self.dtype)
+        self._types = np.zeros(capacity, dtype=np.int32)
+        # ids[index] -> particle id, slots[id] -> index (ids are 0..n-1)
+        self._ids = np.zeros(capacity, dtype=np.int64)
+        self._slots = np.zeros(capacity, dtype=np.int64)
+
+        if old is not None and old_n:
+            new = (self._xs, self._ys, self._vxs, self._vys, self._types, self._ids, self._slots)
+            for dst, src in zip(new, old):
+                dst[:old_n] = src[:old_n]
+
+    def _reserve(self, count: int) -> None:
+        """Makes sure there is room for `count` particles (grows by doubling)."""
+        capacity = self._xs.shape[0]
+        if count <= capacity:
+            return
+        self._allocate(max(count, 2 * capacity, 16))
+
+    # -------------- array access ------------------
+
+    @property
+    def xs(self) -> np.ndarray:
+        return self._xs[:self._n]
+
+    @property
+    def ys(self) -> np.ndarray:
+        return self._ys[:self._n]
+
+    @property
+    def vxs(self) -> np.ndarray:
+        return self._vxs[:self._n]
+
+    @property
+    def vys(self) -> np.ndarray:
+        return self._vys[:self._n]
+
+    @property
+    def types(self) -> np.ndarray:
+        return self._types[:self._n]
+
+    @property
+    def ids(self) -> np.ndarray:
+        return self._ids[:self._n]
+
+    def index_of(self, particle_id: int) -> int:
+        """Current array index of the particle with the given id."""
+        return int(self._slots[particle_id])
+
+    def reorder(self, order: np.ndarray) -> None:
+        """
+        Permutes all particle arrays: the particle at index order[k]
+        moves to index k. Views keep pointing at the same particles.
+        """
+        n = self._n
+        for arr in (self._xs, self._ys, self._vxs, self._vys, self._types, self._ids):
+            arr[:n] = arr[:n][order]
+        self._slots[self._ids[:n]] = np.arange(n)
+
+    # -------------- adding / removing ------------------
+
+    def add_arrays(self, xs, ys, vxs, vys, types) -> None:
+        """Appends a batch of particles given as equally long arrays."""
+        count = len(xs)
+        start = self._n
+        self._reserve(start + count)
+        end = start + count
+        self._xs[start:end] = xs
+        self._ys[start:end] = ys
+        self._vxs[start:end] = vxs
+        self._vys[start:end] = vys
+        self._types[start:end] = types
+        self._ids[start:end] = np.arange(start, end)
+        self._slots[start:end] = np.arange(start, end)
+        self._n = end
+
+    def append(self, particle: Particle) -> None:
+        """Copies a Particle into the store."""
+        self.add_arrays(
+            [particle.position_x],
+            [particle.position_y],
+            [particle.velocity_x],
+            [particle.velocity_y],
+            [particle.particle_type],
+        )
+
+    def extend(self, particles: Iterable[Particle]) -> None:
+        particles = list(particles)
+        if not particles:
+            return
+        self.add_arrays(
+            [p.position_x for p in particles],
+            [p.position_y for p in particles],
+            [p.velocity_x for p in particles],
+            [p.velocity_y for p in particles],
+            [p.particle_type for p in particles],
+        )
+
+    def convert(self, dtype) -> None:
+        """Switches x, y, vx, vy to another float dtype (values are kept)."""
+        dtype = np.dtype(dtype)
+        if dtype == self.dtype:
+            return
+        self.dtype = dtype
+        self._xs = self._xs.astype(dtype)
+        self._ys = self._ys.astype(dtype)
+        self._vxs = self._vxs.astype(dtype)
+        self._vys = self._vys.astype(dtype)
+
+    def clear(self) -> None:
+        """Removes all particles (capacity is kept for reuse, ids start again at 0)."""
+        self._n = 0
+
+    # -------------- list-like access ------------------
+
+    def __len__(self) -> int:
+        return self._n
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [ParticleView(self, int(self._ids[i])) for i in range(*index.indices(self._n))]
+        if index < 0:
+            index += self._n
+        if not 0 <= index < self._n:
+            raise IndexError("particle index out of range")
+        return ParticleView(self, int(self._ids[index]))
+
+    def __iter__(self) -> Iterator[ParticleView]:
+        for i in range(self._n):
+            yield ParticleView(self, int(self._ids[i]))
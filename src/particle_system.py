@@ -1,183 +1,876 @@
 from particle_class import Particle
+from particle_store import ParticleStore
 from simulation_config import SimulationConfig
-from typing import List, Dict
+from force_profiles import get_profile, tabulate
+from typing import Callable, List, Dict
 import random
 import math
+import time
+import numpy as np
 # -------------------- NUMBA ADD-ON (optional acceleration) --------------------
-# Numba accelerates the hot loop (neighbor search + pairwise forces)
-try:
-    import numpy as np
-    from numba import njit
-    NUMBA_OK = True
-except Exception:
-    NUMBA_OK = False
-
+# Numba accelerates the hot loop (neighbor search + pairwise forces), see kernels.py
+from kernels import NUMBA_OK, grid_geometry, cell_keys, cell_counts, occupancy_stats, hash_table_size, set_threads
+from kernels import EULER, VELOCITY_VERLET, integrator_id, precision_dtype
+# without Numba the same step runs vectorized in NumPy
+from numpy_engine import compute_forces_numpy, step_numpy, motion_extremes_numpy
+# live state for other processes (publish_state, serve_stream)
+from shared_state import StatePublisher
+from streaming import StreamServer
 if NUMBA_OK:
-    @njit(fastmath=True, cache=True)
-    def _compute_forces_numba(xs, ys, types, matrix, r, cell_size, width, height, cell_range, beta, force_scale): # pragma: no cover
-        # uniform grid (spatial hashing) with a linked-list per cell:
-        n = xs.shape[0]
-        fx = np.zeros(n, dtype=np.float32)
-        fy = np.zeros(n, dtype=np.float32)
-
-        if n == 0:
-            return fx, fy
-
-        inv_cell = 1.0 / cell_size
-        radius2 = r * r
-
-        nx = int(width * inv_cell) + 1
-        ny = int(height * inv_cell) + 1
-        ncell = nx * ny
-
-        # head[cell] = first particle index in that cell, nxt[i] = next particle index in same cell.
-        head = np.full(ncell, -1, dtype=np.int32)
-        nxt = np.empty(n, dtype=np.int32)
-
-        half_w = 0.5 * width
-        half_h = 0.5 * height
-
-        # build linked list per cell
-        for i in range(n):
-            cx = int(xs[i] * inv_cell)
-            cy = int(ys[i] * inv_cell)
-
-            # wrap cell coords
-            cx = cx % nx
-            cy = cy % ny
-
-            c = cx + cy * nx
-            nxt[i] = head[c]
-            head[c] = i
+    from kernels import bin_particles, compute_forces_numba, compute_forces_parallel, run_numba, run_parallel
+    from kernels import count_neighbors, fill_neighbors, run_verlet
+    from kernels import bin_particles_hashed, compute_forces_hashed, compute_forces_hashed_parallel
+    from kernels import run_hashed, run_hashed_parallel
+    from kernels import count_neighbors_hashed, fill_neighbors_hashed
+    from kernels import motion_extremes
+# ---------------------------------------------------------------------
 
-        # compute forces
-        for i in range(n):
-            xi = xs[i]
-            yi = ys[i]
-            ti = types[i]
 
-            cxi = int(xi * inv_cell)
-            cyi = int(yi * inv_cell)
-
-            for dx_cell in range(-cell_range, cell_range + 1):
-                gx = cxi + dx_cell
-                if gx < 0:
-                    gx += nx 
-                elif gx >= nx:
-                    gx -= nx
-
-                for dy_cell in range(-cell_range, cell_range + 1):
-                    gy = cyi + dy_cell
-                    if gy < 0:
-                        gy += ny 
-                    elif gy >= ny:
-                        gy -= ny
-
-
-                    cell = gx + gy * nx
-                    j = head[cell]
-                    while j != -1:
-                        if j != i:
-                            # wrap dx/dy using half width/height so particles interact across borders correctly
-                            dx = xs[j] - xi
-                            dy = ys[j] - yi
-                            if dx > half_w:
-                                dx -= width
-                            elif dx < -half_w:
-                                dx += width
-
-                            if dy > half_h:
-                                dy -= height
-                            elif dy < -half_h:
-                                dy += height
-
-                            d2 = dx * dx + dy * dy
-
-                            if d2 > 1e-6 and d2 <= radius2:
-                                inv_d = 1.0 / math.sqrt(d2)
-                                dist = d2 * inv_d  # sqrt(d2)
-                                q = dist / r # normalized distance
-
-                                #COLLISION                                    
-                                if q < beta: # core repulsion for q < beta (ignores matrix)
-                                    strength = (q / beta - 1.0) * force_scale
-                                else:
-                                        tj = types[j]
-                                        k = matrix[ti, tj]
-                                        if k == 0.0:
-                                            j = nxt[j]
-                                            continue
-                                    # 2) "liquid/molecule" shaped interaction
-                                        f = 1.0 - abs(2.0 * q - 1.0 - beta) / (1.0 - beta)
-                                        strength = k * f * force_scale
-                                fx[i] += dx * inv_d * strength
-                                fy[i] += dy * inv_d * strength
-
-                        j = nxt[j]
-
-        return fx, fy
-# ---------------------------------------------------------------------
+def substep_count(config: SimulationConfig, dt: float) -> int:
+    """Equal substeps a step of size dt is split into (see ParticleSystem.substeps)."""
+    max_substep = float(config.max_substep)
+    if dt <= 0.0 or max_substep <= 0.0:
+        return 1
+    # a little slack so dt == max_substep is not split by rounding
+    return max(1, math.ceil(dt / max_substep - 1e-9))
+
+
+def step_factors(config: SimulationConfig, dt: float) -> tuple:
+    """Velocity damping and jitter amplitude of one step of size dt."""
+    # clamp friction to [0, 1), applied per second
+    friction = min(max(float(config.friction), 0.0), 0.999999)
+    damp = (1.0 - friction) ** dt if dt > 0.0 else 1.0
+    # scale random motion by sqrt(dt) for frame-rate independence
+    rm = float(config.random_motion) * (dt ** 0.5) if dt > 0.0 else 0.0
+    return damp, rm
+
+
+def use_half_shell(config: SimulationConfig) -> bool:
+    """Whether config.half_shell applies (see ParticleSystem._use_half_shell)."""
+    # the half shell applies forces to both particles of a pair, it has no
+    # way to skip sleeping receivers: full stencil while sleeping is on.
+    # It also sums in another order than the parallel kernel, so the
+    # deterministic mode always takes the full stencil
+    return bool(config.half_shell) and int(config.sleep_steps) <= 0 and not config.deterministic
+
+
+def force_table_key(config: SimulationConfig, dtype) -> tuple:
+    """What a force table of `config` depends on: rebuild it when this changes."""
+    return (
+        config.force_profile, get_profile(config.force_profile),
+        float(config.beta), float(config.force_scale),
+        tuple(map(tuple, config.interaction_matrix.matrix)), np.dtype(dtype),
+    )
+
+# adaptive grid: candidate cell sizes (search radius / k), and the cost of
+# visiting one stencil cell in units of one distance check
+GRID_DIVISIONS = (1, 2, 3, 4)
+CELL_VISIT_COST = 3.0
+# grid autotuner: candidate cell sizes (search radius / k, 1 / 0.6 is the
+# fixed default), timed force evaluations per candidate, and the width of
+# the neighbour-count buckets the choice is cached for
+AUTOTUNE_DIVISIONS = (1.0, 1.0 / 0.6, 2.0, 3.0, 4.0, 5.0)
+AUTOTUNE_REPEATS = 2
+AUTOTUNE_BUCKET = 1.5
+# grid_mode "auto" switches to the hashed grid above this many cells per particle
+HASHED_CELLS_PER_PARTICLE = 64
 
 
 class ParticleSystem:
     def __init__(self, particles: List[Particle], config: SimulationConfig, width: int, height: int):
-        self.particles = particles
+        # particles live in contiguous arrays, the given list is only copied in
+        self.particles = ParticleStore(config.particle_colors, capacity=len(particles),
+                                       dtype=precision_dtype(config.precision))
+        self.particles.extend(particles)
         self.config = config
         self.width = width
         self.height = height
         self._force_frame = 0
         self._grid = {}
 
-        # numpy-matrix cache
-        self._numba_matrix_np = None
-        self._numba_matrix_shape = None
+        # work buffers of the compiled step, reused across frames:
+        # counting-sort grid (cell_start / cell_items) and forces
+        self._cell_of = np.empty(0, dtype=np.int32)
+        self._cell_items = np.empty(0, dtype=np.int32)
+        self._cell_start = np.empty(0, dtype=np.int32)
+        self._fx = np.empty(0, dtype=self.particles.dtype)
+        self._fy = np.empty(0, dtype=self.particles.dtype)
+        self._grid_key = None
+        self._grid_params = None
+        # cells are search radius / k wide (0 = fixed 0.6 * radius), see adapt_grid()
+        self._grid_divisions = 0
+        # autotune_grid(): measured best k per configuration, last timings (k -> s)
+        self._autotune_cache = {}
+        self.autotune_timings = {}
+        # hashed grid (see kernels.bin_particles_hashed): cell_start is then over
+        # the occupied cells, the table maps cell key -> slot
+        self._hashed = False
+        self._hash_keys = np.empty(0, dtype=np.int64)
+        self._hash_slots = np.empty(0, dtype=np.int32)
+        # per-thread cell counts of the parallel grid build
+        self._chunk_counts = np.empty(0, dtype=np.int32)
+        self._threads = 0
+
+        # Verlet neighbour lists (used when config.verlet_skin > 0)
+        self._nbr_start = np.empty(0, dtype=np.int32)
+        self._nbr_idx = np.empty(0, dtype=np.int32)
+        self._verlet_x0 = np.empty(0, dtype=self.particles.dtype)
+        self._verlet_y0 = np.empty(0, dtype=self.particles.dtype)
+        self._verlet_key = None
+        self.verlet_rebuilds = 0
+        self.verlet_steps = 0
+
+        # integrator of the current run (kernels.EULER / VELOCITY_VERLET / LEAPFROG)
+        # and what the forces in fx / fy belong to (velocity Verlet reuses them)
+        self._method = EULER
+        self._forces_key = None
+        # dt controller: particle count the forces in fx / fy were computed
+        # for, and the last step size it picked
+        self._advanced_n = 0
+        self.last_dt = 0.0
+        # sleeping (config.sleep_steps > 0): calm-step counter per particle
+        self._calm = np.zeros(0, dtype=np.int32)
+        self._sleep_key = None
+        # per-pair radius cache (types x types)
+        self._pair_radii_np = None
+        self._pair_radii_key = None
+        # force profile table cache (matrix x profile samples)
+        self._force_table_np = None
+        self._force_table_key = None
+        # bumped whenever the force table or the pair radii are rebuilt
+        self._force_params_version = 0
+        # random motion: per-system generator (see reseed)
+        self.reseed()
+        # shared-memory state publishing (see publish_state)
+        self._publisher = None
+        self._publish_every = 1
+        self._published_frame = 0
+        # socket streaming to viewer processes (see serve_stream)
+        self._stream = None
+        self._stream_every = 1
+        self._streamed_frame = 0
         #dirty-flag to check if interaction values changed
         self.matrix_dirty = True
 
     def add_particles(self, count: int, types: List[int]):
         """Adds particles with positions and types"""
-        for _ in range(count):
-            particle_type = random.choice(types)
-            x = random.uniform(0, self.width)
-            y = random.uniform(0, self.height)
+        xs = np.empty(count)
+        ys = np.empty(count)
+        vxs = np.empty(count)
+        vys = np.empty(count)
+        new_types = np.empty(count, dtype=np.int32)
+
+        for k in range(count):
+            new_types[k] = random.choice(types)
+            xs[k] = random.uniform(0, self.width)
+            ys[k] = random.uniform(0, self.height)
 
             # Minimum starting velocity
-            vx = random.uniform(-0.5, 0.5)
-            vy = random.uniform(-0.5, 0.5)
-
-            color = self.config.particle_colors[particle_type]
-
-            p = Particle(
-                particle_type=particle_type,
-                position_x=x,
-                position_y=y,
-                velocity_x=vx,
-                velocity_y=vy,
-                color=color
-            )
-            self.particles.append(p)
+            vxs[k] = random.uniform(-0.5, 0.5)
+            vys[k] = random.uniform(-0.5, 0.5)
+
+        self.particles.add_arrays(xs, ys, vxs, vys, new_types)
+
+    @property
+    def engine(self) -> str:
+        """Which implementation runs the steps: "numba" or "numpy" (fallback)."""
+        return "numba" if NUMBA_OK else "numpy"
 
     def update_system(self, dt: float):
-        """Updated the whole system"""
-        self._force_frame += 1
-        self.calculate_forces(dt)
-
-        friction = self.config.friction
-        max_v = self.config.max_velocity
-        rnd_m = self.config.random_motion
-        rnd_change = rnd_m
-
-        for particle in self.particles:
-            particle.update_position(
-                dt,
-                friction,
-                max_v,
-                rnd_change
+        """
+        Updated the whole system. With config.adaptive_dt the time dt is
+        covered in steps picked by the dt controller (see advance_time).
+        """
+        if self.config.adaptive_dt:
+            self.advance_time(dt)
+        else:
+            self.step_n(1, dt)
+
+    def suggest_dt(self) -> float:
+        """
+        Step size for the current dynamics: no particle may move more
+        than config.dt_safety times the length scale in one step, neither
+        at its current speed nor from its acceleration. The length scale
+        is the smaller of the repulsive core (beta * smallest pair radius)
+        and the grid cell. Clamped to [config.dt_min, config.dt_max].
+        """
+        config = self.config
+        dt_min = float(config.dt_min)
+        dt_max = max(float(config.dt_max), dt_min)
+        store = self.particles
+        n = len(store)
+        radii = self._pair_radii()
+        positive = radii[radii > 0.0]
+        if n == 0 or positive.size == 0:
+            return dt_max
+
+        # forces of the last step are the acceleration estimate (unit mass);
+        # compute them when there are none for these particles yet
+        if self._advanced_n != n:
+            self._measure_forces(n, bool(config.parallel))
+            self._advanced_n = n
+        extremes = motion_extremes if NUMBA_OK else motion_extremes_numpy
+        v2, f2 = extremes(store.vxs, store.vys, self._fx[:n], self._fy[:n])
+
+        _, grid = self._prepare_step(n)
+        length = min(float(config.beta) * float(positive.min()), self.width / grid.nx, self.height / grid.ny)
+        reach = float(config.dt_safety) * length
+        dt = dt_max
+        if v2 > 0.0:
+            dt = min(dt, reach / math.sqrt(v2))
+        if f2 > 0.0:
+            dt = min(dt, math.sqrt(2.0 * reach / math.sqrt(f2)))
+        return max(dt, dt_min)
+
+    def advance_time(self, duration: float, max_steps: int = 0) -> np.ndarray:
+        """
+        Covers `duration` of simulated time with steps chosen by
+        suggest_dt() (max_substep does not apply, the steps are within
+        the controller bounds already). Stops early after max_steps steps
+        if > 0. Returns the dt of every step taken; the last one is also
+        kept in self.last_dt.
+        """
+        taken = []
+        elapsed = 0.0
+        duration = float(duration)
+        while duration - elapsed > 1e-12 and (max_steps <= 0 or len(taken) < max_steps):
+            dt = self.suggest_dt()
+            remaining = duration - elapsed
+            if remaining <= dt:
+                dt = remaining
+            elif remaining < 2.0 * dt:
+                # two even steps instead of a full one and a tiny rest
+                dt = 0.5 * remaining
+            self._advance(1, dt)
+            taken.append(dt)
+            elapsed += dt
+        if taken:
+            self.last_dt = taken[-1]
+        return np.array(taken)
+
+    def step_n(self, steps: int, dt: float, every: int = 0,
+               callback: Callable[["ParticleSystem", int], None] = None,
+               snapshots: bool = False) -> List[Dict[str, np.ndarray]]:
+        """
+        Advances the system by `steps` steps of size dt. The steps run
+        inside the compiled kernels and only come back to Python when
+        needed (every `every` steps, periodic sorting, Verlet rebuilds).
+        A dt larger than config.max_substep is split into equal substeps
+        (see substeps()), so large speed factors stay stable.
+
+        Parameters:
+        ---------------------------------------
+        steps: int
+            Number of steps to take
+
+        dt: float
+            Time step
+
+        every: int
+            If > 0, callback / snapshot are taken after every `every` steps
+
+        callback: callable
+            Called as callback(system, steps_done)
+
+        snapshots: bool
+            Collect a copy of the particle arrays every `every` steps
+
+        Returns:
+        ---------------------------------------
+        List of snapshots (dicts with step, x, y, vx, vy, type, id arrays),
+        empty unless snapshots is set
+        """
+        # the kernels only see substeps: every step is `sub` of them
+        sub = self.substeps(dt)
+        h = dt / sub
+        steps = int(steps) * sub
+        every = int(every) * sub
+        taken = []
+        done = 0
+        while done < steps:
+            chunk = steps - done
+            if every > 0:
+                chunk = min(chunk, every - done % every)
+            done += self._advance(chunk, h)
+
+            if every > 0 and done % every == 0:
+                if snapshots:
+                    taken.append(self._snapshot(done // sub))
+                if callback is not None:
+                    callback(self, done // sub)
+        return taken
+
+    def substeps(self, dt: float) -> int:
+        """
+        Number of equal substeps a step of size dt is split into, so that
+        none is longer than config.max_substep (<= 0: never split).
+        """
+        return substep_count(self.config, dt)
+
+    def snapshot(self) -> Dict[str, np.ndarray]:
+        """Copy of all particles (x, y, vx, vy, type, id arrays) in storage order."""
+        store = self.particles
+        return {
+            "x": store.xs.copy(),
+            "y": store.ys.copy(),
+            "vx": store.vxs.copy(),
+            "vy": store.vys.copy(),
+            "type": store.types.copy(),
+            "id": store.ids.copy(),
+        }
+
+    def _snapshot(self, step: int) -> Dict[str, np.ndarray]:
+        return dict(self.snapshot(), step=step)
+
+    def _advance(self, steps: int, dt: float) -> int:
+        """
+        Runs up to `steps` steps in compiled code (or with the NumPy
+        engine without Numba), returns how many were done.
+        """
+        n = len(self.particles)
+        if n == 0:
+            self._force_frame += steps
+            self._publish_if_due()
+            return steps
+
+        self._sync_precision()
+        config = self.config
+        damp, rm = step_factors(config, dt)
+        method = integrator_id(config.integrator)
+        self._method = method
+        if method == VELOCITY_VERLET:
+            self._prime_forces(n)
+
+        self._advanced_n = n
+        if not NUMBA_OK:
+            done = self._advance_numpy(n, steps, dt, damp, rm)
+        elif config.verlet_skin > 0.0:
+            done = self._advance_verlet(n, steps, dt, damp, rm)
+        else:
+            done = self._advance_grid(n, steps, dt, damp, rm)
+        self._force_frame += done
+        # velocity Verlet left the forces of the current positions in fx / fy
+        self._forces_key = self._current_forces_key(n) if method == VELOCITY_VERLET else None
+        self._publish_if_due()
+        return done
+
+    def _current_forces_key(self, n: int) -> tuple:
+        return (n, self._force_version())
+
+    def _prime_forces(self, n: int):
+        """
+        Velocity Verlet starts a step with the forces of the previous one.
+        Computes them if fx / fy do not hold them (first step, other
+        integrator before, particle count or force parameters changed).
+        """
+        if self._forces_key != self._current_forces_key(n):
+            self._compute_forces(n, bool(self.config.parallel))
+
+    def _advance_grid(self, n: int, steps: int, dt: float, damp: float, rm: float) -> int:
+        config = self.config
+        # keep the arrays (roughly) sorted by cell, so neighbours are close in memory;
+        # a batch never runs past the next frame that is due for sorting
+        sort_interval = int(config.sort_interval)
+        frame = self._force_frame + 1
+        self._update_layout(frame)
+        if sort_interval > 0:
+            steps = min(steps, sort_interval - frame % sort_interval)
+
+        radii, grid = self._prepare_step(n)
+        calm, sleep = self._sleep_args(n)
+        store = self.particles
+        if self._hashed:
+            kernel = run_hashed
+            if config.parallel:
+                self._threads = set_threads(int(config.num_threads))
+                kernel = run_hashed_parallel
+            kernel(
+                store.xs, store.ys, store.vxs, store.vys, store.types,
+                self._force_table(),
+                self._fx, self._fy, self._hash_keys, self._hash_slots,
+                self._cell_of, self._cell_start, self._cell_items, grid.stencil,
+                grid.nx, grid.ny, grid.inv_cw, grid.inv_ch,
+                radii,
+                float(self.width), float(self.height),
+                float(dt), float(damp), float(rm), float(config.max_velocity), self._method, calm, sleep,
+                store.ids, self._rng_args(), steps,
+            )
+        elif config.parallel:
+            nchunks = self._prepare_parallel(n, grid.nx * grid.ny)
+            run_parallel(
+                store.xs, store.ys, store.vxs, store.vys, store.types,
+                self._force_table(),
+                self._fx, self._fy, nchunks,
+                self._cell_of, self._chunk_counts, self._cell_start, self._cell_items, grid.stencil,
+                grid.nx, grid.ny, grid.inv_cw, grid.inv_ch,
+                radii,
+                float(self.width), float(self.height),
+                float(dt), float(damp), float(rm), float(config.max_velocity), self._method, calm, sleep,
+                store.ids, self._rng_args(), steps,
+            )
+        else:
+            half_shell = self._use_half_shell()
+            run_numba(
+                store.xs, store.ys, store.vxs, store.vys, store.types,
+                self._force_table(),
+                self._fx, self._fy, self._cell_of, self._cell_start, self._cell_items,
+                grid.half_stencil if half_shell else grid.stencil, half_shell,
+                grid.nx, grid.ny, grid.inv_cw, grid.inv_ch,
+                radii,
+                float(self.width), float(self.height),
+                float(dt), float(damp), float(rm), float(config.max_velocity), self._method, calm, sleep,
+                store.ids, self._rng_args(), steps,
+            )
+        return steps
+
+    def _update_layout(self, frame: int):
+        """
+        On frames due for sorting (and on the first one) re-picks the grid
+        resolution and reorders the particle arrays by cell.
+        """
+        sort_interval = int(self.config.sort_interval)
+        due = sort_interval > 0 and frame % sort_interval == 0
+        if self.config.autotune_grid:
+            self.autotune_grid()
+        elif self.config.adaptive_grid and (due or not self._grid_divisions):
+            self.adapt_grid()
+        if due:
+            self.sort_particles_by_cell()
+
+    def _advance_numpy(self, n: int, steps: int, dt: float, damp: float, rm: float) -> int:
+        """
+        Steps with the NumPy engine (no Numba). Always evaluates each pair
+        once (half shell); parallel and verlet_skin do not apply here.
+        """
+        config = self.config
+        store = self.particles
+        seed, start = self._rng_args()
+        for k in range(steps):
+            self._update_layout(self._force_frame + k + 1)
+            radii, grid = self._prepare_step(n)
+            step_numpy(
+                store.xs, store.ys, store.vxs, store.vys, store.types,
+                self._force_table(), self._fx, self._fy, grid,
+                radii,
+                float(self.width), float(self.height),
+                float(dt), float(damp), float(rm), float(config.max_velocity), self._method,
+                store.ids, (seed, start + k),
+            )
+        return steps
+
+    def _advance_verlet(self, n: int, steps: int, dt: float, damp: float, rm: float) -> int:
+        """
+        Steps using the Verlet neighbour lists. The lists are rebuilt
+        (with the pair radius + verlet_skin) only when the particle count,
+        the radii or the geometry changed, or some particle moved more
+        than half the skin since the last build.
+        """
+        config = self.config
+        store = self.particles
+        radii = self._pair_radii()
+        skin = float(config.verlet_skin)
+        width, height = float(self.width), float(self.height)
+        parallel = bool(config.parallel)
+
+        key = (n, radii.tobytes(), skin, width, height)
+        if key != self._verlet_key:
+            self._build_verlet_lists(n, radii + radii.dtype.type(skin))
+            self._verlet_key = key
+        if parallel:
+            self._threads = set_threads(int(config.num_threads))
+        calm, sleep = self._sleep_args(n)
+
+        while True:
+            done = run_verlet(
+                store.xs, store.ys, store.vxs, store.vys, store.types,
+                self._force_table(),
+                self._fx, self._fy, self._nbr_start, self._nbr_idx, parallel,
+                radii, width, height,
+                float(dt), float(damp), float(rm), float(config.max_velocity),
+                self._method, calm, sleep, store.ids, self._rng_args(),
+                self._verlet_x0, self._verlet_y0, (0.5 * skin) ** 2, steps,
+            )
+            if done:
+                break
+            # someone moved too far: rebuild and go on (cannot stop again right away)
+            self._build_verlet_lists(n, radii + radii.dtype.type(skin))
+            if parallel:
+                self._threads = set_threads(int(config.num_threads))
+        self.verlet_steps += done
+        return done
+
+    def _build_verlet_lists(self, n: int, list_radii: np.ndarray):
+        """
+        Builds the neighbour lists from the grid and remembers the positions.
+        list_radii[ti, tj] is the list radius of each type pair.
+        """
+        store = self.particles
+        list_radius = float(list_radii.max(initial=0.0))
+        # lists are built from scratch, a good moment to adapt the grid and restore memory order
+        if self.config.adaptive_grid:
+            self.adapt_grid(list_radius)
+        if self.config.sort_interval > 0:
+            self.sort_particles_by_cell()
+
+        _, grid = self._prepare_step(n, list_radius)
+        if self._hashed:
+            bin_particles_hashed(
+                store.xs, store.ys, grid.inv_cw, grid.inv_ch, grid.nx, grid.ny,
+                self._hash_keys, self._hash_slots, self._cell_of, self._cell_start, self._cell_items,
+            )
+            grid_args = (self._hash_keys, self._hash_slots, self._cell_start, self._cell_items)
+            count, fill = count_neighbors_hashed, fill_neighbors_hashed
+        else:
+            bin_particles(
+                store.xs, store.ys, grid.inv_cw, grid.inv_ch, grid.nx, grid.ny,
+                self._cell_of, self._cell_start, self._cell_items,
             )
+            grid_args = (self._cell_start, self._cell_items)
+            count, fill = count_neighbors, fill_neighbors
+
+        # the build passes are multi-threaded only if the config asks for it
+        set_threads(int(self.config.num_threads) if self.config.parallel else 1)
+        if self._nbr_start.shape[0] < n + 1:
+            self._nbr_start = np.empty(self._cell_of.shape[0] + 1, dtype=np.int32)
+            self._verlet_x0 = np.empty(self._cell_of.shape[0], dtype=store.dtype)
+            self._verlet_y0 = np.empty(self._cell_of.shape[0], dtype=store.dtype)
+        args = (
+            store.xs, store.ys, store.types, *grid_args, grid.stencil,
+            grid.nx, grid.ny, grid.inv_cw, grid.inv_ch,
+            list_radii, float(self.width), float(self.height), self._nbr_start,
+        )
+        total = count(*args, self._nbr_idx)
+        if self._nbr_idx.shape[0] < total:
+            self._nbr_idx = np.empty(int(total * 1.25) + 16, dtype=np.int32)
+        fill(*args, self._nbr_idx)
 
-           # WRAP-AROUND POSITION
-            particle.position_x %= self.width
-            particle.position_y %= self.height
+        self._verlet_x0[:n] = store.xs
+        self._verlet_y0[:n] = store.ys
+        self.verlet_rebuilds += 1
+
+    def verlet_stats(self) -> Dict[str, float]:
+        """
+        Rebuild frequency of the Verlet lists, for tuning verlet_skin:
+        a small skin rebuilds often, a large one makes long lists.
+        """
+        n = len(self.particles)
+        steps = self.verlet_steps
+        rebuilds = self.verlet_rebuilds
+        entries = int(self._nbr_start[n]) if rebuilds and n < self._nbr_start.shape[0] else 0
+        return {
+            "steps": steps,
+            "rebuilds": rebuilds,
+            "rebuild_rate": rebuilds / steps if steps else 0.0,
+            "steps_per_rebuild": steps / rebuilds if rebuilds else 0.0,
+            "mean_neighbors": entries / n if n else 0.0,
+        }
+
+    def _prepare_step(self, n: int, search_radius: float = None):
+        """
+        Makes sure the work buffers fit `n` particles and returns the
+        per-pair interaction radii and the (cached) grid geometry. The grid
+        is sized for `search_radius` (default: the largest pair radius).
+        """
+        if self._cell_of.shape[0] < n:
+            capacity = max(n, 2 * self._cell_of.shape[0])
+            self._cell_of = np.empty(capacity, dtype=np.int32)
+            self._cell_items = np.empty(capacity, dtype=np.int32)
+            self._fx = np.zeros(capacity, dtype=self.particles.dtype)
+            self._fy = np.zeros(capacity, dtype=self.particles.dtype)
+
+        # interaction radius <= 0 means no interactions: a single cell with an empty stencil
+        radii = self._pair_radii()
+        search = float(radii.max(initial=0.0)) if search_radius is None else float(search_radius)
+        divisions = self._grid_divisions if self._tuned_grid() else 0
+        key = (search, divisions, float(self.width), float(self.height))
+        if key != self._grid_key:
+            # Grid parameters (tunable)
+            if search <= 0.0:
+                cell_size = max(self.width, self.height)
+            elif divisions:
+                cell_size = search / divisions
+            else:
+                cell_size = search * 0.6
+            self._grid_key = key
+            self._grid_params = grid_geometry(self.width, self.height, search, cell_size)
+
+        grid = self._grid_params
+        self._hashed = self._use_hashed(n, grid)
+        if self._hashed:
+            # slots are the occupied cells: at most one per particle
+            capacity = self._cell_of.shape[0]
+            if self._cell_start.shape[0] < capacity + 1:
+                self._cell_start = np.empty(capacity + 1, dtype=np.int32)
+            if self._hash_keys.shape[0] < hash_table_size(n):
+                self._hash_keys = np.empty(hash_table_size(capacity), dtype=np.int64)
+                self._hash_slots = np.empty(self._hash_keys.shape[0], dtype=np.int32)
+        elif self._cell_start.shape[0] < grid.nx * grid.ny + 1:
+            self._cell_start = np.empty(grid.nx * grid.ny + 1, dtype=np.int32)
+        return radii, grid
+
+    def _use_hashed(self, n: int, grid) -> bool:
+        """Whether the hashed grid is used for `n` particles on this grid (config.grid_mode)."""
+        mode = self.config.grid_mode
+        if mode == "hashed":
+            return NUMBA_OK
+        if mode == "auto":
+            return NUMBA_OK and grid.nx * grid.ny > HASHED_CELLS_PER_PARTICLE * max(n, 1024)
+        return False
+
+    def adapt_grid(self, search_radius: float = None) -> int:
+        """
+        Picks the grid resolution for the current particle distribution.
+        For every cell size search_radius / k (k in GRID_DIVISIONS) the
+        distance checks of a stencil walk are counted from the cell
+        occupancy, the cheapest grid is used from then on. Pairs inside
+        a dense cluster are always checked, a finer grid only saves the
+        checks against particles outside the radius. Returns k.
+        """
+        store = self.particles
+        n = len(store)
+        search = self.config.max_interaction_radius() if search_radius is None else float(search_radius)
+        if n == 0 or search <= 0.0:
+            return self._grid_divisions
+
+        best, best_cost = 0, None
+        for k in GRID_DIVISIONS:
+            grid = grid_geometry(self.width, self.height, search, search / k)
+            stats = occupancy_stats(*cell_counts(store.xs, store.ys, grid), grid)
+            # the dense grid build also walks all cells, the hashed one only occupied ones
+            cells = stats["occupied_cells"] if self._use_hashed(n, grid) else stats["cells"]
+            cost = n * (stats["candidates_per_particle"] + CELL_VISIT_COST * len(grid.stencil)) + cells
+            if best_cost is None or cost < best_cost:
+                best, best_cost = k, cost
+        self._grid_divisions = best
+        return best
+
+    def autotune_grid(self, retune: bool = False) -> float:
+        """
+        Picks the grid cell size by measurement: the force evaluation is
+        timed on the current particles for every cell size search radius / k
+        (k in AUTOTUNE_DIVISIONS, circle-culled stencils) and the fastest k
+        is used. The choice is cached per configuration (see _autotune_key),
+        so it is only measured at startup and when the radius, particle
+        count or density moved to another bucket; retune measures again.
+        Returns k.
+        """
+        n = len(self.particles)
+        search = float(self._pair_radii().max(initial=0.0))
+        if n == 0 or search <= 0.0:
+            return self._grid_divisions
+
+        key = self._autotune_key(n, search)
+        best = self._autotune_cache.get(key)
+        if best is None or retune:
+            parallel = bool(self.config.parallel)
+            timings = {}
+            for k in AUTOTUNE_DIVISIONS:
+                self._grid_divisions = k
+                # the first call compiles / sizes the buffers, it is not timed
+                self._measure_forces(n, parallel)
+                elapsed = []
+                for _ in range(AUTOTUNE_REPEATS):
+                    start = time.perf_counter()
+                    self._measure_forces(n, parallel)
+                    elapsed.append(time.perf_counter() - start)
+                timings[k] = min(elapsed)
+            best = min(timings, key=timings.get)
+            self._autotune_cache[key] = best
+            self.autotune_timings = timings
+        self._grid_divisions = best
+        return best
+
+    def _autotune_key(self, n: int, search: float) -> tuple:
+        # the best cell size depends on the particle count and the number of
+        # neighbours per particle (density * search area), both bucketed so
+        # nearby radii (dragging the radius slider) share one measurement,
+        # and on which kernel runs the forces
+        config = self.config
+        neighbours = n * math.pi * search * search / (self.width * self.height)
+        return (
+            round(2.0 * math.log2(n)),
+            round(math.log(max(neighbours, 1e-3)) / math.log(AUTOTUNE_BUCKET)),
+            config.grid_mode, bool(config.parallel), int(config.num_threads), self._use_half_shell(),
+        )
+
+    def _tuned_grid(self) -> bool:
+        # whether the cell size follows _grid_divisions (else 0.6 * radius)
+        return bool(self.config.adaptive_grid or self.config.autotune_grid)
+
+    def grid_stats(self) -> Dict[str, float]:
+        """
+        Occupancy of the force grid for the current positions
+        (see kernels.occupancy_stats) plus its resolution.
+        """
+        store = self.particles
+        _, grid = self._prepare_step(len(store))
+        stats = occupancy_stats(*cell_counts(store.xs, store.ys, grid), grid)
+        stats["hashed"] = self._hashed
+        stats["divisions"] = self._grid_divisions if self._tuned_grid() else 0
+        stats["cell_width"] = self.width / grid.nx
+        stats["cell_height"] = self.height / grid.ny
+        stats["stencil_cells"] = int(grid.stencil.shape[0])
+        return stats
+
+    def _prepare_parallel(self, n: int, ncell: int) -> int:
+        """
+        Applies the thread cap and sizes the per-thread count buffer.
+        Returns the number of particle chunks (one per thread).
+        """
+        threads = set_threads(int(self.config.num_threads))
+        self._threads = threads
+
+        if self._chunk_counts.shape[0] < threads * ncell:
+            self._chunk_counts = np.empty(threads * ncell, dtype=np.int32)
+        return threads
+
+    def sort_particles_by_cell(self):
+        """
+        Reorders the particle arrays by grid cell (counting sort), so the
+        particles of a cell and of neighbouring cells are next to each
+        other in memory. Particle views stay valid.
+        """
+        n = len(self.particles)
+        if n == 0:
+            return
+        store = self.particles
+        _, grid = self._prepare_step(n)
+        if self._hashed or not NUMBA_OK:
+            # same order as the counting sort, without per-cell arrays
+            order = np.argsort(cell_keys(store.xs, store.ys, grid), kind="stable")
+        else:
+            bin_particles(
+                store.xs, store.ys, grid.inv_cw, grid.inv_ch, grid.nx, grid.ny,
+                self._cell_of, self._cell_start, self._cell_items,
+            )
+            order = self._cell_items[:n]
+        store.reorder(order)
+        for buf in (self._fx, self._fy, self._calm):
+            if buf.shape[0] >= n:
+                buf[:n] = buf[:n][order]
+
+    def _use_half_shell(self) -> bool:
+        return use_half_shell(self.config)
+
+    def reseed(self, seed: int = None):
+        """
+        Restarts the system's random generator (self.rng) from seed, by
+        default config.seed (None: fresh entropy). The generator picks the
+        key of the random motion stream, which the kernels draw in bulk
+        per particle and step, so two systems with the same seed and start
+        state jitter the same.
+        """
+        if seed is None:
+            seed = self.config.seed
+        self.rng = np.random.default_rng(seed)
+        self._noise_seed = int(self.rng.integers(0, 2 ** 63 - 1))
+
+    def noise_state(self) -> tuple:
+        """
+        (seed, step) of the random motion stream: a run continued from the
+        same state with them (e.g. DistributedSystem) jitters the same.
+        """
+        return self._rng_args()
+
+    def _rng_args(self) -> tuple:
+        """
+        (seed, step) of the jitter for the kernels: every particle draws
+        from a counter-based stream of (seed, id, step). With
+        config.deterministic the seed is config.seed itself, so a run
+        repeats bit for bit with any thread count.
+        """
+        config = self.config
+        if config.deterministic:
+            return int(config.seed or 0) & 0x7FFFFFFFFFFFFFFF, int(self._force_frame)
+        return self._noise_seed, int(self._force_frame)
+
+    def _sleep_args(self, n: int) -> tuple:
+        """
+        Calm-step counters of the particles and the (steps, speed2, force2)
+        sleep parameters for the kernels (see kernels._update_sleep).
+        Everybody is woken up when the particle count, the force table, the
+        radii or the sleep settings changed.
+        """
+        config = self.config
+        steps = max(int(config.sleep_steps), 0) if NUMBA_OK else 0
+        sleep = (steps, float(config.sleep_speed) ** 2, float(config.sleep_force) ** 2)
+        if self._calm.shape[0] < self._cell_of.shape[0]:
+            self._calm = np.zeros(self._cell_of.shape[0], dtype=np.int32)
+            self._sleep_key = None
+        key = (n, self._force_version(), sleep)
+        if key != self._sleep_key:
+            self._calm[:n] = 0
+            self._sleep_key = key
+        return self._calm[:n], sleep
+
+    def wake_all(self):
+        """Wakes every sleeping particle (e.g. after moving particles by hand)."""
+        self._calm[:] = 0
+
+    def sleep_stats(self) -> Dict[str, float]:
+        """How many particles are asleep (config.sleep_steps > 0)."""
+        n = len(self.particles)
+        steps = int(self.config.sleep_steps)
+        asleep = int(np.count_nonzero(self._calm[:n] > steps)) if steps > 0 and n <= self._calm.shape[0] else 0
+        return {"asleep": asleep, "awake": n - asleep, "fraction": asleep / n if n else 0.0}
+
+    def _sync_precision(self):
+        """
+        Follows config.precision: converts the particle arrays and the
+        force / Verlet buffers once when it changed. The kernels then run
+        their specialization for that dtype, nothing is converted per step.
+        """
+        dtype = precision_dtype(self.config.precision)
+        if dtype == self.particles.dtype:
+            return
+        self.particles.convert(dtype)
+        self._fx = self._fx.astype(dtype)
+        self._fy = self._fy.astype(dtype)
+        self._verlet_x0 = self._verlet_x0.astype(dtype)
+        self._verlet_y0 = self._verlet_y0.astype(dtype)
+
+    def _pair_radii(self) -> np.ndarray:
+        """
+        Interaction radius of every type pair for the kernels
+        (see SimulationConfig.radius_matrix). Cached, rebuilt when
+        interaction_radius or any pair radius changed.
+        """
+        config = self.config
+        dtype = self.particles.dtype
+        key = (float(config.interaction_radius), tuple(map(tuple, config.interaction_matrix.radii)), dtype)
+        if self._pair_radii_np is None or key != self._pair_radii_key:
+            self._pair_radii_np = config.radius_matrix(dtype)
+            self._pair_radii_key = key
+            self._force_params_version += 1
+        return self._pair_radii_np
+
+    def _force_table(self) -> np.ndarray:
+        """
+        Force profile table for the kernels (see force_profiles.tabulate).
+        Cached, rebuilt when the profile, beta, force_scale or any
+        interaction matrix entry changed.
+        """
+        config = self.config
+        key = force_table_key(config, self.particles.dtype)
+        if self._force_table_np is None or key != self._force_table_key or self.matrix_dirty:
+            self._force_table_np = tabulate(
+                config.force_profile, config.interaction_matrix.matrix, config.beta, config.force_scale,
+                dtype=self.particles.dtype,
+            )
+            self._force_table_key = key
+            self._force_params_version += 1
+            self.matrix_dirty = False
+        return self._force_table_np
+
+    def _force_version(self) -> int:
+        """
+        Version of the force table and the pair radii (rebuilt first if
+        their parameters changed). Forces and sleep states computed under
+        another version are stale.
+        """
+        self._force_table()
+        self._pair_radii()
+        return self._force_params_version
 
     # -------------------- PYTHON --------------------
     def _calculate_forces_python(self):
@@ -190,7 +883,8 @@ class ParticleSystem:
         - Intended only as fallback or for debugging / reference
         """
 
-        particles = self.particles
+        # one view per particle, so the identity check below works
+        particles = list(self.particles)
         config = self.config
 
         if not particles:
@@ -282,71 +976,190 @@ class ParticleSystem:
     # -------------------------------------------------------------------------------
 
     def calculate_forces(self, dt):
-        """Calculates the forces between all the particles. Uses Numba if available."""
-        particles = self.particles
-        n = len(particles)
+        """Calculates the forces between all the particles and applies them to the velocities."""
+        store = self.particles
+        n = len(store)
         if n == 0:
             return
 
-        r = float(self.config.interaction_radius)
-        if r <= 0.0:
+        if self.config.max_interaction_radius() <= 0.0:
             return
 
-        # if numba not available
-        if not NUMBA_OK:
-            raise RuntimeError("Numba is required for this simulation")
-
-        # Grid parameters (tunable)
-        cell_size = r * 0.6
-        cell_range = int(math.ceil(r / cell_size))
-
-        # prepare arrays
-        xs = np.empty(n, dtype=np.float32)
-        ys = np.empty(n, dtype=np.float32)
-        types = np.empty(n, dtype=np.int32)
-
-        for i, p in enumerate(particles):
-            xs[i] = p.position_x
-            ys[i] = p.position_y
-            types[i] = p.particle_type
-
-        # cache matrix as numpy float32
-        mat_list = self.config.interaction_matrix.matrix
-        shape = (len(mat_list), len(mat_list[0])) if len(mat_list) else (0, 0)
+        self._compute_forces(n, bool(self.config.parallel))
 
-        if self._numba_matrix_np is None or self._numba_matrix_shape != shape or self.matrix_dirty == True:
-            self._numba_matrix_np = np.asarray(mat_list, dtype=np.float32)
-            self._numba_matrix_shape = shape
-            self.matrix_dirty = False
+        # apply forces back
+        store.vxs[:] += self._fx[:n] * dt
+        store.vys[:] += self._fy[:n] * dt
+
+    def _compute_forces(self, n: int, parallel: bool):
+        """Fills the force buffers for the current positions (positions are not changed)."""
+        self._sync_precision()
+        store = self.particles
+        radii, grid = self._prepare_step(n)
+        calm, sleep = self._sleep_args(n)
+        if not NUMBA_OK:
+            compute_forces_numpy(
+                store.xs, store.ys, store.types, self._force_table(),
+                self._fx, self._fy, grid, radii, float(self.width), float(self.height),
+            )
+        elif self._hashed:
+            kernel = compute_forces_hashed
+            if parallel:
+                self._threads = set_threads(int(self.config.num_threads))
+                kernel = compute_forces_hashed_parallel
+            kernel(
+                store.xs, store.ys, store.types, self._force_table(),
+                self._fx, self._fy, self._hash_keys, self._hash_slots,
+                self._cell_of, self._cell_start, self._cell_items, grid.stencil,
+                grid.nx, grid.ny, grid.inv_cw, grid.inv_ch,
+                radii,
+                float(self.width), float(self.height), calm, sleep[0],
+            )
+        elif parallel:
+            nchunks = self._prepare_parallel(n, grid.nx * grid.ny)
+            compute_forces_parallel(
+                store.xs, store.ys, store.types, self._force_table(),
+                self._fx, self._fy, nchunks,
+                self._cell_of, self._chunk_counts, self._cell_start, self._cell_items, grid.stencil,
+                grid.nx, grid.ny, grid.inv_cw, grid.inv_ch,
+                radii,
+                float(self.width), float(self.height), calm, sleep[0],
+            )
+        else:
+            half_shell = self._use_half_shell()
+            compute_forces_numba(
+                store.xs, store.ys, store.types, self._force_table(),
+                self._fx, self._fy, self._cell_of, self._cell_start, self._cell_items,
+                grid.half_stencil if half_shell else grid.stencil, half_shell,
+                grid.nx, grid.ny, grid.inv_cw, grid.inv_ch,
+                radii,
+                float(self.width), float(self.height), calm, sleep[0],
+            )
 
-        fx, fy = _compute_forces_numba(
-            xs, ys, types, self._numba_matrix_np,
-            float(r), float(cell_size),
-            int(self.width), int(self.height),
-            int(cell_range),float(self.config.beta),
-            float(self.config.force_scale),
-        )
+    def _measure_forces(self, n: int, parallel: bool):
+        """
+        _compute_forces outside of a step (timings, dt estimate): the wake-up
+        pass of the kernels must not count, so the sleep counters and their
+        key are put back as they were.
+        """
+        calm = self._calm.copy()
+        key = self._sleep_key
+        self._compute_forces(n, parallel)
+        self._calm[:calm.shape[0]] = calm
+        self._sleep_key = key
 
-        # apply forces back
-        for i, p in enumerate(particles):
-            p.velocity_x += float(fx[i]) * dt
-            p.velocity_y += float(fy[i]) * dt
+    def measure_parallel_speedup(self, repeats: int = 10) -> Dict[str, float]:
+        """
+        Times the serial and the parallel force kernel on the current
+        particles and reports the speedup. Positions and velocities are
+        not changed. The first call of each kernel (compilation) is not timed.
+        """
+        n = len(self.particles)
+        if n == 0 or not NUMBA_OK:
+            raise RuntimeError("Needs particles and Numba to measure the speedup")
+
+        timings = {}
+        for parallel in (False, True):
+            self._measure_forces(n, parallel)  # warm-up
+            t0 = time.perf_counter()
+            for _ in range(repeats):
+                self._measure_forces(n, parallel)
+            timings[parallel] = (time.perf_counter() - t0) / repeats * 1000
+
+        return {
+            "threads": self._threads,
+            "serial_ms": timings[False],
+            "parallel_ms": timings[True],
+            "speedup": timings[False] / timings[True] if timings[True] > 0 else float("inf"),
+        }
 
     def get_particles_data(self) -> List[Dict]:
         """Return the data for visualization"""
+        store = self.particles
+        colors = self.config.particle_colors
         result = []
-        for p in self.particles:
+        for x, y, vx, vy, t in zip(
+            store.xs.tolist(), store.ys.tolist(),
+            store.vxs.tolist(), store.vys.tolist(), store.types.tolist(),
+        ):
             particle_data = {
-                "x": p.position_x,
-                "y": p.position_y,
-                "vx": p.velocity_x,
-                "vy": p.velocity_y,
-                "type": p.particle_type,
-                "color": p.color
+                "x": x,
+                "y": y,
+                "vx": vx,
+                "vy": vy,
+                "type": t,
+                "color": colors[t]
             }
             result.append(particle_data)
         return result
 
+    def publish_state(self, name: str = None, every: int = 1) -> str:
+        """
+        Starts publishing positions, velocities, types and ids into the
+        shared-memory segment `name` (None: a generated name) after every
+        `every` steps (batched step_n runs publish at the end of each
+        compiled batch). Other processes read it with
+        shared_state.StateReader(name); the writer never waits for them.
+        Returns the segment name.
+        """
+        self.stop_publishing()
+        store = self.particles
+        self._publisher = StatePublisher(name, capacity=max(2 * len(store), 1024), dtype=store.dtype)
+        self._publish_every = max(int(every), 1)
+        self._publish()
+        return self._publisher.name
+
+    def stop_publishing(self):
+        """Stops publishing and removes the segment (readers see it retired)."""
+        if self._publisher is not None:
+            self._publisher.close()
+            self._publisher = None
+
+    def serve_stream(self, host: str = "127.0.0.1", port: int = 0, every: int = 1,
+                     keyframe_interval: int = 60) -> tuple:
+        """
+        Starts streaming positions and types to viewer processes over TCP
+        after every `every` steps, as 16-bit quantized keyframes and
+        deltas (see streaming.py; read them with streaming.StreamClient).
+        Slow clients skip frames, the simulation never waits for them.
+        Returns the (host, port) the server listens on.
+        """
+        self.stop_streaming()
+        self._stream = StreamServer(host, port, self.config.particle_colors, keyframe_interval)
+        self._stream_every = max(int(every), 1)
+        self._stream_frame()
+        return self._stream.address
+
+    def stop_streaming(self):
+        """Stops the stream server and disconnects its clients."""
+        if self._stream is not None:
+            self._stream.close()
+            self._stream = None
+
+    def _publish_if_due(self):
+        if self._publisher is not None and self._force_frame - self._published_frame >= self._publish_every:
+            self._publish()
+        if self._stream is not None and self._force_frame - self._streamed_frame >= self._stream_every:
+            self._stream_frame()
+
+    def _stream_frame(self):
+        store = self.particles
+        self._stream.publish(store.xs, store.ys, store.types, store.ids,
+                             self._force_frame, float(self.width), float(self.height))
+        self._streamed_frame = self._force_frame
+
+    def _publish(self):
+        store = self.particles
+        self._publisher.publish(store.xs, store.ys, store.vxs, store.vys, store.types, store.ids,
+                                self._force_frame, float(self.width), float(self.height))
+        self._published_frame = self._force_frame
+
     def reset_system(self):
         """Resets the system"""
         self.particles.clear()
+        # the sleep counters belonged to the old particles
+        self._calm[:] = 0
+        self._sleep_key = None
+        # as are the primed Verlet forces and the neighbour lists
+        self._forces_key = None
+        self._verlet_key = None
@@ -0,0 +1,183 @@
+"""
+Physics on its own thread, decoupled from rendering.
+
+PhysicsThread steps a ParticleSystem at a fixed tick rate on a background
+thread. The compiled kernels release the GIL (nogil), so while a tick runs
+the render thread keeps drawing on another core. After every tick the
+positions are copied into a triple buffer: the tick writes the back
+buffer, the newest finished frame waits in the middle one and the reader
+owns the front one. Publishing and latest() only swap buffer indices
+(under a lock held for the swap, never for a tick), so the renderer gets
+the newest frame without waiting for the physics:
+
+    physics = PhysicsThread(system, tick_rate=60, speed_factor=4.0)
+    physics.start()
+    frame = physics.latest()      # xs / ys / types of the newest tick
+    with physics.hold():          # between ticks: safe to reset / resize
+        system.reset_system()
+    physics.stop()
+
+The physics never writes the buffer of the snapshot latest() returned
+last, so that snapshot stays intact however long the renderer takes; it
+is reused once latest() is called again.
+"""
+from contextlib import contextmanager
+from typing import Dict, Iterator, NamedTuple
+import threading
+import time
+import numpy as np
+from particle_system import ParticleSystem
+
+
+class Snapshot(NamedTuple):
+    """Particle state after one tick (array views into a snapshot buffer)."""
+    xs: np.ndarray
+    ys: np.ndarray
+    types: np.ndarray
+    ids: np.ndarray
+    tick: int
+
+
+class PhysicsThread:
+    """
+    Runs system.update_system(speed_factor / tick_rate) tick_rate times per
+    second on a daemon thread and publishes a Snapshot after every tick.
+
+    Attributes:
+    ---------------------------------------
+    system: ParticleSystem
+        The simulated system; change its particles only inside hold()
+
+    tick_rate: float
+        Physics ticks per second
+
+    speed_factor: float
+        Simulated seconds per real second (dt of a tick = speed_factor / tick_rate)
+
+    stepping: bool
+        False pauses the physics (the thread idles, snapshots stay)
+
+    error: Exception
+        What stopped the thread, None while it is fine
+    """
+
+    def __init__(self, system: ParticleSystem, tick_rate: float = 60.0, speed_factor: float = 1.0):
+        if tick_rate <= 0:
+            raise ValueError("tick_rate must be positive")
+        self.system = system
+        self.tick_rate = float(tick_rate)
+        self.speed_factor = float(speed_factor)
+        self.stepping = True
+        self.error = None
+        self.ticks = 0
+        self.late_ticks = 0
+        self._tick_time = 0.0
+        self._timed_ticks = 0
+        # held for the duration of every tick, hold() takes it between ticks
+        self._tick_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        # triple buffer of (xs, ys, types, ids) arrays and their snapshots:
+        # the next publish writes _back, _middle is the newest published
+        # frame (_fresh: not taken by latest() yet), the reader owns _front
+        self._buffers = [None, None, None]
+        self._snapshots = [None, None, None]
+        self._back, self._middle, self._front = 0, 1, 2
+        self._fresh = False
+        self._swap_lock = threading.Lock()
+        self._publish()
+
+    def start(self):
+        """Starts ticking (no-op while already running)."""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self.error = None
+        self._thread = threading.Thread(target=self._run, name="physics", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        """Stops the thread after the current tick and waits for it."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    @property
+    def alive(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def latest(self) -> Snapshot:
+        """
+        The newest published snapshot. Hands the previous one back for
+        reuse: keep using only the snapshot of the last call.
+        """
+        with self._swap_lock:
+            if self._fresh:
+                self._front, self._middle = self._middle, self._front
+                self._fresh = False
+            return self._snapshots[self._front]
+
+    @contextmanager
+    def hold(self) -> Iterator[ParticleSystem]:
+        """
+        Pauses the physics between two ticks for the duration of the block
+        (waits for a running tick to finish), e.g. to reset or resize the
+        system. The state at the end of the block is published.
+        """
+        with self._tick_lock:
+            yield self.system
+            self._publish()
+
+    def stats(self) -> Dict[str, float]:
+        """Ticks so far, ticks that missed their slot, average tick time (ms) since the last call."""
+        timed = self._timed_ticks
+        average = self._tick_time / timed * 1e3 if timed else 0.0
+        self._tick_time = 0.0
+        self._timed_ticks = 0
+        return {"ticks": self.ticks, "late_ticks": self.late_ticks, "tick_ms": average}
+
+    def _run(self):
+        period = 1.0 / self.tick_rate
+        deadline = time.perf_counter()
+        try:
+            while not self._stop.is_set():
+                if self.stepping:
+                    start = time.perf_counter()
+                    with self._tick_lock:
+                        self.system.update_system(self.speed_factor * period)
+                        self.ticks += 1
+                        self._publish()
+                    self._tick_time += time.perf_counter() - start
+                    self._timed_ticks += 1
+                deadline += period
+                wait = deadline - time.perf_counter()
+                if wait > 0.0:
+                    self._stop.wait(wait)
+                else:
+                    # behind schedule: skip the missed slots instead of catching up
+                    if self.stepping:
+                        self.late_ticks += 1
+                    deadline = time.perf_counter()
+        except Exception as error:
+            self.error = error
+
+    def _publish(self):
+        """Copies the positions into the back buffer and swaps it into the middle."""
+        store = self.system.particles
+        n = len(store)
+        buffer = self._buffers[self._back]
+        if buffer is None or buffer[0].shape[0] < n or buffer[0].dtype != store.dtype:
+            capacity = max(n, 2 * buffer[0].shape[0] if buffer is not None else 0)
+            buffer = (np.empty(capacity, dtype=store.dtype), np.empty(capacity, dtype=store.dtype),
+                      np.empty(capacity, dtype=np.int32), np.empty(capacity, dtype=np.int64))
+            self._buffers[self._back] = buffer
+        xs, ys, types, ids = (array[:n] for array in buffer)
+        xs[:] = store.xs
+        ys[:] = store.ys
+        types[:] = store.types
+        ids[:] = store.ids
+        self._snapshots[self._back] = Snapshot(xs, ys, types, ids, self.ticks)
+        with self._swap_lock:
+            self._back, self._middle = self._middle, self._back
+            self._fresh = True
@@ -0,0 +1,241 @@
+"""
+Live particle state in a named shared-memory segment.
+
+A StatePublisher (see ParticleSystem.publish_state) copies positions,
+velocities, types and ids into a `multiprocessing.shared_memory` segment
+after a step. Any local process opens it by name with a StateReader and
+reads frames at its own pace. The segment is a seqlock:
+
+    header  int64[16]: magic, layout, seq, capacity, count, step,
+                       float itemsize, retired
+            float64[2]: world width, height
+    arrays  x, y, vx, vy (float32 / float64), type (int32), id (int64),
+            `capacity` entries each
+
+The writer makes seq odd, writes the frame and makes seq even again; it
+never waits for readers, so consumers cost the simulation nothing. A
+reader copies the frame and keeps it only if seq was even and unchanged
+around the copy, otherwise it tries again (this relies on stores
+becoming visible in program order, as on x86-64). When the particles
+outgrow the segment, the writer marks it retired and creates a larger
+one under the same name (seq carries on), and readers re-open it.
+
+Reader side (e.g. a dashboard process):
+
+    reader = StateReader("particle-life")
+    frame = reader.read()       # consistent copy: frame.xs, frame.step, ...
+"""
+from multiprocessing import resource_tracker
+from multiprocessing.shared_memory import SharedMemory
+from typing import NamedTuple, Optional
+import sys
+import time
+import numpy as np
+
+MAGIC = 0x504C5354
+LAYOUT = 1
+# header slots (int64)
+SEQ, CAPACITY, COUNT, STEP, ITEMSIZE, RETIRED = 2, 3, 4, 5, 6, 7
+HEADER_INTS = 16
+# world size (float64) right after the int header, arrays after HEADER_BYTES
+HEADER_BYTES = 256
+
+
+class Frame(NamedTuple):
+    """One consistent copy of the published state."""
+    step: int
+    seq: int
+    width: float
+    height: float
+    xs: np.ndarray
+    ys: np.ndarray
+    vxs: np.ndarray
+    vys: np.ndarray
+    types: np.ndarray
+    ids: np.ndarray
+
+
+def _segment_size(capacity: int, itemsize: int) -> int:
+    return HEADER_BYTES + capacity * (4 * itemsize + 4 + 8)
+
+
+def _arrays(shm: SharedMemory, capacity: int, dtype) -> tuple:
+    """(header, world, xs, ys, vxs, vys, types, ids) views on a segment."""
+    dtype = np.dtype(dtype)
+    header = np.ndarray(HEADER_INTS, dtype=np.int64, buffer=shm.buf)
+    world = np.ndarray(2, dtype=np.float64, buffer=shm.buf, offset=HEADER_INTS * 8)
+    offset = HEADER_BYTES
+    floats = []
+    for _ in range(4):
+        floats.append(np.ndarray(capacity, dtype=dtype, buffer=shm.buf, offset=offset))
+        offset += capacity * dtype.itemsize
+    types = np.ndarray(capacity, dtype=np.int32, buffer=shm.buf, offset=offset)
+    offset += capacity * 4
+    ids = np.ndarray(capacity, dtype=np.int64, buffer=shm.buf, offset=offset)
+    return (header, world, *floats, types, ids)
+
+
+def _attach(name: str) -> SharedMemory:
+    """Opens an existing segment without handing it to this process's resource tracker."""
+    if sys.version_info >= (3, 13):
+        return SharedMemory(name=name, track=False)
+    # Before Python 3.13 every attach registers with the resource tracker,
+    # which would unlink the publisher's segment when this process exits
+    shm = SharedMemory(name=name)
+    resource_tracker.unregister(shm._name, "shared_memory")
+    return shm
+
+
+class StatePublisher:
+    """
+    Writer side: owns the segment `name` (created, and removed again by
+    close()). publish() writes one frame.
+    """
+
+    def __init__(self, name: Optional[str] = None, capacity: int = 1024, dtype=np.float32):
+        self.dtype = np.dtype(dtype)
+        self._shm = None
+        self._create(name, max(int(capacity), 1))
+        self.name = self._shm.name
+        self.frames = 0
+
+    def _create(self, name: Optional[str], capacity: int, seq: int = 0):
+        self._shm = SharedMemory(name=name, create=True, size=_segment_size(capacity, self.dtype.itemsize))
+        self._views = _arrays(self._shm, capacity, self.dtype)
+        header = self._views[0]
+        header[:] = 0
+        header[0] = MAGIC
+        header[1] = LAYOUT
+        header[CAPACITY] = capacity
+        header[ITEMSIZE] = self.dtype.itemsize
+        header[SEQ] = seq
+        self.capacity = capacity
+
+    def _grow(self, count: int):
+        """Retires the segment and recreates it, larger, under the same name."""
+        seq = int(self._views[0][SEQ])
+        self._views[0][RETIRED] = 1
+        self._release()
+        self._create(self.name, max(count, 2 * self.capacity), seq)
+
+    def _release(self):
+        self._views = None
+        self._shm.close()
+        # a reader spawned from this process shares its resource tracker and
+        # took the segment off it (see _attach); unlink() expects it there
+        resource_tracker.register(self._shm._name, "shared_memory")
+        self._shm.unlink()
+        self._shm = None
+
+    def publish(self, xs, ys, vxs, vys, types, ids, step: int, width: float, height: float):
+        """Writes one frame (arrays of equal length, converted to the segment dtypes)."""
+        n = len(xs)
+        if n > self.capacity or xs.dtype != self.dtype:
+            self.dtype = np.dtype(xs.dtype)
+            self._grow(n)
+        header, world, out_x, out_y, out_vx, out_vy, out_t, out_id = self._views
+        # odd seq: a write is in progress
+        header[SEQ] += 1
+        header[COUNT] = n
+        header[STEP] = step
+        world[0] = width
+        world[1] = height
+        out_x[:n] = xs
+        out_y[:n] = ys
+        out_vx[:n] = vxs
+        out_vy[:n] = vys
+        out_t[:n] = types
+        out_id[:n] = ids
+        header[SEQ] += 1
+        self.frames += 1
+
+    def close(self):
+        """Marks the segment retired and removes it."""
+        if self._shm is not None:
+            self._views[0][RETIRED] = 1
+            self._release()
+
+
+class StateReader:
+    """
+    Reader side: maps the segment `name` (zero-copy) and returns
+    consistent frame copies. Any number of readers in any process.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._shm = None
+        self._open()
+        self.last_seq = -1
+
+    def _open(self, timeout: float = 1.0):
+        end = time.monotonic() + timeout
+        while True:
+            try:
+                shm = _attach(self.name)
+                break
+            except FileNotFoundError:
+                # the publisher is between retiring and recreating the segment
+                if time.monotonic() > end:
+                    raise
+                time.sleep(0.001)
+        header = np.ndarray(HEADER_INTS, dtype=np.int64, buffer=shm.buf)
+        if header[0] != MAGIC or header[1] != LAYOUT:
+            del header
+            shm.close()
+            raise ValueError("%s is not a particle state segment" % self.name)
+        dtype = np.float32 if header[ITEMSIZE] == 4 else np.float64
+        self._shm = shm
+        self._views = _arrays(shm, int(header[CAPACITY]), dtype)
+
+    def _reopen(self):
+        self._views = None
+        self._shm.close()
+        self._open()
+
+    @property
+    def seq(self) -> int:
+        """Current sequence number (even between writes, grows by 2 per frame)."""
+        return int(self._views[0][SEQ])
+
+    def has_new(self) -> bool:
+        """Whether a frame newer than the last read() is available."""
+        return self.seq != self.last_seq or bool(self._views[0][RETIRED])
+
+    def read(self, timeout: float = 1.0) -> Frame:
+        """
+        Copies the newest complete frame. Retries while the writer is in
+        the middle of a frame; raises TimeoutError if it never gets one.
+        """
+        end = time.monotonic() + timeout
+        while True:
+            if self._views[0][RETIRED]:
+                self._reopen()
+                continue
+            frame = self._try_read()
+            if frame is not None:
+                self.last_seq = frame.seq
+                return frame
+            if time.monotonic() > end:
+                raise TimeoutError("no consistent frame of %s within %.1f s" % (self.name, timeout))
+            time.sleep(0)
+
+    def _try_read(self) -> Optional[Frame]:
+        # one seqlock attempt: None if the writer was busy or got in between
+        header, world = self._views[:2]
+        before = int(header[SEQ])
+        if before % 2:
+            return None
+        n = int(header[COUNT])
+        step = int(header[STEP])
+        width, height = float(world[0]), float(world[1])
+        copies = [array[:n].copy() for array in self._views[2:]]
+        if int(header[SEQ]) != before or header[RETIRED]:
+            return None
+        return Frame(step, before, width, height, *copies)
+
+    def close(self):
+        if self._shm is not None:
+            self._views = None
+            self._shm.close()
+            self._shm = None
@@ -1,7 +1,8 @@
 from dataclasses import dataclass, field
-from typing import List, Dict, Any, Sequence
+from typing import List, Dict, Any, Sequence, Optional
 import json
 import os
+import numpy as np
 from interaction_matrix import InteractionMatrix
 
 @dataclass
@@ -15,7 +16,8 @@ class SimulationConfig:
         How many different particle types exist
 
     interaction_matrix: InteractionMatrix
-        Handles interactions between particle types
+        Handles interactions between particle types (strengths and
+        per-pair radii)
     
     particle_colors: list of str
         Color for each particle type. Length must be >= num_types
@@ -27,10 +29,101 @@ class SimulationConfig:
         Maximum allowed speed for any particle (used for clamping)
 
     interaction_radius: float
-        Maximum distance where forces between particles are applied
+        Maximum distance where forces between particles are applied,
+        for every type pair without its own radius (see set_radius())
 
     random_motion: float
         Additional random "jitter" added to particle velocities
+
+    parallel: bool
+        Use the multi-threaded Numba kernel
+
+    num_threads: int
+        Thread cap for the parallel kernel (0 = all cores)
+
+    half_shell: bool
+        Serial kernel evaluates every particle pair once and applies
+        the force in both directions (the parallel kernel ignores it)
+
+    sort_interval: int
+        Every how many frames the particle arrays are reordered by grid
+        cell for memory locality (0 = never, the default; main.py uses 20)
+
+    verlet_skin: float
+        > 0 enables Verlet neighbour lists built with interaction_radius
+        + verlet_skin; they are rebuilt once a particle moved more than
+        verlet_skin / 2 (0 = rebuild the grid every frame)
+
+    adaptive_grid: bool
+        Re-pick the grid cell size (radius / 1 .. radius / 4) from the
+        cell occupancy whenever the arrays are sorted, so condensed
+        clusters get a finer grid (off by default, main.py turns it on)
+
+    autotune_grid: bool
+        Pick the grid cell size by timing the force kernel for a few cell
+        sizes (at startup and when the radius, particle count or density
+        changed noticeably); the choice is cached per configuration and
+        replaces adaptive_grid
+
+    grid_mode: str
+        "dense" (cell arrays over the whole world), "hashed" (hash table
+        of the occupied cells, memory grows with the particle count, for
+        huge sparse worlds) or "auto" (hashed once the dense grid would
+        have many more cells than particles). "dense" by default, main.py
+        uses "auto"
+
+    force_profile: str
+        Name of the radial force profile (see force_profiles.py), shaped
+        by beta (0 < beta < 1, else building the force table raises
+        ValueError) and force_scale
+
+    precision: str
+        "float32" (fast, for interactive runs) or "float64" (long
+        scientific runs): dtype of the particle arrays, force buffers and
+        tables from end to end, each with its own compiled kernels
+
+    integrator: str
+        "euler" (explicit, the original update), "verlet" (velocity
+        Verlet) or "leapfrog" (drift-kick-drift); the last two are
+        symplectic and stay stable at larger steps
+
+    max_substep: float
+        Longest step the kernels take: a larger dt (e.g. from a high speed
+        factor) is split into equal substeps inside one compiled call.
+        0 (the default) never splits, dt is taken as given; the
+        visualizer sets it for its interactive loop
+
+    adaptive_dt: bool
+        update_system() covers its dt in steps picked from the dynamics
+        (max speed and force of the particles, core and cell size)
+        instead of one step of the wall-clock dt
+
+    dt_min, dt_max: float
+        Bounds of the adaptive step size
+
+    dt_safety: float
+        Fraction of the length scale (repulsive core or grid cell) a
+        particle may travel in one adaptive step
+
+    sleep_steps: int
+        > 0 enables sleeping: a particle whose speed and net force stayed
+        under sleep_speed / sleep_force for this many steps is frozen and
+        no longer receives forces (it still acts on others). A moving
+        neighbour or a change of the matrix wakes it up (0 = off)
+
+    sleep_speed, sleep_force: float
+        Thresholds for falling asleep
+
+    deterministic: bool
+        Bit-reproducible runs: the random motion stream is keyed by seed
+        directly and the forces are always summed in the same order, so
+        the same seed and start state give identical trajectories with
+        any kernel and number of threads (sleeping included: who sleeps
+        and who wakes up does not depend on the order either)
+
+    seed: int or None
+        Seed of the system's random generator, which drives the random
+        motion (None = fresh entropy, 0 in deterministic mode)
     """
     num_types: int = 4
     friction: float = 0.1
@@ -39,6 +132,27 @@ class SimulationConfig:
     random_motion: float = 0.01
     beta: float = 0.3
     force_scale: float = 0.15
+    parallel: bool = False
+    num_threads: int = 0
+    half_shell: bool = False
+    sort_interval: int = 0
+    verlet_skin: float = 0.0
+    adaptive_grid: bool = False
+    autotune_grid: bool = False
+    grid_mode: str = "dense"
+    force_profile: str = "liquid"
+    precision: str = "float32"
+    integrator: str = "euler"
+    max_substep: float = 0.0
+    adaptive_dt: bool = False
+    dt_min: float = 0.005
+    dt_max: float = 0.2
+    dt_safety: float = 0.05
+    sleep_steps: int = 0
+    sleep_speed: float = 0.05
+    sleep_force: float = 0.01
+    deterministic: bool = False
+    seed: Optional[int] = None
 
     particle_colors: List[str] = field(default_factory=list)
     interaction_matrix: InteractionMatrix = field(init=False)
@@ -74,6 +188,28 @@ class SimulationConfig:
         self._validate_type_index(type2)
         self.interaction_matrix.set_interaction(type1, type2, float(value))
     
+    def get_radius(self, type1: int, type2: int) -> float:
+        # Returns the interaction radius from type1 to type2
+        self._validate_type_index(type1)
+        self._validate_type_index(type2)
+        return float(self.interaction_matrix.get_radius(type1, type2, self.interaction_radius))
+
+    def set_radius(self, type1: int, type2: int, value) -> None:
+        # Set the interaction radius from type1 to type2 (None = interaction_radius)
+        self._validate_type_index(type1)
+        self._validate_type_index(type2)
+        self.interaction_matrix.set_radius(type1, type2, value)
+
+    def radius_matrix(self, dtype=np.float32) -> np.ndarray:
+        """Interaction radius of every type pair as a num_types x num_types array (float32 by default)."""
+        return self.interaction_matrix.radius_array(self.interaction_radius, dtype)
+
+    def max_interaction_radius(self) -> float:
+        """Largest radius of any type pair (the spatial grid is sized for it)."""
+        if self.num_types == 0:
+            return float(self.interaction_radius)
+        return float(self.radius_matrix().max())
+
     def randomize_interactions(self) -> None:
         """Randomize all interactions in the matrix"""
         self.interaction_matrix.randomize()
@@ -95,7 +231,11 @@ class SimulationConfig:
     # -------------- saving / loading config ------------------------
 
     def to_dict(self)->dict:
-        # Converts the configuration into a plain dict (for JSON save)
+        # Converts the configuration into a plain dict (for JSON save).
+        # Only the physics goes into a preset: the engine settings (parallel,
+        # num_threads, half_shell, sort_interval, verlet_skin, adaptive_grid,
+        # autotune_grid, grid_mode, precision, max_substep) belong to the
+        # program running it and are left out
         return {
             "num_types": self.num_types,
             "friction": self.friction,
@@ -104,14 +244,26 @@ class SimulationConfig:
             "random_motion": self.random_motion,
             "particle_colors": self.particle_colors,
             "interaction_matrix": self.interaction_matrix.matrix,
+            "interaction_radii": self.interaction_matrix.radii,
             "beta": self.beta,
-            "force_scale": self.force_scale
-
+            "force_scale": self.force_scale,
+            "force_profile": self.force_profile,
+            "integrator": self.integrator,
+            "adaptive_dt": self.adaptive_dt,
+            "dt_min": self.dt_min,
+            "dt_max": self.dt_max,
+            "dt_safety": self.dt_safety,
+            "sleep_steps": self.sleep_steps,
+            "sleep_speed": self.sleep_speed,
+            "sleep_force": self.sleep_force,
+            "deterministic": self.deterministic,
+            "seed": self.seed,
         }
     
     @classmethod
     def from_dict(cls, data: dict)-> "SimulationConfig":
-        # Create a SimulationConfig from a dict (inverse of to_dict())
+        # Create a SimulationConfig from a dict (inverse of to_dict()); engine
+        # settings are still read when given, missing ones take the defaults
         num_types = int(data.get("num_types", 4))
 
         cfg = cls(
@@ -123,6 +275,27 @@ class SimulationConfig:
             particle_colors=list(data.get("particle_colors", [])),
             beta=float(data.get("beta", 0.3)),
             force_scale=float(data.get("force_scale", 0.15)),
+            parallel=bool(data.get("parallel", False)),
+            num_threads=int(data.get("num_threads", 0)),
+            half_shell=bool(data.get("half_shell", False)),
+            sort_interval=int(data.get("sort_interval", 0)),
+            verlet_skin=float(data.get("verlet_skin", 0.0)),
+            adaptive_grid=bool(data.get("adaptive_grid", False)),
+            autotune_grid=bool(data.get("autotune_grid", False)),
+            grid_mode=str(data.get("grid_mode", "dense")),
+            force_profile=str(data.get("force_profile", "liquid")),
+            precision=str(data.get("precision", "float32")),
+            integrator=str(data.get("integrator", "euler")),
+            max_substep=float(data.get("max_substep", 0.0)),
+            adaptive_dt=bool(data.get("adaptive_dt", False)),
+            dt_min=float(data.get("dt_min", 0.005)),
+            dt_max=float(data.get("dt_max", 0.2)),
+            dt_safety=float(data.get("dt_safety", 0.05)),
+            sleep_steps=int(data.get("sleep_steps", 0)),
+            sleep_speed=float(data.get("sleep_speed", 0.05)),
+            sleep_force=float(data.get("sleep_force", 0.01)),
+            deterministic=bool(data.get("deterministic", False)),
+            seed=None if data.get("seed") is None else int(data["seed"]),
         )
 
         matrix_data = data.get("interaction_matrix")
@@ -132,6 +305,13 @@ class SimulationConfig:
                 for j in range(num_types):
                     if i < len(matrix_data) and j < len(matrix_data[i]):
                         cfg.set_interaction(i, j, float(matrix_data[i][j]))
+
+        radii_data = data.get("interaction_radii")
+        if radii_data is not None:
+            for i in range(num_types):
+                for j in range(num_types):
+                    if i < len(radii_data) and j < len(radii_data[i]):
+                        cfg.set_radius(i, j, radii_data[i][j])
         
         return cfg
     
@@ -0,0 +1,418 @@
+"""
+Streaming a simulation to viewer processes over a socket.
+
+A StreamServer (see ParticleSystem.serve_stream) accepts TCP clients and
+sends them the particle positions quantized to 16-bit fixed point
+relative to the world size (width / 65536 resolution, about 0.01 px for
+an 800 px world). Frames are ordered by particle id, so consecutive
+frames can be sent as deltas:
+
+    keyframe  ids (int64), types (int32), x, y (uint16)
+    delta     x, y differences to the frame the client received last
+              (uint16, wrapping like the periodic world, zigzag coded)
+
+Payloads are byte-shuffled (all low bytes, then all high bytes) and zlib
+compressed; zigzag coding maps small deltas of either sign to small
+numbers, whose high bytes are all zero, so a delta frame costs about a
+byte per coordinate or less. A
+keyframe is sent to new clients, every `keyframe_interval` frames and
+whenever particles were added, removed or changed type.
+
+Every message is a fixed header (magic, kind, count, step, world width,
+height, payload length) followed by the payload. The first message to a
+client is a hello carrying the particle colors as JSON.
+
+publish() only stores the newest frame and wakes the client threads; it
+never waits for a client. A client acknowledges every frame it receives
+with one byte, and its thread sends the newest frame only after that, so
+there is one frame in flight per client: a slow client skips frames
+instead of slowing down the simulation or piling up stale frames in the
+socket buffers. Clients that keep up share one encoded message per frame.
+
+    # simulation process
+    system.serve_stream(port=5555)
+
+    # viewer process
+    client = StreamClient("127.0.0.1", 5555)
+    frame = client.read()        # frame.xs, frame.ys, frame.types, ...
+
+    python src/streaming.py serve --preset src/presets/Chaos.json --port 5555
+    python src/streaming.py view --port 5555
+"""
+from typing import Dict, List, NamedTuple, Optional, Sequence
+import argparse
+import json
+import socket
+import struct
+import threading
+import time
+import zlib
+import numpy as np
+
+MAGIC = b"PLSQ"
+HELLO, KEYFRAME, DELTA = 0, 1, 2
+# magic, kind, count, step, width, height, payload bytes
+HEADER = struct.Struct("<4sB3xIqddI")
+SCALE = 65536
+
+
+class StreamFrame(NamedTuple):
+    """One reconstructed frame, particles in id order."""
+    step: int
+    width: float
+    height: float
+    xs: np.ndarray
+    ys: np.ndarray
+    types: np.ndarray
+    ids: np.ndarray
+
+
+def quantize(values: np.ndarray, size: float) -> np.ndarray:
+    """Positions in [0, size) to 16-bit fixed point (size itself wraps to 0)."""
+    scaled = np.rint(np.asarray(values, dtype=np.float64) * (SCALE / size))
+    return (scaled.astype(np.int64) & (SCALE - 1)).astype(np.uint16)
+
+
+def dequantize(values: np.ndarray, size: float) -> np.ndarray:
+    return values.astype(np.float32) * np.float32(size / SCALE)
+
+
+def _shuffle(values: np.ndarray) -> bytes:
+    # low bytes first, then high bytes: runs of equal high bytes compress well
+    return values.astype("<u2").view(np.uint8).reshape(-1, 2).T.tobytes()
+
+
+def _unshuffle(data: bytes, count: int) -> np.ndarray:
+    planes = np.frombuffer(data, dtype=np.uint8, count=2 * count).reshape(2, count)
+    return np.ascontiguousarray(planes.T).view("<u2").reshape(count).astype(np.uint16)
+
+
+class _Frame(NamedTuple):
+    # a published frame, quantized and in id order
+    seq: int
+    step: int
+    width: float
+    height: float
+    ids: np.ndarray
+    types: np.ndarray
+    qx: np.ndarray
+    qy: np.ndarray
+
+
+def _message(kind: int, frame: _Frame, payload: bytes) -> bytes:
+    count = len(frame.ids) if frame is not None else 0
+    step = frame.step if frame is not None else 0
+    width = frame.width if frame is not None else 0.0
+    height = frame.height if frame is not None else 0.0
+    return HEADER.pack(MAGIC, kind, count, step, width, height, len(payload)) + payload
+
+
+def encode_keyframe(frame: _Frame, level: int = 1) -> bytes:
+    payload = (frame.ids.astype("<i8").tobytes() + frame.types.astype("<i4").tobytes()
+               + _shuffle(frame.qx) + _shuffle(frame.qy))
+    return _message(KEYFRAME, frame, zlib.compress(payload, level))
+
+
+def _zigzag(delta: np.ndarray) -> np.ndarray:
+    # -1, 1, -2, ... to 1, 2, 3, ...: small steps either way keep a zero high byte
+    signed = delta.view(np.int16)
+    return ((signed << 1) ^ (signed >> 15)).view(np.uint16)
+
+
+def _unzigzag(values: np.ndarray) -> np.ndarray:
+    return (values >> 1) ^ (np.uint16(0) - (values & 1))
+
+
+def encode_delta(base: _Frame, frame: _Frame, level: int = 1) -> bytes:
+    # uint16 arithmetic wraps, so a particle crossing the world edge stays a small delta
+    payload = _shuffle(_zigzag(frame.qx - base.qx)) + _shuffle(_zigzag(frame.qy - base.qy))
+    return _message(DELTA, frame, zlib.compress(payload, level))
+
+
+def _same_particles(base: _Frame, frame: _Frame) -> bool:
+    return (base.width == frame.width and base.height == frame.height
+            and np.array_equal(base.ids, frame.ids) and np.array_equal(base.types, frame.types))
+
+
+class _Client:
+    def __init__(self, sock: socket.socket, address):
+        self.sock = sock
+        self.address = address
+        self.base: Optional[_Frame] = None
+        self.since_keyframe = 0
+        self.sent_seq = 0
+        self.skipped = 0
+
+
+class StreamServer:
+    """
+    Serves published frames to any number of TCP clients on (host, port);
+    port 0 picks a free port (see `address`). Bind to "0.0.0.0" to serve
+    other machines on the local network.
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, colors: Sequence[str] = (),
+                 keyframe_interval: int = 60, level: int = 1):
+        self.keyframe_interval = max(int(keyframe_interval), 1)
+        self.level = level
+        self._hello = _message(HELLO, None, json.dumps({"particle_colors": list(colors)}).encode("utf-8"))
+        self._listener = socket.create_server((host, port))
+        self.address = self._listener.getsockname()[:2]
+        self._changed = threading.Condition()
+        self._latest: Optional[_Frame] = None
+        # encoded messages of the newest frame, keyed by the seq of the client's base (0: keyframe)
+        self._encoded: Dict[int, bytes] = {}
+        self._clients: List[_Client] = []
+        self._threads: List[threading.Thread] = []
+        self._running = True
+        self._counts = {"frames": 0, "keyframes": 0, "deltas": 0, "skipped": 0, "bytes": 0}
+        self._accepter = threading.Thread(target=self._accept, name="stream-accept", daemon=True)
+        self._accepter.start()
+
+    def publish(self, xs, ys, types, ids, step: int, width: float, height: float):
+        """Stores the newest frame (quantized, in id order) and wakes the client threads."""
+        ids = np.asarray(ids)
+        if len(ids) > 1 and not np.all(ids[1:] > ids[:-1]):
+            order = np.argsort(ids, kind="stable")
+            xs, ys, types, ids = xs[order], ys[order], types[order], ids[order]
+        width, height = float(width), float(height)
+        arrays = (ids.copy(), np.array(types, dtype=np.int32), quantize(xs, width), quantize(ys, height))
+        with self._changed:
+            seq = self._latest.seq + 1 if self._latest is not None else 1
+            self._latest = _Frame(seq, int(step), width, height, *arrays)
+            self._encoded = {}
+            self._counts["frames"] += 1
+            self._changed.notify_all()
+
+    @property
+    def clients(self) -> int:
+        with self._changed:
+            return len(self._clients)
+
+    def stats(self) -> dict:
+        """Frames published, messages / bytes sent and frames skipped by slow clients."""
+        with self._changed:
+            return dict(self._counts, clients=len(self._clients))
+
+    def _accept(self):
+        while self._running:
+            try:
+                sock, address = self._listener.accept()
+            except OSError:
+                return
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            client = _Client(sock, address)
+            thread = threading.Thread(target=self._serve, args=(client,), name="stream-client", daemon=True)
+            with self._changed:
+                self._clients.append(client)
+                self._threads.append(thread)
+            thread.start()
+
+    def _serve(self, client: _Client):
+        try:
+            client.sock.sendall(self._hello)
+            while True:
+                with self._changed:
+                    while self._running and (self._latest is None or self._latest.seq == client.sent_seq):
+                        self._changed.wait()
+                    if not self._running:
+                        return
+                    frame = self._latest
+                    base = client.base
+                    keyframe = (base is None or client.since_keyframe >= self.keyframe_interval
+                                or not _same_particles(base, frame))
+                    key = 0 if keyframe else base.seq
+                    message = self._encoded.get(key)
+                # encoded outside the lock, so publish() never waits for zlib
+                if message is None:
+                    message = encode_keyframe(frame, self.level) if keyframe else encode_delta(base, frame, self.level)
+                with self._changed:
+                    if self._latest is frame:
+                        self._encoded[key] = message
+                    self._counts["keyframes" if keyframe else "deltas"] += 1
+                    self._counts["bytes"] += len(message)
+                    if client.sent_seq:
+                        client.skipped += frame.seq - client.sent_seq - 1
+                        self._counts["skipped"] += frame.seq - client.sent_seq - 1
+                # blocks only this client's thread, until the client took the frame
+                client.sock.sendall(message)
+                if not client.sock.recv(1):
+                    return
+                client.sent_seq = frame.seq
+                client.base = frame
+                client.since_keyframe = 1 if keyframe else client.since_keyframe + 1
+        except OSError:
+            pass
+        finally:
+            with self._changed:
+                if client in self._clients:
+                    self._clients.remove(client)
+                # added by _accept before the start, so it is there
+                self._threads.remove(threading.current_thread())
+            client.sock.close()
+
+    def close(self):
+        """Stops accepting, disconnects the clients and closes the socket."""
+        with self._changed:
+            self._running = False
+            clients = list(self._clients)
+            threads = list(self._threads)
+            self._changed.notify_all()
+        self._listener.close()
+        for client in clients:
+            try:
+                client.sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        self._accepter.join(1.0)
+        for thread in threads:
+            thread.join(1.0)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class StreamClient:
+    """
+    Reference client: connects to a StreamServer and rebuilds frames from
+    keyframes and deltas. `colors` holds the server's particle colors.
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 5555, timeout: Optional[float] = 10.0):
+        self._sock = socket.create_connection((host, port), timeout=timeout)
+        self._ids = None
+        self._types = None
+        self._qx = None
+        self._qy = None
+        self.bytes_received = 0
+        self.keyframes = 0
+        self.deltas = 0
+        kind, _, _, _, _, payload = self._receive()
+        if kind != HELLO:
+            raise ValueError("expected a hello message, got kind %d" % kind)
+        self.colors = json.loads(payload.decode("utf-8"))["particle_colors"]
+
+    def _receive_exactly(self, size: int) -> bytes:
+        data = bytearray()
+        while len(data) < size:
+            chunk = self._sock.recv(size - len(data))
+            if not chunk:
+                raise ConnectionError("stream closed by the server")
+            data += chunk
+        return bytes(data)
+
+    def _receive(self) -> tuple:
+        magic, kind, count, step, width, height, size = HEADER.unpack(self._receive_exactly(HEADER.size))
+        if magic != MAGIC:
+            raise ValueError("not a particle stream")
+        payload = self._receive_exactly(size)
+        self.bytes_received += HEADER.size + size
+        return kind, count, step, width, height, payload
+
+    def read(self) -> StreamFrame:
+        """Blocks for the next frame and returns it reconstructed."""
+        while True:
+            kind, count, step, width, height, payload = self._receive()
+            if kind == KEYFRAME:
+                data = zlib.decompress(payload)
+                self._ids = np.frombuffer(data, dtype="<i8", count=count).astype(np.int64)
+                self._types = np.frombuffer(data, dtype="<i4", count=count, offset=8 * count).astype(np.int32)
+                self._qx = _unshuffle(data[12 * count:14 * count], count)
+                self._qy = _unshuffle(data[14 * count:], count)
+                self.keyframes += 1
+            elif kind == DELTA:
+                if self._qx is None or len(self._qx) != count:
+                    raise ValueError("delta frame without a matching keyframe")
+                data = zlib.decompress(payload)
+                self._qx += _unzigzag(_unshuffle(data[:2 * count], count))
+                self._qy += _unzigzag(_unshuffle(data[2 * count:], count))
+                self.deltas += 1
+            else:
+                continue
+            # the acknowledgement lets the server send the next (newest) frame
+            self._sock.sendall(b"\x01")
+            return StreamFrame(step, width, height, dequantize(self._qx, width), dequantize(self._qy, height),
+                               self._types.copy(), self._ids.copy())
+
+    def close(self):
+        self._sock.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def serve(args) -> None:
+    """Runs a headless ParticleSystem and streams it until interrupted."""
+    from simulation_config import SimulationConfig
+    from particle_system import ParticleSystem
+    config = SimulationConfig.load_config(args.preset) if args.preset else SimulationConfig()
+    system = ParticleSystem([], config, args.width, args.height)
+    system.add_particles(args.particles, list(range(config.num_types)))
+    host, port = system.serve_stream(args.host, args.port, every=args.every)
+    print(f"streaming {args.particles} particles on {host}:{port}")
+    period = 1.0 / args.tick_rate
+    try:
+        while True:
+            start = time.perf_counter()
+            system.update_system(args.dt)
+            time.sleep(max(period - (time.perf_counter() - start), 0.0))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        system.stop_streaming()
+
+
+def view(args) -> None:
+    """Draws the frames of a stream in a pygame window."""
+    import pygame
+    client = StreamClient(args.host, args.port, timeout=None)
+    colors = [pygame.Color(c) for c in client.colors] or [pygame.Color(255, 255, 255)]
+    frame = client.read()
+    pygame.init()
+    screen = pygame.display.set_mode((int(frame.width), int(frame.height)))
+    pygame.display.set_caption("Particle Life stream")
+    running = True
+    while running:
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                running = False
+        screen.fill((0, 0, 0))
+        for x, y, t in zip(frame.xs.astype(int).tolist(), frame.ys.astype(int).tolist(), frame.types.tolist()):
+            pygame.draw.circle(screen, colors[t % len(colors)], (x, y), 2)
+        pygame.display.flip()
+        frame = client.read()
+    client.close()
+    pygame.quit()
+
+
+def main(argv: Sequence[str] = None) -> None:
+    parser = argparse.ArgumentParser(description="Stream a simulation to viewer processes.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    server = commands.add_parser("serve", help="run a headless simulation and stream it")
+    server.add_argument("--preset", help="JSON preset to load")
+    server.add_argument("--particles", type=int, default=2000)
+    server.add_argument("--width", type=int, default=800)
+    server.add_argument("--height", type=int, default=600)
+    server.add_argument("--dt", type=float, default=0.05)
+    server.add_argument("--tick-rate", type=float, default=60.0)
+    server.add_argument("--every", type=int, default=1, help="stream every n-th step")
+    server.add_argument("--host", default="127.0.0.1")
+    server.add_argument("--port", type=int, default=5555)
+    viewer = commands.add_parser("view", help="show a stream in a window")
+    viewer.add_argument("--host", default="127.0.0.1")
+    viewer.add_argument("--port", type=int, default=5555)
+    args = parser.parse_args(argv)
+    if args.command == "serve":
+        serve(args)
+    else:
+        view(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,214 @@
+"""
+Preset sweeps: many headless runs on a process pool.
+
+A sweep is the product of interaction matrices (the JSON presets and / or
+random matrices) x interaction_radius x beta x force_scale x seeds. Every
+run builds a ParticleSystem, steps it headless and reports summary
+metrics. The runs go to a process pool and each result is appended to a
+JSON lines file as soon as it finishes. Every run has an id derived from
+its full configuration, so a restarted sweep skips the runs already in
+the file.
+
+    python src/sweep.py --presets src/presets --random 1000 \\
+        --radius 40 60 --beta 0.3 --force-scale 0.1 0.2 --seeds 0 1 2 \\
+        --particles 1000 --steps 500 --out sweep.jsonl
+"""
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import get_context
+from typing import Callable, Dict, Iterable, List, Sequence
+import argparse
+import hashlib
+import itertools
+import json
+import os
+import random
+import time
+import traceback
+import numpy as np
+from simulation_config import SimulationConfig
+from particle_system import ParticleSystem
+
+PRESETS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "presets")
+
+
+def preset_matrices(directory: str = PRESETS_DIR) -> Dict[str, dict]:
+    """Config dicts of the JSON presets in `directory`, keyed "preset:<file name>"."""
+    presets = {}
+    for name in sorted(os.listdir(directory)):
+        if name.endswith(".json"):
+            config = SimulationConfig.load_config(os.path.join(directory, name))
+            presets["preset:" + name[:-5]] = config.to_dict()
+    return presets
+
+
+def random_matrices(count: int, seed: int = 0, base: SimulationConfig = None) -> Dict[str, dict]:
+    """
+    `count` configs with random matrices (uniform in [-1, 1] like
+    InteractionMatrix.randomize), keyed "random:<seed>:<k>". Matrix k only
+    depends on (seed, k), so a restarted sweep sees the same matrices.
+    """
+    base = base if base is not None else SimulationConfig()
+    configs = {}
+    for k in range(count):
+        values = np.random.default_rng((seed, k)).uniform(-1.0, 1.0, (base.num_types, base.num_types))
+        data = base.to_dict()
+        data["interaction_matrix"] = values.tolist()
+        configs["random:%d:%d" % (seed, k)] = data
+    return configs
+
+
+def sweep_grid(matrices: Dict[str, dict], radii: Sequence[float], betas: Sequence[float],
+               force_scales: Sequence[float], seeds: Sequence[int], particles: int = 1000,
+               steps: int = 500, dt: float = 0.05, width: int = 800, height: int = 600) -> List[dict]:
+    """
+    One run description per combination, in a fixed order. A run holds
+    its full config dict, the run settings, a readable label and run_id,
+    a hash of all of it (the key for skipping completed runs).
+    """
+    runs = []
+    for (name, data), radius, beta, force_scale, seed in itertools.product(
+            matrices.items(), radii, betas, force_scales, seeds):
+        config = dict(data, interaction_radius=float(radius), beta=float(beta),
+                      force_scale=float(force_scale), seed=int(seed))
+        run = {
+            "label": "%s r=%g beta=%g force_scale=%g seed=%d" % (name, radius, beta, force_scale, seed),
+            "matrix": name, "interaction_radius": float(radius), "beta": float(beta),
+            "force_scale": float(force_scale), "seed": int(seed),
+            "particles": int(particles), "steps": int(steps), "dt": float(dt),
+            "width": int(width), "height": int(height), "config": config,
+        }
+        key = json.dumps({k: v for k, v in run.items() if k != "label"}, sort_keys=True)
+        run["run_id"] = hashlib.sha1(key.encode("utf-8")).hexdigest()[:16]
+        runs.append(run)
+    return runs
+
+
+def run_one(run: dict) -> dict:
+    """
+    Runs one sweep entry headless and returns its summary: the run's
+    parameters (without the config dict) plus metrics of the final state
+    and the wall time.
+    """
+    config = SimulationConfig.from_dict(run["config"])
+    # start positions come from the global generator, the jitter from config.seed
+    random.seed(run["seed"])
+    system = ParticleSystem([], config, run["width"], run["height"])
+    system.add_particles(run["particles"], list(range(config.num_types)))
+    start = time.perf_counter()
+    system.step_n(run["steps"], run["dt"])
+    seconds = time.perf_counter() - start
+
+    store = system.particles
+    speed2 = store.vxs.astype(np.float64) ** 2 + store.vys.astype(np.float64) ** 2
+    grid = system.grid_stats()
+    # particle_occupancy / mean_occupancy: 1 + 1/mean for a uniform gas, larger when clustered
+    mean_occupancy = grid["mean_occupancy"]
+    metrics = {
+        "mean_speed": float(np.sqrt(speed2).mean()),
+        "max_speed": float(np.sqrt(speed2).max()),
+        "kinetic_energy": float(0.5 * speed2.mean()),
+        "clustering": float(grid["particle_occupancy"] / mean_occupancy) if mean_occupancy else 0.0,
+        "max_occupancy": int(grid["max_occupancy"]),
+    }
+    result = {k: v for k, v in run.items() if k != "config"}
+    result.update(metrics=metrics, seconds=seconds, steps_per_second=run["steps"] / seconds if seconds else 0.0)
+    return result
+
+
+def _run_safely(run: dict) -> dict:
+    # a failing run is reported (and retried on restart) instead of ending the sweep
+    try:
+        return run_one(run)
+    except Exception:
+        return {"run_id": run["run_id"], "label": run["label"], "error": traceback.format_exc()}
+
+
+def completed_runs(path: str) -> set:
+    """run_ids with a result (not an error) in the results file; a cut-off last line is ignored."""
+    done = set()
+    if not os.path.exists(path):
+        return done
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if "error" not in record and "run_id" in record:
+                done.add(record["run_id"])
+    return done
+
+
+def _ends_with_newline(path: str) -> bool:
+    with open(path, "rb") as f:
+        f.seek(-1, os.SEEK_END)
+        return f.read(1) == b"\n"
+
+
+def run_sweep(runs: Iterable[dict], results_path: str, processes: int = 0,
+              progress: Callable[[dict, int, int], None] = None) -> int:
+    """
+    Runs every run not yet completed in results_path on `processes` worker
+    processes (0 = one per CPU) and appends each result as one JSON line
+    when it finishes. progress(result, finished, total) is called after
+    each one. Returns the number of runs executed.
+    """
+    done = completed_runs(results_path)
+    todo = [run for run in runs if run["run_id"] not in done]
+    if not todo:
+        return 0
+    processes = processes if processes > 0 else (os.cpu_count() or 1)
+    # "spawn": workers start clean, without the parent's threads and state
+    context = get_context("spawn")
+    with ProcessPoolExecutor(max_workers=min(processes, len(todo)), mp_context=context) as pool, \
+            open(results_path, "a", encoding="utf-8") as out:
+        if out.tell() > 0 and not _ends_with_newline(results_path):
+            # close a line cut off by a killed sweep, or the next result joins it
+            out.write("\n")
+        futures = [pool.submit(_run_safely, run) for run in todo]
+        for finished, future in enumerate(as_completed(futures), 1):
+            result = future.result()
+            out.write(json.dumps(result) + "\n")
+            # flushed per line: a killed sweep keeps everything that finished
+            out.flush()
+            if progress is not None:
+                progress(result, finished, len(todo))
+    return len(todo)
+
+
+def main(argv: Sequence[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Run a headless parameter sweep on a process pool.")
+    parser.add_argument("--presets", metavar="DIR", help="sweep the JSON presets in DIR")
+    parser.add_argument("--random", type=int, default=0, metavar="N", help="sweep N random matrices")
+    parser.add_argument("--random-seed", type=int, default=0, help="seed of the random matrices")
+    parser.add_argument("--radius", type=float, nargs="+", default=[50.0])
+    parser.add_argument("--beta", type=float, nargs="+", default=[0.3])
+    parser.add_argument("--force-scale", type=float, nargs="+", default=[0.15])
+    parser.add_argument("--seeds", type=int, nargs="+", default=[0])
+    parser.add_argument("--particles", type=int, default=1000)
+    parser.add_argument("--steps", type=int, default=500)
+    parser.add_argument("--dt", type=float, default=0.05)
+    parser.add_argument("--width", type=int, default=800)
+    parser.add_argument("--height", type=int, default=600)
+    parser.add_argument("--processes", type=int, default=0, help="worker processes (0 = one per CPU)")
+    parser.add_argument("--out", default="sweep_results.jsonl", help="JSON lines results file")
+    args = parser.parse_args(argv)
+
+    matrices = {}
+    if args.presets or not args.random:
+        matrices.update(preset_matrices(args.presets or PRESETS_DIR))
+    matrices.update(random_matrices(args.random, args.random_seed))
+    runs = sweep_grid(matrices, args.radius, args.beta, args.force_scale, args.seeds,
+                      args.particles, args.steps, args.dt, args.width, args.height)
+
+    def report(result, finished, total):
+        status = "failed" if "error" in result else "%.1f steps/s" % result["steps_per_second"]
+        print(f"[{finished}/{total}] {result['label']}: {status}")
+
+    executed = run_sweep(runs, args.out, args.processes, report)
+    print(f"{executed} runs executed, {len(runs) - executed} already in {args.out}")
+    return executed
+
+
+if __name__ == "__main__":
+    main()
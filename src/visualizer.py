@@ -1,6 +1,9 @@
 import pygame
 import time
+from contextlib import nullcontext
+from typing import Optional
 from particle_system import ParticleSystem
+from physics_thread import PhysicsThread
 from simulation_config import SimulationConfig
 
 
@@ -113,12 +116,21 @@ class Visualizer:
         height: int,
         target_fps: int = 60,
         speed_factor: float = 1.0,
+        threaded: bool = False,
+        max_substep: Optional[float] = 0.05,
     ) -> None:
         self.system = system
+        # frames (times speed_factor) can be long: split them into steps
+        # the integrator stays stable at (None keeps the config's value)
+        if max_substep is not None:
+            system.config.max_substep = float(max_substep)
         self.width = width
         self.height = height
         self.target_fps = target_fps
         self.speed_factor = speed_factor
+        # threaded: physics ticks on its own thread at target_fps (see
+        # physics_thread.py), the loop below only renders its snapshots
+        self.physics = PhysicsThread(system, target_fps, speed_factor) if threaded else None
 
         # overall state flags
         self.running = True
@@ -141,8 +153,10 @@ class Visualizer:
         # button is in panel-local coordinates
         self.collapse_button_rect = pygame.Rect(10, 10, 26, 22)
 
-        # selected particle for inspection
+        # selected particle for inspection, and what the current frame
+        # shows of it (type, x, y, speed; see _selected_state)
         self.selected_particle = None
+        self._selected = None
 
         # particle visual radius (controlled by "Size" slider)
         self.particle_radius = 3.0
@@ -299,6 +313,9 @@ class Visualizer:
     # main loop
     # ==================================================================
     def run(self) -> None:
+        if self.physics is not None:
+            self._run_threaded()
+            return
         time_physics = 0
         time_draw = 0
         frame_count = 0
@@ -310,7 +327,8 @@ class Visualizer:
             self._handle_events()
 
             if self.simulation_running:
-                # clamp very large time steps (e.g. when window is dragged)
+                # clamp very large time steps (e.g. when window is dragged);
+                # the system splits dt * speed_factor into stable substeps
                 if dt > 0.05:
                     dt = 0.05
                 t0 = time.perf_counter()
@@ -337,6 +355,42 @@ class Visualizer:
 
         pygame.quit()
 
+    def _run_threaded(self) -> None:
+        # physics runs at its own fixed tick rate, this loop only handles
+        # events and draws the newest snapshot
+        physics = self.physics
+        physics.start()
+        time_draw = 0
+        frame_count = 0
+        try:
+            while self.running:
+                self.clock.tick(self.target_fps)
+                self._handle_events()
+                if physics.error is not None:
+                    raise physics.error
+                physics.stepping = self.simulation_running
+                physics.speed_factor = self.speed_factor
+
+                t0 = time.perf_counter()
+                self._draw()
+                time_draw += time.perf_counter() - t0
+                frame_count += 1
+
+                if frame_count % 120 == 0:
+                    stats = physics.stats()
+                    avg_draw = (time_draw / frame_count) * 1000
+                    print(f"Physics: {stats['tick_ms']:.2f}ms/tick ({stats['late_ticks']} late) | "
+                          f"Draw: {avg_draw:.2f}ms | Target: 16.67ms")
+                    time_draw = 0
+                    frame_count = 0
+        finally:
+            physics.stop()
+            pygame.quit()
+
+    def _holding(self):
+        """Context in which the system may be changed (waits for a running physics tick)."""
+        return self.physics.hold() if self.physics is not None else nullcontext(self.system)
+
     # ==================================================================
     # event handling
     # ==================================================================
@@ -357,8 +411,9 @@ class Visualizer:
                 # updates visualizer size
                 self.width, self.height = w, h
                 # updates particle system bounds
-                self.system.width = w
-                self.system.height = h
+                with self._holding():
+                    self.system.width = w
+                    self.system.height = h
                 # recreates the main display surface with the new size
                 self.screen = pygame.display.set_mode((w, h), pygame.RESIZABLE)
                 # recreates the trail surface
@@ -458,35 +513,43 @@ class Visualizer:
         min_dist_sq = 15 * 15  # selection radius
         closest = None
 
-        for p in self.system.particles:
-            dx = p.position_x - x
-            dy = p.position_y - y
-            dist_sq = dx * dx + dy * dy
-            if dist_sq < min_dist_sq:
-                min_dist_sq = dist_sq
-                closest = p
+        particles = self.system.particles
+        with self._holding():
+            if len(particles):
+                dx = particles.xs - x
+                dy = particles.ys - y
+                dist_sq = dx * dx + dy * dy
+                idx = int(dist_sq.argmin())
+                if dist_sq[idx] < min_dist_sq:
+                    # a view into the particle arrays, follows the particle while it moves
+                    closest = particles[idx]
 
         self.selected_particle = closest
 
     def _reset_particles(self) -> None:
         """Clear system and create a fresh set of particles."""
-        self.system.reset_system()
-        self.system.add_particles(
-            count=self.initial_particle_count,
-            types=self.available_types,
-        )
+        with self._holding():
+            self.system.reset_system()
+            # the selection points into the old particle arrays
+            self.selected_particle = None
+            self.system.add_particles(
+                count=self.initial_particle_count,
+                types=self.available_types,
+            )
         # clear trails as well
         self.trail_surface.fill((0, 0, 0, 0))
 
     def _randomize_system(self) -> None:
         """Randomize interaction matrix and restart the system."""
-        self.system.config.randomize_interactions()
+        with self._holding():
+            self.system.config.randomize_interactions()
         self._reset_particles()
 
     # ==================================================================
     # drawing
     # ==================================================================
     def _draw(self) -> None:
+        self._selected = self._selected_state()
         # background
         self.screen.fill((0, 0, 0))
 
@@ -499,6 +562,21 @@ class Visualizer:
 
         pygame.display.flip()
 
+    def _selected_state(self):
+        """
+        (type, x, y, speed) of the selected particle, None without a
+        selection. Read between two physics ticks: a tick moves the
+        particle and may reorder the arrays its view looks it up in.
+        """
+        if self.selected_particle is None:
+            return None
+        with self._holding():
+            p = self.selected_particle
+            if p is None:
+                return None
+            speed = (p.velocity_x ** 2 + p.velocity_y ** 2) ** 0.5
+            return p.particle_type, p.position_x, p.position_y, speed
+
     def _draw_particles_with_trails(self) -> None:
         self._frame += 1
         # slightly darken previous trails
@@ -506,24 +584,29 @@ class Visualizer:
             self.trail_surface.blit(self.fade_surface, (0, 0))
 
         # draw new particle positions onto the trail surface
-        for p in self.system.particles:
-            x = int(p.position_x)
-            y = int(p.position_y)
+        # (threaded: the newest physics snapshot, copied out right away)
+        particles = self.physics.latest() if self.physics is not None else self.system.particles
+        r = int(self.particle_radius) # сache integer radius to avoid repeated type conversion in draw calls
+        type_colors = self.type_colors
+        trail_surface = self.trail_surface
+        for x, y, t in zip(
+            particles.xs.astype(int).tolist(),
+            particles.ys.astype(int).tolist(),
+            particles.types.tolist(),
+        ):
             if x < 0 or x >= self.width or y < 0 or y >= self.height:
                 continue
 
-            color = self.type_colors[p.particle_type]
-            r = int(self.particle_radius) # сache integer radius to avoid repeated type conversion in draw calls
-            pygame.draw.circle(self.trail_surface, color, (x, y), r)
+            pygame.draw.circle(trail_surface, type_colors[t], (x, y), r)
 
         # blit the trails onto the main screen
         self.screen.blit(self.trail_surface, (0, 0))
 
         # highlight selected particle with a thin outline
-        if self.selected_particle is not None:
-            p = self.selected_particle
-            x = int(p.position_x)
-            y = int(p.position_y)
+        if self._selected is not None:
+            _, x, y, _ = self._selected
+            x = int(x)
+            y = int(y)
             pygame.draw.circle(
                 self.screen,
                 (255, 255, 255),
@@ -560,7 +643,7 @@ class Visualizer:
             # estimate how many lines of info we will draw
             base_info_lines = 2  # FPS + Particles
             extra_lines = 0
-            if self.selected_particle is not None:
+            if self._selected is not None:
                 extra_lines = 6  # "", "Selected:", type, pos, speed (5 + 1 blank)
 
             info_lines_count = base_info_lines + extra_lines
@@ -717,14 +800,13 @@ class Visualizer:
             f"Particles: {len(self.system.particles)}",
         ]
 
-        if self.selected_particle is not None:
-            p = self.selected_particle
-            speed = (p.velocity_x ** 2 + p.velocity_y ** 2) ** 0.5
+        if self._selected is not None:
+            particle_type, x, y, speed = self._selected
             lines += [
                 "",
                 "Selected:",
-                f"  type: {p.particle_type}",
-                f"  pos: ({p.position_x:.1f}, {p.position_y:.1f})",
+                f"  type: {particle_type}",
+                f"  pos: ({x:.1f}, {y:.1f})",
                 f"  speed: {speed:.2f}",
             ]
 
@@ -0,0 +1,62 @@
+import pytest
+import numpy as np
+from src.simulation_config import SimulationConfig
+from src.particle_system import ParticleSystem
+from src.distributed import DistributedSystem
+
+def _system(width=300, height=200, count=300, **options):
+    config = SimulationConfig(seed=3, sort_interval=0, adaptive_grid=False, **options)
+    config.randomize_interactions()
+    system = ParticleSystem([], config, width, height)
+    system.add_particles(count, [0, 1, 2, 3])
+    return system
+
+def _in_id_order(system):
+    order = np.argsort(system.particles.ids)
+    return system.particles.xs[order], system.particles.vys[order]
+
+@pytest.mark.parametrize("integrator,workers", [("euler", 3), ("verlet", 2)])
+def test_deterministic_matches_particle_system(integrator, workers):
+    system = _system(deterministic=True, integrator=integrator)
+    with DistributedSystem.from_system(system, workers=workers) as world:
+        world.step_n(15, 0.05)
+        state = world.snapshot()
+    system.step_n(15, 0.05)
+    xs, vys = _in_id_order(system)
+    assert np.array_equal(state["x"], xs)
+    assert np.array_equal(state["vy"], vys)
+
+def test_particles_migrate_between_strips():
+    system = _system(count=200)
+    system.config.random_motion = 2.0
+    # some particles start just left of the strip edges, moving across them
+    system.particles.xs[:20] = 99.5
+    system.particles.xs[20:40] = 199.5
+    system.particles.vxs[:40] = 100.0
+    with DistributedSystem.from_system(system, workers=3) as world:
+        before = world.worker_counts()
+        world.step_n(20, 0.05)
+        counts = world.worker_counts()
+        state = world.snapshot()
+        assert len(world) == 200 and counts.sum() == 200
+        assert not np.array_equal(before, counts)
+        # every particle sits in the strip of the worker that owns it
+        for w in range(3):
+            owned = world._owned[w]["x"][:counts[w]]
+            assert np.all((owned >= w * 100) & (owned < (w + 1) * 100))
+    assert np.array_equal(state["id"], np.arange(200))
+    assert world.step_count == 20
+
+def test_rejects_strips_narrower_than_radius():
+    system = _system()
+    system.config.interaction_radius = 120
+    with pytest.raises(ValueError):
+        DistributedSystem.from_system(system, workers=3)
+
+def test_closed_system_refuses_steps():
+    system = _system(count=20)
+    world = DistributedSystem.from_system(system, workers=1)
+    world.close()
+    world.close()
+    with pytest.raises(RuntimeError):
+        world.step_n(1, 0.05)
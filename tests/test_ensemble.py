@@ -0,0 +1,103 @@
+import pytest
+import numpy as np
+import src.ensemble as ensemble_module
+from src.simulation_config import SimulationConfig
+from src.particle_system import ParticleSystem
+from src.ensemble import Ensemble
+
+def _config(**options):
+    config = SimulationConfig(seed=3, sort_interval=0, adaptive_grid=False, **options)
+    config.randomize_interactions()
+    return config
+
+def _replay(ensemble, u, config, steps, dt):
+    # universe u as a ParticleSystem with the same start state and noise stream
+    view = ensemble.universe(u)
+    system = ParticleSystem([], config, ensemble.width, ensemble.height)
+    system.particles.add_arrays(view.xs.copy(), view.ys.copy(), view.vxs.copy(), view.vys.copy(), view.types.copy())
+    system._noise_seed = int(ensemble.seeds[u])
+    system.step_n(steps, dt)
+    return system.particles
+
+@pytest.mark.parametrize("integrator", ["euler", "verlet"])
+def test_universe_matches_particle_system(integrator):
+    config = _config(integrator=integrator)
+    ensemble = Ensemble(config, 200, 200, universes=3, particles=[80, 120, 100])
+    expected = _replay(ensemble, 1, config, 10, 0.05)
+    ensemble.step_n(10, 0.05)
+    view = ensemble.universe(1)
+    assert np.allclose(view.xs, expected.xs, atol=1e-4)
+    assert np.allclose(view.vys, expected.vys, atol=1e-4)
+
+def test_same_seed_same_ensemble():
+    config = _config()
+    runs = []
+    for _ in range(2):
+        ensemble = Ensemble(config, 150, 150, universes=4, particles=50, seed=11)
+        ensemble.step_n(5, 0.05)
+        runs.append(ensemble.xs.copy())
+    assert np.array_equal(runs[0], runs[1])
+    other = Ensemble(config, 150, 150, universes=4, particles=50, seed=12)
+    assert not np.array_equal(other.seeds, Ensemble(config, 150, 150, universes=4, particles=50, seed=11).seeds)
+
+def test_universes_are_independent():
+    config = _config()
+    ensemble = Ensemble(config, 150, 150, universes=3, particles=60, seed=5)
+    before = ensemble.universe(2).xs.copy()
+    ensemble.universe(0).vxs[:] = 50.0
+    ensemble.step_n(3, 0.05)
+    alone = Ensemble(config, 150, 150, universes=3, particles=60, seed=5)
+    alone.step_n(3, 0.05)
+    assert np.array_equal(ensemble.universe(2).xs, alone.universe(2).xs)
+    assert not np.array_equal(ensemble.universe(2).xs, before)
+
+def test_views_write_through_and_bounds():
+    ensemble = Ensemble(_config(), 100, 100, universes=2, particles=[3, 4])
+    assert len(ensemble) == 2 and ensemble.xs.shape[0] == 7
+    ensemble.universe(1).xs[0] = 12.5
+    assert ensemble.xs[3] == 12.5
+    with pytest.raises(IndexError):
+        ensemble.universe(2)
+    with pytest.raises(ValueError):
+        Ensemble(_config(), 100, 100, universes=2, particles=[3, 0])
+
+def test_stats_per_universe_and_aggregate():
+    ensemble = Ensemble(_config(), 100, 100, universes=3, particles=[2, 2, 4])
+    ensemble.vxs[:] = [1, 1, 2, 2, 0, 0, 0, 0]
+    ensemble.vys[:] = 0.0
+    stats = ensemble.stats()
+    assert np.allclose(stats["mean_speed"], [1.0, 2.0, 0.0])
+    assert np.allclose(stats["kinetic_energy"], [0.5, 2.0, 0.0])
+    assert stats["kinetic_energy_mean"] == pytest.approx(2.5 / 3)
+    assert stats["universes"] == 3 and stats["particles"] == 8
+
+def test_numpy_fallback_matches(monkeypatch):
+    config = _config()
+    compiled = Ensemble(config, 150, 150, universes=2, particles=40, seed=7)
+    compiled.step_n(3, 0.05)
+    monkeypatch.setattr(ensemble_module, "NUMBA_OK", False)
+    fallback = Ensemble(config, 150, 150, universes=2, particles=40, seed=7)
+    assert fallback.engine == "numpy"
+    fallback.step_n(3, 0.05)
+    assert np.allclose(fallback.xs, compiled.xs, atol=1e-3)
+
+def test_parameter_change_wakes_sleeping_universes():
+    # thresholds nobody exceeds: every particle falls asleep
+    config = _config(sleep_steps=2, sleep_speed=1e9, sleep_force=1e9)
+    ensemble = Ensemble(config, 150, 150, universes=2, particles=40, seed=1)
+    ensemble.step_n(4, 0.05)
+    assert np.all(ensemble._calm > 2)
+    config.set_interaction(0, 1, 0.5)
+    ensemble.step_n(1, 0.05)
+    assert np.all(ensemble._calm <= 2)
+
+def test_reregistered_profile_rebuilds_the_table():
+    # register where the simulation modules look profiles up (pythonpath=src)
+    from force_profiles import register_profile
+    register_profile("test_ensemble_push", lambda q, k, beta, force_scale: np.full_like(q, 1.0))
+    ensemble = Ensemble(_config(force_profile="test_ensemble_push"), 150, 150, universes=1, particles=10)
+    ensemble.step_n(1, 0.05)
+    assert ensemble._table.max() == 1.0
+    register_profile("test_ensemble_push", lambda q, k, beta, force_scale: np.full_like(q, 2.0))
+    ensemble.step_n(1, 0.05)
+    assert ensemble._table.max() == 2.0
@@ -0,0 +1,48 @@
+import numpy as np
+import pytest
+from src.force_profiles import available_profiles, get_profile, register_profile, tabulate
+
+
+def test_builtin_profiles_are_registered():
+    assert {"liquid", "linear", "smooth"} <= set(available_profiles())
+
+
+def test_liquid_profile_matches_original_force_law():
+    q = np.array([0.0, 0.15, 0.3, 0.65, 1.0])
+    values = get_profile("liquid")(q, 0.5, 0.3, 0.15)
+    # core repulsion below beta, triangle with its peak k * force_scale at (1 + beta) / 2
+    assert values == pytest.approx([-0.15, -0.075, 0.0, 0.075, 0.0])
+
+
+def test_tabulate_samples_every_type_pair():
+    matrix = np.array([[1.0, -1.0], [0.0, 0.5]])
+    table = tabulate("liquid", matrix, 0.3, 0.15, samples=100)
+
+    assert table.shape == (2, 2, 101)
+    assert table.dtype == np.float32
+    assert table[0, 0, 65] == pytest.approx(0.15)
+    assert table[0, 1, 65] == pytest.approx(-0.15)
+    assert table[1, 0, 65] == 0.0
+    # the core does not depend on the matrix
+    assert table[1, 0, 0] == pytest.approx(-0.15)
+
+
+def test_register_user_profile():
+    @register_profile("test_constant")
+    def constant(q, k, beta, force_scale):
+        return k * force_scale
+
+    table = tabulate("test_constant", [[2.0]], 0.3, 0.5, samples=4)
+    assert get_profile("test_constant") is constant
+    assert table[0, 0].tolist() == [1.0] * 5
+
+
+def test_unknown_profile_raises():
+    with pytest.raises(ValueError):
+        get_profile("no such profile")
+
+
+@pytest.mark.parametrize("beta", [0.0, 1.0, -0.1, 1.5])
+def test_tabulate_rejects_beta_outside_unit_interval(beta):
+    with pytest.raises(ValueError):
+        tabulate("liquid", [[1.0]], beta, 0.15)
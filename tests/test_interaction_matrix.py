@@ -48,4 +48,16 @@ def test_randomize_logic(matrix):
             if val != 0.0:
                 has_changed = True
                 
-    assert has_changed is True
\ No newline at end of file
+    assert has_changed is True
+
+
+def test_radii_start_unset(matrix):
+    """Verifies that pair radii fall back to the given default until they are set."""
+    assert matrix.get_radius(0, 1) is None
+    assert matrix.get_radius(0, 1, 50.0) == 50.0
+    matrix.set_radius(0, 1, 20.0)
+    matrix.set_radius(5, 5, 20.0)
+    assert matrix.get_radius(0, 1, 50.0) == 20.0
+    radii = matrix.radius_array(50.0)
+    assert radii[0, 1] == 20.0
+    assert radii[1, 0] == 50.0
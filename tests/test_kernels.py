@@ -0,0 +1,95 @@
+import numpy as np
+from src.kernels import (
+    grid_shape, build_stencil, build_half_stencil, cull_stencil, grid_geometry, cell_counts, occupancy_stats,
+    hash_table_size,
+)
+
+
+def test_grid_shape_cells_are_at_least_cell_size():
+    nx, ny = grid_shape(800, 600, 30.0)
+    assert (nx, ny) == (26, 20)
+    assert 800 / nx >= 30.0 and 600 / ny >= 30.0
+    # world smaller than one cell still has one cell
+    assert grid_shape(10, 10, 30.0) == (1, 1)
+
+
+def test_build_stencil_full_block():
+    stencil = build_stencil(20, 20, 2, 2)
+    assert stencil.shape == (25, 2)
+    assert (0, 0) in {tuple(o) for o in stencil}
+
+
+def test_build_stencil_has_no_duplicate_cells_on_small_grids():
+    # 5x5 offsets on a 3x4 grid would visit cells twice after wrapping
+    stencil = build_stencil(3, 4, 2, 2)
+    cells = {(ox % 3, oy % 4) for ox, oy in stencil}
+    assert len(cells) == len(stencil) == 12
+    assert stencil.dtype == np.int32
+
+
+def test_half_stencil_covers_every_cell_pair_once():
+    for nx, ny, rx, ry in [(20, 20, 2, 2), (3, 4, 2, 2), (2, 2, 1, 1)]:
+        full = {(ox % nx, oy % ny) for ox, oy in build_stencil(nx, ny, rx, ry)}
+        half = {(ox % nx, oy % ny): tie for ox, oy, tie in build_half_stencil(build_stencil(nx, ny, rx, ry), nx, ny)}
+        for key in full:
+            opposite = (-key[0] % nx, -key[1] % ny)
+            if key == opposite:
+                # own cell / self-opposite offsets: kept, pairs split by particle index
+                assert half[key] == 1
+            else:
+                # exactly one direction of the cell pair is visited
+                assert (key in half) != (opposite in half)
+
+
+def test_grid_geometry_stencil_covers_radius():
+    grid = grid_geometry(800, 600, 50.0, 25.0)
+    assert (grid.nx, grid.ny) == (32, 24)
+    assert grid.stencil.shape == (25, 2)
+
+
+def test_cull_stencil_drops_only_cells_out_of_reach():
+    # cells 10 wide, radius 40: the 9 x 9 block loses its 4 corners
+    stencil = build_stencil(100, 100, 4, 4)
+    culled = cull_stencil(stencil, 100, 100, 10.0, 10.0, 40.0)
+    assert culled.shape == (77, 2)
+    assert [4, 4] not in culled.tolist() and [4, 3] in culled.tolist()
+    # brute force: a random point pair within the radius never lands in a dropped cell
+    rng = np.random.default_rng(1)
+    kept = set(map(tuple, culled.tolist()))
+    for _ in range(2000):
+        a = rng.uniform(0, 10, 2)
+        b = a + rng.uniform(-40, 40, 2)
+        if np.hypot(*(b - a)) <= 40.0:
+            assert tuple(np.floor(b / 10.0).astype(int)) in kept
+
+
+def test_cull_stencil_uses_nearest_periodic_image():
+    # 4 x 4 cells: the stencil is 0..3 per axis, offset 3 is the neighbour -1
+    stencil = build_stencil(4, 4, 3, 3)
+    culled = cull_stencil(stencil, 4, 4, 10.0, 10.0, 5.0)
+    assert sorted(map(tuple, culled.tolist())) == [(ox, oy) for ox in (0, 1, 3) for oy in (0, 1, 3)]
+
+
+def test_occupancy_stats_counts_stencil_candidates():
+    grid = grid_geometry(60, 60, 10.0, 10.0)  # 6 x 6 cells, 3 x 3 stencil
+    xs = np.array([1, 2, 3, 4, 55, 56, 35], dtype=np.float32)
+    ys = np.array([1, 2, 3, 4, 5, 6, 35], dtype=np.float32)
+    # 4 particles in cell (0, 0), 2 in its neighbour (5, 0) across the border, 1 alone
+    keys, counts = cell_counts(xs, ys, grid)
+    assert keys.tolist() == [0, 5, 21]
+
+    stats = occupancy_stats(keys, counts, grid)
+
+    assert stats["cells"] == 36
+    assert stats["occupied_cells"] == 3
+    assert stats["max_occupancy"] == 4
+    assert stats["particle_occupancy"] == (16 + 4 + 1) / 7
+    # 4 * (3 + 2) + 2 * (1 + 4) + 1 * 0 distance checks
+    assert stats["candidates_per_particle"] == 30 / 7
+
+
+def test_hash_table_size_is_power_of_two_with_room():
+    for count in (0, 1, 100, 1000):
+        size = hash_table_size(count)
+        assert size & (size - 1) == 0
+        assert size >= 2 * count
@@ -251,13 +251,14 @@ def test_main_creates_system_adds_particles_and_runs_visualizer(monkeypatch):
             calls["add_particles"] = {"count": count, "types": types}
 
     class FakeVisualizer:
-        def __init__(self, system, width, height, target_fps, speed_factor):
+        def __init__(self, system, width, height, target_fps, speed_factor, threaded=False):
             calls["visualizer_init"] = {
                 "system": system,
                 "width": width,
                 "height": height,
                 "target_fps": target_fps,
                 "speed_factor": speed_factor,
+                "threaded": threaded,
             }
 
         def run(self):
@@ -271,10 +272,13 @@ def test_main_creates_system_adds_particles_and_runs_visualizer(monkeypatch):
     assert calls["particle_system_init"]["width"] == 800
     assert calls["particle_system_init"]["height"] == 600
     assert calls["particle_system_init"]["config"] is fake_config
+    # the engine's performance features are turned on for the interactive run
+    assert (fake_config.sort_interval, fake_config.adaptive_grid, fake_config.grid_mode) == (20, True, "auto")
 
     assert calls["add_particles"]["count"] == 3000
     assert calls["add_particles"]["types"] == list(range(fake_config.num_types))
 
     assert calls["visualizer_init"]["target_fps"] == 60
     assert calls["visualizer_init"]["speed_factor"] == 4.0
+    assert calls["visualizer_init"]["threaded"] is True
     assert calls["visualizer_run_called"] is True
\ No newline at end of file
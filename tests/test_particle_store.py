@@ -0,0 +1,68 @@
+import numpy as np
+import pytest
+from src.particle_store import ParticleStore
+from src.particle_class import Particle
+
+
+@pytest.fixture
+def store():
+    return ParticleStore(["red", "green"])
+
+
+def test_append_copies_particle_into_arrays(store):
+    store.append(Particle(1.0, 2.0, 0.5, -0.5, 1, "green"))
+    assert len(store) == 1
+    assert store.xs.dtype == np.float32
+    assert store.types.dtype == np.int32
+    assert store.xs[0] == pytest.approx(1.0)
+    assert store.vys[0] == pytest.approx(-0.5)
+    assert store.types[0] == 1
+
+
+def test_view_writes_through_to_arrays(store):
+    store.add_arrays([1.0, 2.0], [3.0, 4.0], [0.0, 0.0], [0.0, 0.0], [0, 1])
+    view = store[1]
+    view.position_x = 7.0
+    view.velocity_y = 2.5
+    assert store.xs[1] == pytest.approx(7.0)
+    assert store.vys[1] == pytest.approx(2.5)
+    assert view.color == "green"
+
+
+def test_view_survives_growth(store):
+    store.add_arrays([1.0], [1.0], [0.0], [0.0], [0])
+    view = store[0]
+    store.add_arrays(np.arange(100.0), np.arange(100.0), np.zeros(100), np.zeros(100), np.zeros(100))
+    assert len(store) == 101
+    view.position_y = 9.0
+    assert store.ys[0] == pytest.approx(9.0)
+
+
+def test_clear_and_index_errors(store):
+    store.add_arrays([1.0], [1.0], [0.0], [0.0], [0])
+    assert store[-1] == store[0]
+    store.clear()
+    assert len(store) == 0
+    assert len(store.xs) == 0
+    with pytest.raises(IndexError):
+        store[0]
+
+
+def test_reorder_keeps_views_on_their_particles(store):
+    store.add_arrays([0.0, 1.0, 2.0], [0.0, 0.0, 0.0], [0.0, 0.0, 0.0], [0.0, 0.0, 0.0], [0, 1, 0])
+    last = store[2]
+    store.reorder(np.array([2, 0, 1]))
+    assert list(store.xs) == [2.0, 0.0, 1.0]
+    assert list(store.ids) == [2, 0, 1]
+    assert last.index == 0
+    assert last.position_x == pytest.approx(2.0)
+
+
+def test_convert_switches_float_dtype(store):
+    store.add_arrays([0.1, 0.2], [0.3, 0.4], [0.5, 0.6], [0.7, 0.8], [0, 1])
+    store.convert(np.float64)
+    assert store.dtype == np.float64
+    assert store.xs.dtype == np.float64 and store.vys.dtype == np.float64
+    assert store.xs == pytest.approx([0.1, 0.2]) and store[1].velocity_y == pytest.approx(0.8)
+    store.add_arrays([0.9], [0.9], [0.0], [0.0], [0])
+    assert store.xs.dtype == np.float64 and len(store) == 3
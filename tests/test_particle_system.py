@@ -1,7 +1,8 @@
 import pytest
 import random
+from functools import partial
 from src.simulation_config import SimulationConfig
-from src.particle_system import ParticleSystem
+from src.particle_system import ParticleSystem, AUTOTUNE_DIVISIONS
 try:
     import numpy as np
     from numba import njit
@@ -19,6 +20,48 @@ def system():
     config.max_velocity = 1e9
     return ParticleSystem([], config, 100, 100)
 
+
+# no jitter, friction or speed cap: the velocities follow the forces alone
+FREE_MOTION = dict(random_motion=0.0, friction=0.0, max_velocity=1e9)
+
+
+def _make_system(layout_seed=5, size=(300, 200), count=300, types=(0, 1, 2, 3),
+                 randomize=True, still=False, **options):
+    # layout_seed fixes the particles and the interaction matrix, config
+    # fields (the noise `seed` among them) come from `options`
+    random.seed(layout_seed)
+    config = SimulationConfig(**options)
+    if randomize:
+        config.randomize_interactions()
+    system = ParticleSystem([], config, *size)
+    system.add_particles(count, types=list(types))
+    if still:
+        system.particles.vxs[:] = 0.0
+        system.particles.vys[:] = 0.0
+    return system
+
+
+def _positions(system):
+    order = np.argsort(system.particles.ids)
+    return system.particles.xs[order].astype(float), system.particles.ys[order].astype(float)
+
+
+def _velocities(system):
+    order = np.argsort(system.particles.ids)
+    return system.particles.vxs[order].astype(float), system.particles.vys[order].astype(float)
+
+
+def _kick(system, dt=0.05):
+    # one step: with FREE_MOTION the velocity change is force * dt
+    system.step_n(1, dt)
+    return _velocities(system)
+
+
+def _distance(a, b, size=200.0):
+    dx = (a[0] - b[0] + 0.5 * size) % size - 0.5 * size
+    dy = (a[1] - b[1] + 0.5 * size) % size - 0.5 * size
+    return np.hypot(dx, dy)
+
 def test_add_particles_creates_count_and_bounds(system):
     system.add_particles(5, types=[0,1])
     assert len(system.particles) == 5
@@ -138,12 +181,28 @@ def test_no_interaction_means_no_velocity_change(system):
     assert p2.velocity_x == 0.0 and p2.velocity_y == 0.0
 
 
-def test_calculate_forces_raises_without_numba(system, monkeypatch):
-    # raise RuntimeError, when NUMBA_OK=False
+@pytest.mark.parametrize("size", [(100, 100), (800, 600)])
+def test_numpy_engine_forces_match_numba(monkeypatch, size):
+    expected = _kick(_make_system(4, size, 400, **FREE_MOTION))
+
     monkeypatch.setattr("src.particle_system.NUMBA_OK", False, raising=False)
-    system.add_particles(1, types=[0])
-    with pytest.raises(RuntimeError):
-        system.calculate_forces(1.0)
+    system = _make_system(4, size, 400, **FREE_MOTION)
+    assert system.engine == "numpy"
+
+    assert np.allclose(_kick(system), expected, atol=1e-4)
+
+
+def test_numpy_engine_runs_without_numba(monkeypatch):
+    numba_system = _seeded_system()
+    numba_system.step_n(10, 0.05)
+
+    monkeypatch.setattr("src.particle_system.NUMBA_OK", False, raising=False)
+    numpy_system = _seeded_system()
+    numpy_system.step_n(10, 0.05)
+    numpy_system.calculate_forces(0.0)
+
+    assert numpy_system._force_frame == 10
+    assert np.allclose(_positions(numpy_system), _positions(numba_system), atol=1e-2)
 
 def test_calculate_forces_python_moves_velocity(system):
     # 193-281 (_calculate_forces_python)
@@ -160,4 +219,736 @@ def test_calculate_forces_python_moves_velocity(system):
 
     system._calculate_forces_python()
 
-    assert (p1.velocity_x != 0.0) or (p2.velocity_x != 0.0)
\ No newline at end of file
+    assert (p1.velocity_x != 0.0) or (p2.velocity_x != 0.0)
+
+def test_forces_are_written_into_particle_arrays(system):
+    system.add_particles(2, types=[0])
+    store = system.particles
+    store.xs[:] = [10.0, 30.0]
+    store.ys[:] = [10.0, 10.0]
+    store.vxs[:] = 0.0
+    store.vys[:] = 0.0
+    system.config.set_interaction(0, 0, 1.0)
+
+    system.calculate_forces(1.0)
+
+    # no copies: the kernel updated the store arrays directly
+    assert store.vxs[0] > 0
+    assert store.vxs[1] < 0
+    assert store.xs[0] == pytest.approx(10.0)
+
+
+def test_update_system_reuses_work_buffers(system):
+    system.add_particles(50, types=[0, 1])
+    system.update_system(0.1)
+    buffers = (system._cell_start, system._cell_items, system._fx, system._fy)
+
+    system.update_system(0.1)
+    system.update_system(0.1)
+
+    # steady state: the grid and force buffers are not reallocated
+    assert all(a is b for a, b in zip(buffers, (system._cell_start, system._cell_items, system._fx, system._fy)))
+
+
+def test_parallel_kernel_matches_serial():
+    serial = _kick(_make_system(0, (100, 100), 200, **FREE_MOTION))
+    parallel = _kick(_make_system(0, (100, 100), 200, parallel=True, **FREE_MOTION))
+
+    assert np.allclose(parallel, serial, atol=1e-5)
+
+
+def test_measure_parallel_speedup_reports_timings(system):
+    system.add_particles(100, types=[0, 1])
+    system.config.num_threads = 1
+    x_before = system.particles.xs.copy()
+
+    report = system.measure_parallel_speedup(repeats=2)
+
+    assert report["threads"] == 1
+    assert report["serial_ms"] > 0 and report["parallel_ms"] > 0
+    assert report["speedup"] > 0
+    assert np.array_equal(system.particles.xs, x_before)
+
+
+@pytest.mark.parametrize("size", [(100, 100), (800, 600)])
+def test_half_shell_matches_full_shell(size):
+    full = _kick(_make_system(1, size, **FREE_MOTION))
+    half = _kick(_make_system(1, size, half_shell=True, **FREE_MOTION))
+
+    assert np.allclose(half, full, atol=1e-5)
+
+
+def test_sort_particles_by_cell_makes_cells_contiguous(system):
+    system.add_particles(300, types=[0, 1])
+    tracked = system.particles[0]
+    x_before = tracked.position_x
+
+    system.sort_particles_by_cell()
+    n = len(system.particles)
+    system._compute_forces(n, parallel=False)
+
+    # after the sort every cell is a dense [start, end) range of the arrays
+    assert np.array_equal(system._cell_items[:n], np.arange(n))
+    assert tracked.position_x == x_before
+
+
+def test_verlet_lists_match_grid_step():
+    grid = _make_system(2, random_motion=0.0)
+    system = _make_system(2, verlet_skin=5.0, random_motion=0.0)
+    for _ in range(20):
+        grid.update_system(0.05)
+        system.update_system(0.05)
+
+    assert np.allclose(_positions(system), _positions(grid), atol=1e-3)
+
+    stats = system.verlet_stats()
+    assert stats["steps"] == 20
+    assert 1 <= stats["rebuilds"] < 20
+    assert stats["rebuild_rate"] == pytest.approx(stats["rebuilds"] / 20)
+    assert stats["mean_neighbors"] > 0
+
+
+def test_verlet_lists_rebuild_after_large_move(system):
+    system.config.verlet_skin = 4.0
+    system.add_particles(20, types=[0])
+    system.update_system(0.01)
+    rebuilds = system.verlet_rebuilds
+
+    system.particles[0].position_x = (system.particles[0].position_x + 30.0) % system.width
+    system.update_system(0.01)
+
+    assert system.verlet_rebuilds == rebuilds + 1
+
+
+_seeded_system = partial(_make_system, 5, sort_interval=7, random_motion=0.0)
+
+
+@pytest.mark.parametrize("verlet_skin", [0.0, 5.0])
+def test_step_n_matches_single_steps(verlet_skin):
+    single = _seeded_system(verlet_skin=verlet_skin)
+    for _ in range(25):
+        single.update_system(0.05)
+    batched = _seeded_system(verlet_skin=verlet_skin)
+    batched.step_n(25, 0.05)
+
+    assert batched._force_frame == single._force_frame == 25
+    assert np.allclose(_positions(batched), _positions(single), atol=1e-3)
+
+
+def test_step_n_snapshots_and_callback():
+    system = _seeded_system()
+    calls = []
+    snaps = system.step_n(10, 0.05, every=4, snapshots=True,
+                          callback=lambda s, done: calls.append(done))
+
+    assert calls == [4, 8]
+    assert [snap["step"] for snap in snaps] == [4, 8]
+    assert snaps[0]["x"].shape == (300,)
+    # snapshots are copies, not views on the live arrays
+    assert not np.shares_memory(snaps[-1]["x"], system.particles.xs)
+    assert system._force_frame == 10
+
+
+
+def test_snapshot_and_noise_state_are_public_copies():
+    system = _seeded_system(deterministic=True, seed=42)
+    system.step_n(3, 0.05)
+    state = system.snapshot()
+    assert set(state) == {"x", "y", "vx", "vy", "type", "id"}
+    assert not np.shares_memory(state["x"], system.particles.xs)
+    # deterministic mode keys the stream by the seed itself
+    assert system.noise_state() == (42, 3)
+
+def test_adapt_grid_refines_dense_systems():
+    random.seed(6)
+    sparse = ParticleSystem([], SimulationConfig(adaptive_grid=True), 1200, 800)
+    sparse.add_particles(50, types=[0])
+    dense = ParticleSystem([], SimulationConfig(adaptive_grid=True), 300, 200)
+    dense.add_particles(4000, types=[0])
+
+    assert sparse.adapt_grid() == 1
+    assert dense.adapt_grid() > 1
+    stats = dense.grid_stats()
+    assert stats["divisions"] == dense._grid_divisions
+    assert stats["cell_width"] == pytest.approx(50.0 / stats["divisions"], rel=0.2)
+    assert stats["particle_occupancy"] >= stats["mean_occupancy"] > 0
+
+
+def test_adaptive_grid_forces_match_fixed_grid():
+    fixed = _kick(_make_system(7, count=2000, adaptive_grid=False, **FREE_MOTION))
+    system = _make_system(7, count=2000, adaptive_grid=True, **FREE_MOTION)
+
+    assert np.allclose(_kick(system), fixed, atol=1e-4)
+    assert system.grid_stats()["divisions"] > 1
+
+
+@pytest.mark.parametrize("parallel", [False, True])
+def test_hashed_grid_matches_dense_grid(parallel):
+    dense = _kick(_make_system(8, count=1500, grid_mode="dense", parallel=parallel, **FREE_MOTION))
+    system = _make_system(8, count=1500, grid_mode="hashed", parallel=parallel, **FREE_MOTION)
+
+    assert np.allclose(_kick(system), dense, atol=1e-4)
+    assert system.grid_stats()["hashed"]
+
+
+def test_hashed_grid_memory_follows_particles_in_huge_world():
+    system = _make_system(9, (100_000, 100_000), 500, grid_mode="auto")
+    # a few close pairs, one of them across the border
+    for k in range(0, 20, 2):
+        system.particles[k + 1].position_x = (system.particles[k].position_x + 10.0) % system.width
+        system.particles[k + 1].position_y = system.particles[k].position_y
+    system.particles[0].position_x = system.width - 3.0
+    system.particles[1].position_x = 4.0
+    system.particles[1].position_y = system.particles[0].position_y
+
+    system.step_n(3, 0.05)
+    system.config.verlet_skin = 5.0
+    system.step_n(3, 0.05)
+
+    assert system._hashed
+    assert system.grid_stats()["hashed"]
+    # buffers are sized by the particles, not by the 16M cells of the world
+    assert system._cell_start.shape[0] <= 2 * 500 + 1
+    assert system._hash_keys.shape[0] <= 4 * 500
+    assert system.verlet_stats()["mean_neighbors"] > 0
+
+
+def test_force_table_follows_matrix_changes(system):
+    table = system._force_table()
+    system.config.set_interaction(0, 1, 0.75)
+    # no matrix_dirty needed: the table is keyed on the matrix contents
+    assert system._force_table() is not table
+    assert system._force_table()[0, 1].max() == pytest.approx(0.75 * system.config.force_scale, rel=1e-2)
+
+
+def test_user_defined_force_profile_is_used(system):
+    # register where the simulation modules look profiles up (pythonpath=src)
+    from force_profiles import register_profile
+    register_profile("test_push_x", lambda q, k, beta, force_scale: np.full_like(q, -1.0))
+    system.config.force_profile = "test_push_x"
+    system.add_particles(2, types=[0])
+    p1, p2 = system.particles[0], system.particles[1]
+    p1.position_x, p1.position_y = 10.0, 10.0
+    p2.position_x, p2.position_y = 20.0, 10.0
+    n = len(system.particles)
+
+    system._compute_forces(n, False)
+
+    assert system._fx[0] == pytest.approx(-1.0)
+    assert system._fx[1] == pytest.approx(1.0)
+
+
+def _pair_radius_system(**options):
+    system = _make_system(10, count=800, adaptive_grid=False, **FREE_MOTION, **options)
+    # short-range glue inside the types, long-range between some of them
+    for t in range(4):
+        system.config.set_radius(t, t, 12.0)
+    system.config.set_radius(0, 1, 90.0)
+    system.config.set_radius(2, 3, 0.0)
+    return system
+
+
+@pytest.mark.parametrize("variant", ["half_shell", "parallel", "hashed", "numpy"])
+def test_pair_radii_match_across_kernels(monkeypatch, variant):
+    expected = _kick(_pair_radius_system())
+
+    options = {
+        "half_shell": {"half_shell": True},
+        "parallel": {"parallel": True},
+        "hashed": {"grid_mode": "hashed"},
+        "numpy": {},
+    }[variant]
+    if variant == "numpy":
+        monkeypatch.setattr("src.particle_system.NUMBA_OK", False, raising=False)
+
+    assert np.allclose(_kick(_pair_radius_system(**options)), expected, atol=1e-4)
+
+
+def test_pair_radius_cuts_off_each_direction(system):
+    system.config.set_interaction(0, 1, 1.0)
+    system.config.set_interaction(1, 0, 1.0)
+    system.config.set_radius(0, 1, 15.0)
+    system.add_particles(2, types=[0])
+    p1, p2 = system.particles[0], system.particles[1]
+    p2.particle_type = 1
+    p1.position_x, p1.position_y = 10.0, 10.0
+    p2.position_x, p2.position_y = 30.0, 10.0
+
+    for half_shell in (False, True):
+        system.config.half_shell = half_shell
+        system._compute_forces(2, False)
+        # 0 -> 1 only reaches 15, 1 -> 0 uses the global radius of 50
+        assert system._fx[0] == 0.0
+        assert system._fx[1] < 0.0
+
+
+def test_grid_is_sized_for_largest_pair_radius(system):
+    system.add_particles(50, types=[0, 1])
+    system.config.adaptive_grid = False
+    cell = system.grid_stats()["cell_width"]
+    system.config.set_radius(1, 0, 100.0)
+
+    assert system.grid_stats()["cell_width"] >= 2 * cell * 0.9
+
+
+def test_verlet_lists_skip_pairs_beyond_their_radius():
+    system = _pair_radius_system()
+    system.config.verlet_skin = 4.0
+    system.step_n(1, 0.0)
+    short = system.verlet_stats()["mean_neighbors"]
+
+    for i in range(4):
+        for j in range(4):
+            system.config.set_radius(i, j, 90.0)
+    system.step_n(1, 0.0)
+
+    assert system.verlet_stats()["mean_neighbors"] > 2 * short
+
+
+_integrator_system = partial(_make_system, 11, (200, 200), 200, force_scale=1.0, **FREE_MOTION)
+
+
+def test_substeps_split_large_steps(system):
+    system.config.max_substep = 0.05
+    assert system.substeps(0.05) == 1
+    assert system.substeps(0.12) == 3
+    system.config.max_substep = 0.0
+    assert system.substeps(1.0) == 1
+
+
+@pytest.mark.parametrize("integrator", ["euler", "verlet", "leapfrog"])
+def test_large_step_equals_its_substeps(integrator):
+    split = _integrator_system(integrator=integrator, max_substep=0.05)
+    split.step_n(5, 0.2)
+    small = _integrator_system(integrator=integrator, max_substep=0.05)
+    small.step_n(20, 0.05)
+
+    assert split._force_frame == small._force_frame == 20
+    assert np.allclose(_distance(_positions(split), _positions(small)), 0.0, atol=1e-3)
+
+
+def test_symplectic_integrators_beat_euler_with_fewer_force_evaluations():
+    reference = _integrator_system(integrator="leapfrog", max_substep=0.0)
+    reference.step_n(1000, 0.002)
+    euler = _integrator_system(integrator="euler", max_substep=0.0)
+    euler.step_n(40, 0.05)
+
+    euler_error = np.median(_distance(_positions(euler), _positions(reference)))
+    for integrator in ("verlet", "leapfrog"):
+        system = _integrator_system(integrator=integrator, max_substep=0.0)
+        system.step_n(10, 0.2)
+        assert np.median(_distance(_positions(system), _positions(reference))) < 0.2 * euler_error
+
+
+@pytest.mark.parametrize("integrator", ["verlet", "leapfrog"])
+@pytest.mark.parametrize("variant", ["parallel", "hashed", "verlet_lists", "numpy"])
+def test_integrators_match_across_kernels(monkeypatch, integrator, variant):
+    serial = _integrator_system(integrator=integrator)
+    serial.step_n(15, 0.05)
+
+    options = {
+        "parallel": {"parallel": True},
+        "hashed": {"grid_mode": "hashed"},
+        "verlet_lists": {"verlet_skin": 4.0},
+        "numpy": {},
+    }[variant]
+    if variant == "numpy":
+        monkeypatch.setattr("src.particle_system.NUMBA_OK", False, raising=False)
+    other = _integrator_system(integrator=integrator, **options)
+    other.step_n(15, 0.05)
+
+    assert np.allclose(_distance(_positions(other), _positions(serial)), 0.0, atol=1e-2)
+
+
+def test_reset_does_not_keep_primed_verlet_forces():
+    reused = _integrator_system(integrator="verlet")
+    reused.step_n(5, 0.05)
+    reused.reset_system()
+    random.seed(3)
+    reused.add_particles(200, types=[0, 1, 2, 3])
+    fresh = _integrator_system(integrator="verlet")
+    fresh.reset_system()
+    random.seed(3)
+    fresh.add_particles(200, types=[0, 1, 2, 3])
+
+    reused.step_n(1, 0.05)
+    fresh.step_n(1, 0.05)
+
+    assert np.array_equal(_positions(reused), _positions(fresh))
+
+
+def test_unknown_integrator_raises(system):
+    system.add_particles(5, types=[0])
+    system.config.integrator = "rk4"
+    with pytest.raises(ValueError):
+        system.update_system(0.05)
+
+
+def test_suggest_dt_follows_speed_within_bounds(system):
+    config = system.config
+    config.adaptive_dt = True
+    system.add_particles(2, types=[0])
+    p1, p2 = system.particles[0], system.particles[1]
+    p1.position_x, p1.position_y = 10.0, 10.0
+    p2.position_x, p2.position_y = 200.0, 200.0
+    p1.velocity_x = p1.velocity_y = p2.velocity_x = p2.velocity_y = 0.0
+    # calm: the upper bound
+    assert system.suggest_dt() == pytest.approx(config.dt_max)
+
+    p1.velocity_x = 60.0
+    core = config.beta * config.interaction_radius
+    assert system.suggest_dt() == pytest.approx(config.dt_safety * core / 60.0, rel=1e-4)
+
+    p1.velocity_x = 1e6
+    assert system.suggest_dt() == pytest.approx(config.dt_min)
+
+
+def test_advance_time_covers_duration_and_reports_steps():
+    system = _seeded_system()
+    system.config.adaptive_dt = True
+    system.config.max_velocity = 40.0
+    system.particles[0].velocity_x = 40.0
+
+    steps = system.advance_time(1.0)
+
+    assert steps.sum() == pytest.approx(1.0)
+    assert len(steps) == system._force_frame
+    assert steps.min() >= system.config.dt_min * 0.5
+    assert steps.max() <= system.config.dt_max
+    assert system.last_dt == steps[-1]
+    assert len(system.advance_time(1.0, max_steps=2)) == 2
+
+
+def test_update_system_uses_adaptive_dt(system):
+    system.add_particles(20, types=[0, 1])
+    system.config.adaptive_dt = True
+    system.config.dt_max = 0.1
+    system.update_system(0.5)
+    assert system._force_frame >= 5
+
+
+def _sleepy_system(**options):
+    # no forces, no jitter, particles out of each other's reach on a lattice:
+    # every particle is calm from the first step on
+    system = _make_system(5, (200, 200), 100, types=(0, 1), randomize=False, still=True,
+                          random_motion=0.0, friction=0.5, sleep_steps=3,
+                          interaction_radius=10.0, **options)
+    for t1 in range(system.config.num_types):
+        for t2 in range(system.config.num_types):
+            system.config.set_interaction(t1, t2, 0.0)
+    lattice = 10.0 + 20.0 * np.arange(10)
+    system.particles.xs[:] = np.repeat(lattice, 10)
+    system.particles.ys[:] = np.tile(lattice, 10)
+    return system
+
+
+def test_calm_particles_fall_asleep_and_freeze():
+    system = _sleepy_system()
+    system.step_n(3, 0.05)
+    assert system.sleep_stats()["asleep"] == 0
+
+    system.step_n(1, 0.05)
+    assert system.sleep_stats()["fraction"] == 1.0
+    before = _positions(system)
+    system.step_n(5, 0.05)
+    after = _positions(system)
+    assert np.array_equal(before[0], after[0]) and np.array_equal(before[1], after[1])
+
+
+def test_moving_particle_wakes_neighbours_in_reach():
+    system = _sleepy_system()
+    system.step_n(5, 0.05)
+    store = system.particles
+    store.xs[:3] = [100.0, 105.0, 160.0]
+    store.ys[:3] = [100.0, 100.0, 160.0]
+    store.vxs[0] = 5.0
+    system._calm[0] = 0
+
+    system.step_n(1, 0.05)
+
+    steps = system.config.sleep_steps
+    assert store.xs[0] > 100.1
+    assert system._calm[1] <= steps
+    assert system._calm[2] > steps
+
+
+def test_wake_up_does_not_depend_on_array_order():
+    # a moving particle pushes a sleeping one: the sleeper wakes and takes
+    # the push in the same step, whichever of the two comes first
+    results = []
+    for mover, sleeper in [(0, 1), (1, 0)]:
+        system = _sleepy_system()
+        system.config.set_interaction(0, 0, -1.0)
+        system.matrix_dirty = True
+        system.step_n(5, 0.05)
+        store = system.particles
+        assert system.sleep_stats()["fraction"] == 1.0
+        store.types[:2] = 0
+        store.xs[mover], store.ys[mover] = 100.0, 100.0
+        store.xs[sleeper], store.ys[sleeper] = 105.0, 100.0
+        store.vxs[mover] = 5.0
+        system._calm[mover] = 0
+        sleeper_id = store.ids[sleeper]
+
+        system.step_n(1, 0.05)
+
+        k = int(np.flatnonzero(store.ids == sleeper_id)[0])
+        results.append((float(store.xs[k]), float(store.vxs[k]), int(system._calm[k])))
+    assert results[0] == results[1]
+    assert results[0][1] > 0.0
+
+
+def test_matrix_change_and_wake_all_wake_everyone():
+    system = _sleepy_system()
+    system.step_n(5, 0.05)
+    system.config.set_interaction(0, 1, 0.5)
+    system.matrix_dirty = True
+    system.step_n(1, 0.05)
+    assert system.sleep_stats()["asleep"] == 0
+
+    system.step_n(5, 0.05)
+    system.wake_all()
+    assert system.sleep_stats()["asleep"] == 0
+
+
+def test_reset_does_not_keep_the_old_sleep_state():
+    system = _sleepy_system()
+    system.step_n(5, 0.05)
+    assert system.sleep_stats()["fraction"] == 1.0
+
+    system.reset_system()
+    system.add_particles(100, types=[0, 1])
+    system.particles.vxs[:] = 30.0
+    before = _positions(system)
+    system.step_n(1, 0.05)
+
+    assert system.sleep_stats()["asleep"] == 0
+    assert not np.any(_positions(system)[0] == before[0])
+
+
+
+def test_measurements_leave_the_sleep_state_alone():
+    system = _sleepy_system(parallel=True)
+    system.step_n(5, 0.05)
+    # a mover next to a sleeper: the kernels' wake-up pass would wake it
+    store = system.particles
+    store.xs[:2] = [100.0, 105.0]
+    store.ys[:2] = [100.0, 100.0]
+    system._calm[0] = 0
+    calm = system._calm.copy()
+
+    system.autotune_grid(retune=True)
+    system._advanced_n = -1
+    system.suggest_dt()
+    system.measure_parallel_speedup(repeats=1)
+
+    assert np.array_equal(system._calm, calm)
+    assert system._calm[1] > system.config.sleep_steps
+
+def test_force_parameter_versions_wake_everyone():
+    system = _sleepy_system()
+    system.step_n(5, 0.05)
+    version = system._force_version()
+    # the same parameters again: no rebuild, nobody wakes up
+    assert system._force_version() == version
+    system.step_n(1, 0.05)
+    assert system.sleep_stats()["fraction"] == 1.0
+
+    system.config.set_radius(0, 1, 12.0)
+    system.step_n(1, 0.05)
+    assert system._force_version() > version
+    assert system.sleep_stats()["asleep"] == 0
+
+
+def test_sleep_disabled_and_half_shell():
+    system = _sleepy_system(half_shell=True)
+    assert not system._use_half_shell()
+    system.config.sleep_steps = 0
+    assert system._use_half_shell()
+    system.step_n(10, 0.05)
+    assert system.sleep_stats()["asleep"] == 0
+
+
+def _deterministic_run(seed=42, **options):
+    system = _make_system(3, (300, 300), deterministic=True, seed=seed, random_motion=0.2, **options)
+    system.step_n(30, 0.05)
+    return system
+
+
+@pytest.mark.parametrize("options", [
+    {"parallel": True},
+    {"parallel": True, "num_threads": 1},
+    {"grid_mode": "hashed", "parallel": True},
+    {"half_shell": True},
+])
+def test_deterministic_mode_is_bit_identical_across_kernels(options):
+    base = _positions(_deterministic_run())
+    other = _positions(_deterministic_run(**options))
+    assert np.array_equal(base, other)
+
+
+@pytest.mark.parametrize("options", [
+    {"parallel": True},
+    {"parallel": True, "num_threads": 1},
+    {"grid_mode": "hashed", "parallel": True},
+])
+def test_deterministic_mode_with_sleeping_is_bit_identical(options):
+    # thresholds at which particles keep falling asleep and waking up
+    sleepy = dict(sleep_steps=2, sleep_speed=0.5, sleep_force=0.5)
+    base = _deterministic_run(**sleepy)
+    assert base.sleep_stats()["asleep"] > 0
+    other = _deterministic_run(**sleepy, **options)
+    assert np.array_equal(_positions(base), _positions(other))
+    assert np.array_equal(base._calm[:300][np.argsort(base.particles.ids)],
+                          other._calm[:300][np.argsort(other.particles.ids)])
+
+
+@pytest.mark.parametrize("options", [{"parallel": True}, {"grid_mode": "hashed", "parallel": True}])
+def test_deterministic_mode_is_bit_identical_with_several_threads(options):
+    import numba
+    threads = min(numba.config.NUMBA_NUM_THREADS, 4)
+    if threads < 2:
+        pytest.skip("needs more than one Numba thread")
+    base = _deterministic_run()
+    sleepy = _deterministic_run(sleep_steps=2, sleep_speed=0.5, sleep_force=0.5)
+    try:
+        threaded = _deterministic_run(num_threads=threads, **options)
+        assert numba.get_num_threads() == threads
+        threaded_sleepy = _deterministic_run(num_threads=threads, sleep_steps=2, sleep_speed=0.5,
+                                             sleep_force=0.5, **options)
+    finally:
+        numba.set_num_threads(numba.config.NUMBA_NUM_THREADS)
+    assert np.array_equal(_positions(threaded), _positions(base))
+    assert np.array_equal(_positions(threaded_sleepy), _positions(sleepy))
+
+
+def test_deterministic_seed_changes_the_jitter():
+    base = _positions(_deterministic_run())
+    assert np.array_equal(base, _positions(_deterministic_run()))
+    assert not np.array_equal(base, _positions(_deterministic_run(seed=43)))
+
+
+def test_deterministic_numpy_engine_repeats(monkeypatch):
+    monkeypatch.setattr("src.particle_system.NUMBA_OK", False, raising=False)
+    base = _positions(_deterministic_run())
+    assert np.array_equal(base, _positions(_deterministic_run()))
+
+
+def test_counter_noise_matches_numpy_twin():
+    from src.kernels import counter_uniform
+    from src.numpy_engine import counter_uniform_numpy
+    ids = np.arange(0, 5000, 7, dtype=np.int64)
+    out = np.empty(ids.shape[0])
+    counter_uniform(12345, ids, 17, out)
+    expected = counter_uniform_numpy(12345, ids, 17)
+    assert np.array_equal(out, expected)
+    assert -1.0 <= out.min() and out.max() < 1.0
+    assert abs(out.mean()) < 0.05
+
+
+def test_parallel_binning_order_does_not_depend_on_chunks():
+    from src.kernels import bin_particles, _bin_particles_parallel
+    rng = np.random.default_rng(0)
+    n, nx, ny = 500, 7, 5
+    xs = rng.uniform(0, 70, n).astype(np.float32)
+    ys = rng.uniform(0, 50, n).astype(np.float32)
+    cell_of = np.empty(n, dtype=np.int32)
+    cell_start = np.empty(nx * ny + 1, dtype=np.int32)
+    expected = np.empty(n, dtype=np.int32)
+    bin_particles(xs, ys, 0.1, 0.1, nx, ny, cell_of, cell_start, expected)
+    for nchunks in (1, 3, 8):
+        items = np.empty(n, dtype=np.int32)
+        counts = np.empty(nchunks * nx * ny, dtype=np.int32)
+        _bin_particles_parallel(xs, ys, 0.1, 0.1, nx, ny, nchunks, cell_of, counts, cell_start, items)
+        assert np.array_equal(items, expected)
+
+
+# jitter only: no forces reach (tiny radius), no friction or speed cap
+_jitter_system = partial(_make_system, 8, (500, 500), 2000, types=(0,), randomize=False, still=True,
+                         random_motion=0.3, friction=0.0, max_velocity=1e9,
+                         interaction_radius=0.01, max_substep=0.0, grid_mode="auto")
+
+
+def test_random_motion_is_seeded_per_system():
+    runs = []
+    for seed in (7, 7, 8, None):
+        system = _jitter_system(seed=seed)
+        system.step_n(5, 0.05)
+        runs.append(system.particles.vxs.copy())
+    assert np.array_equal(runs[0], runs[1])
+    assert not np.array_equal(runs[0], runs[2])
+    assert not np.array_equal(runs[0], runs[3])
+
+    system = _jitter_system(seed=7)
+    system.step_n(5, 0.05)
+    system.reseed(8)
+    assert system._noise_seed != _jitter_system(seed=7)._noise_seed
+
+
+def test_random_motion_scales_with_sqrt_dt():
+    # velocity variance after time T: steps * (rm sqrt(dt))^2 / 3 = T rm^2 / 3
+    spreads = []
+    for steps, dt in ((100, 0.01), (25, 0.04)):
+        system = _jitter_system(seed=3)
+        system.step_n(steps, dt)
+        spreads.append(float(np.var(system.particles.vxs)))
+    expected = 1.0 * 0.3 ** 2 / 3.0
+    assert spreads[0] == pytest.approx(expected, rel=0.1)
+    assert spreads[1] == pytest.approx(expected, rel=0.1)
+
+
+def test_autotune_grid_measures_once_per_configuration():
+    fixed = _kick(_make_system(7, count=2000, adaptive_grid=False, **FREE_MOTION))
+    system = _make_system(7, count=2000, autotune_grid=True, **FREE_MOTION)
+    config = system.config
+
+    assert np.allclose(_kick(system), fixed, atol=1e-4)
+    k = system.grid_stats()["divisions"]
+    timings = system.autotune_timings
+    assert k in AUTOTUNE_DIVISIONS and set(timings) == set(AUTOTUNE_DIVISIONS)
+    assert timings[k] == min(timings.values())
+    assert system.grid_stats()["cell_width"] == pytest.approx(50.0 / k, rel=0.2)
+
+    # a slightly different radius falls into the same bucket: no new measurement
+    system.autotune_timings = {}
+    config.interaction_radius = 51.0
+    system.step_n(3, 0.0)
+    assert system.autotune_timings == {}
+    config.interaction_radius = 100.0
+    system.step_n(1, 0.0)
+    assert set(system.autotune_timings) == set(AUTOTUNE_DIVISIONS)
+    assert len(system._autotune_cache) == 2
+
+
+_precision_system = partial(_make_system, 12, (300, 300), 400, seed=1)
+
+
+@pytest.mark.parametrize("options", [
+    {}, {"parallel": True}, {"grid_mode": "hashed"}, {"verlet_skin": 5.0}, {"integrator": "verlet"},
+])
+def test_float64_precision_end_to_end(options):
+    wide = _precision_system(precision="float64", **options)
+    narrow = _precision_system(precision="float32", **options)
+    wide.step_n(10, 0.05)
+    narrow.step_n(10, 0.05)
+
+    assert wide.particles.xs.dtype == np.float64 and wide._fx.dtype == np.float64
+    assert wide._force_table().dtype == np.float64 and wide._pair_radii().dtype == np.float64
+    assert narrow.particles.xs.dtype == np.float32 and narrow._fx.dtype == np.float32
+    assert np.median(_distance(_positions(wide), _positions(narrow), 300.0)) < 1e-2
+
+
+def test_precision_switch_converts_once_and_unknown_raises():
+    system = _precision_system(precision="float32")
+    system.step_n(2, 0.05)
+    xs = system.particles.xs.astype(np.float64)
+    system.config.precision = "float64"
+    system._sync_precision()
+    assert system.particles.xs.dtype == np.float64
+    assert np.array_equal(system.particles.xs, xs)
+    system.step_n(2, 0.05)
+    assert system._fx.dtype == np.float64
+
+    system.config.precision = "float16"
+    with pytest.raises(ValueError):
+        system.step_n(1, 0.05)
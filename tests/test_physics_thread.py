@@ -0,0 +1,91 @@
+import time
+import pytest
+import numpy as np
+from src.simulation_config import SimulationConfig
+from src.particle_system import ParticleSystem
+from src.physics_thread import PhysicsThread
+
+@pytest.fixture
+def system():
+    config = SimulationConfig(seed=1)
+    system = ParticleSystem([], config, 200, 200)
+    system.add_particles(50, [0, 1])
+    return system
+
+def _wait_for_ticks(physics, ticks, timeout=60.0):
+    end = time.perf_counter() + timeout
+    while physics.ticks < ticks and time.perf_counter() < end:
+        time.sleep(0.01)
+
+def test_initial_snapshot_is_the_current_state(system):
+    physics = PhysicsThread(system)
+    frame = physics.latest()
+    assert frame.tick == 0
+    assert np.array_equal(frame.xs, system.particles.xs)
+    assert np.array_equal(frame.ids, system.particles.ids)
+
+def test_ticks_publish_new_snapshots(system):
+    physics = PhysicsThread(system, tick_rate=200)
+    start = physics.latest().xs.copy()
+    physics.start()
+    try:
+        _wait_for_ticks(physics, 3)
+    finally:
+        physics.stop()
+    assert physics.error is None and not physics.alive
+    frame = physics.latest()
+    assert frame.tick == physics.ticks >= 3
+    assert np.array_equal(frame.xs, system.particles.xs)
+    assert not np.array_equal(frame.xs, start)
+
+def test_snapshot_in_use_is_never_overwritten(system):
+    physics = PhysicsThread(system)
+    held = physics.latest()
+    xs = held.xs.copy()
+    # a stalled renderer: many ticks are published while it draws
+    for _ in range(5):
+        system.particles.xs[:] += 1.0
+        physics._publish()
+    assert np.array_equal(held.xs, xs)
+    newest = physics.latest()
+    assert not np.shares_memory(newest.xs, held.xs)
+    assert np.array_equal(newest.xs, system.particles.xs)
+    # nothing new published: the same snapshot again
+    assert physics.latest() is newest
+
+def test_hold_pauses_between_ticks_and_publishes(system):
+    physics = PhysicsThread(system, tick_rate=200)
+    physics.start()
+    try:
+        _wait_for_ticks(physics, 1)
+        with physics.hold() as held:
+            ticks = physics.ticks
+            time.sleep(0.05)
+            assert physics.ticks == ticks
+            held.reset_system()
+            held.add_particles(7, [0])
+        assert len(physics.latest().xs) == 7
+    finally:
+        physics.stop()
+
+def test_stepping_false_idles(system):
+    physics = PhysicsThread(system, tick_rate=200)
+    physics.stepping = False
+    physics.start()
+    time.sleep(0.05)
+    physics.stop()
+    assert physics.ticks == 0
+
+def test_errors_stop_the_thread(system, monkeypatch):
+    def broken(dt):
+        raise RuntimeError("boom")
+    monkeypatch.setattr(system, "update_system", broken)
+    physics = PhysicsThread(system, tick_rate=200)
+    physics.start()
+    physics._thread.join(5.0)
+    assert isinstance(physics.error, RuntimeError)
+    assert not physics.alive
+
+def test_rejects_bad_tick_rate(system):
+    with pytest.raises(ValueError):
+        PhysicsThread(system, tick_rate=0)
@@ -0,0 +1,119 @@
+import multiprocessing
+from multiprocessing import resource_tracker
+from multiprocessing.shared_memory import SharedMemory
+import pytest
+import numpy as np
+from src.simulation_config import SimulationConfig
+from src.particle_system import ParticleSystem
+from src.shared_state import StatePublisher, StateReader
+
+def _publish_uniform(publisher, step, n):
+    # every array of the frame holds the step number: a torn frame mixes steps
+    values = np.full(n, step, dtype=np.float32)
+    publisher.publish(values, values, values, values, np.full(n, step % 7, dtype=np.int32),
+                      np.arange(n), step, 100.0, 50.0)
+
+def _read_frames(name, frames, queue):
+    reader = StateReader(name)
+    torn = 0
+    steps = []
+    for _ in range(frames):
+        frame = reader.read(timeout=10.0)
+        if not (np.all(frame.xs == frame.step) and np.all(frame.vys == frame.step)):
+            torn += 1
+        steps.append(frame.step)
+    reader.close()
+    queue.put((torn, steps))
+
+def test_round_trip():
+    publisher = StatePublisher(capacity=8)
+    try:
+        _publish_uniform(publisher, 3, 5)
+        reader = StateReader(publisher.name)
+        frame = reader.read()
+        assert (frame.step, frame.width, frame.height) == (3, 100.0, 50.0)
+        assert frame.xs.shape == (5,) and np.all(frame.xs == 3.0)
+        assert np.array_equal(frame.ids, np.arange(5))
+        assert frame.seq % 2 == 0 and not reader.has_new()
+        _publish_uniform(publisher, 4, 5)
+        assert reader.has_new() and reader.read().step == 4
+        reader.close()
+    finally:
+        publisher.close()
+
+def test_growing_recreates_segment_and_readers_follow():
+    publisher = StatePublisher(capacity=4)
+    try:
+        _publish_uniform(publisher, 1, 4)
+        reader = StateReader(publisher.name)
+        seq = reader.read().seq
+        _publish_uniform(publisher, 2, 50)
+        frame = reader.read()
+        assert frame.step == 2 and frame.xs.shape == (50,)
+        assert frame.seq > seq and publisher.capacity >= 50
+        reader.close()
+    finally:
+        publisher.close()
+
+def test_other_process_reads_consistent_frames():
+    publisher = StatePublisher(capacity=20000)
+    try:
+        _publish_uniform(publisher, 0, 20000)
+        context = multiprocessing.get_context("spawn")
+        queue = context.Queue()
+        process = context.Process(target=_read_frames, args=(publisher.name, 200, queue))
+        process.start()
+        step = 0
+        result = None
+        while result is None:
+            step += 1
+            _publish_uniform(publisher, step, 20000)
+            if not queue.empty():
+                result = queue.get()
+        process.join(30)
+        torn, steps = result
+        assert torn == 0
+        assert steps == sorted(steps)
+        # the reader exiting does not take the segment with it
+        assert StateReader(publisher.name).read().step == step
+    finally:
+        publisher.close()
+
+def test_closed_segment_and_foreign_segment():
+    publisher = StatePublisher(capacity=4)
+    name = publisher.name
+    _publish_uniform(publisher, 1, 2)
+    reader = StateReader(name)
+    publisher.close()
+    with pytest.raises(FileNotFoundError):
+        reader.read()
+    other = SharedMemory(create=True, size=4096)
+    try:
+        with pytest.raises(ValueError):
+            StateReader(other.name)
+    finally:
+        other.close()
+        # the reader took it off this process's resource tracker
+        resource_tracker.register(other._name, "shared_memory")
+        other.unlink()
+
+def test_particle_system_publishes_every_n_steps():
+    config = SimulationConfig(seed=2)
+    system = ParticleSystem([], config, 120, 80)
+    system.add_particles(30, [0, 1])
+    name = system.publish_state(every=3)
+    try:
+        reader = StateReader(name)
+        assert reader.read().step == 0
+        system.update_system(0.05)
+        system.update_system(0.05)
+        assert not reader.has_new()
+        system.update_system(0.05)
+        frame = reader.read()
+        assert frame.step == 3 and (frame.width, frame.height) == (120.0, 80.0)
+        assert np.array_equal(frame.xs, system.particles.xs)
+        assert np.array_equal(frame.types, system.particles.types)
+        reader.close()
+    finally:
+        system.stop_publishing()
+    system.update_system(0.05)
@@ -1,4 +1,5 @@
 import pytest
+import json
 from src.simulation_config import SimulationConfig
 
 
@@ -106,3 +107,85 @@ def test_load_config_invalid_json_raises(tmp_path):
 
 
 
+
+ENGINE_OPTIONS = dict(parallel=True, num_threads=4, half_shell=True, sort_interval=20, verlet_skin=5.0,
+                      adaptive_grid=True, autotune_grid=True, grid_mode="hashed", precision="float64",
+                      max_substep=0.05)
+
+
+def test_engine_options_stay_out_of_presets(tmp_path):
+    cfg = SimulationConfig(friction=0.07, **ENGINE_OPTIONS)
+    assert not set(ENGINE_OPTIONS) & set(cfg.to_dict())
+    path = tmp_path / "preset.json"
+    cfg.save_config(str(path))
+    loaded = SimulationConfig.load_config(str(path))
+    assert loaded.friction == pytest.approx(0.07)
+    defaults = SimulationConfig()
+    assert all(getattr(loaded, k) == getattr(defaults, k) for k in ENGINE_OPTIONS)
+
+
+def test_engine_options_are_read_when_given():
+    loaded = SimulationConfig.from_dict(ENGINE_OPTIONS)
+    assert all(getattr(loaded, k) == v for k, v in ENGINE_OPTIONS.items())
+    # without the keys: serial kernel, float32, and the grid performance features are opt-in
+    loaded = SimulationConfig.from_dict({})
+    assert loaded.parallel is False and loaded.precision == "float32"
+    assert loaded.adaptive_grid is False and loaded.autotune_grid is False
+    assert loaded.grid_mode == "dense"
+
+
+def test_force_profile_roundtrip():
+    cfg = SimulationConfig(force_profile="smooth")
+    assert SimulationConfig.from_dict(cfg.to_dict()).force_profile == "smooth"
+    assert SimulationConfig.from_dict({}).force_profile == "liquid"
+
+
+def test_pair_radii_default_to_interaction_radius():
+    cfg = SimulationConfig(interaction_radius=40.0)
+    cfg.set_radius(0, 1, 10.0)
+    assert cfg.get_radius(0, 1) == 10.0
+    assert cfg.get_radius(1, 0) == 40.0
+    assert cfg.max_interaction_radius() == 40.0
+    cfg.set_radius(2, 2, 70.0)
+    assert cfg.max_interaction_radius() == 70.0
+    cfg.set_radius(2, 2, None)
+    assert cfg.radius_matrix()[2, 2] == 40.0
+    with pytest.raises(IndexError):
+        cfg.set_radius(0, 9, 5.0)
+
+
+def test_pair_radii_roundtrip():
+    cfg = SimulationConfig()
+    cfg.set_radius(1, 2, 25.0)
+    loaded = SimulationConfig.from_dict(json.loads(json.dumps(cfg.to_dict())))
+    assert loaded.get_radius(1, 2) == 25.0
+    assert loaded.interaction_matrix.get_radius(0, 0) is None
+
+
+def test_integrator_roundtrip():
+    cfg = SimulationConfig(integrator="leapfrog")
+    loaded = SimulationConfig.from_dict(cfg.to_dict())
+    assert loaded.integrator == "leapfrog"
+    assert SimulationConfig.from_dict({}).integrator == "euler"
+
+
+def test_adaptive_dt_roundtrip():
+    cfg = SimulationConfig(adaptive_dt=True, dt_min=0.01, dt_max=0.3, dt_safety=0.1)
+    loaded = SimulationConfig.from_dict(cfg.to_dict())
+    assert loaded.adaptive_dt is True
+    assert (loaded.dt_min, loaded.dt_max, loaded.dt_safety) == (0.01, 0.3, 0.1)
+
+
+def test_sleep_roundtrip():
+    cfg = SimulationConfig(sleep_steps=30, sleep_speed=0.1, sleep_force=0.2)
+    loaded = SimulationConfig.from_dict(cfg.to_dict())
+    assert (loaded.sleep_steps, loaded.sleep_speed, loaded.sleep_force) == (30, 0.1, 0.2)
+    assert SimulationConfig.from_dict({}).sleep_steps == 0
+
+
+def test_deterministic_roundtrip():
+    cfg = SimulationConfig(deterministic=True, seed=99)
+    loaded = SimulationConfig.from_dict(cfg.to_dict())
+    assert loaded.deterministic is True and loaded.seed == 99
+    assert SimulationConfig.from_dict({}).deterministic is False
+    assert SimulationConfig.from_dict({}).seed is None
@@ -0,0 +1,126 @@
+import time
+import numpy as np
+from src.simulation_config import SimulationConfig
+from src.particle_system import ParticleSystem
+from src.streaming import StreamServer, StreamClient, quantize, dequantize, encode_keyframe, encode_delta, _Frame
+
+def _frame(seq, xs, ys, width=800.0, height=600.0):
+    n = len(xs)
+    return _Frame(seq, seq, width, height, np.arange(n), np.zeros(n, dtype=np.int32),
+                  quantize(xs, width), quantize(ys, height))
+
+def _wait_for_clients(server, count):
+    end = time.monotonic() + 5.0
+    while server.clients != count and time.monotonic() < end:
+        time.sleep(0.01)
+    assert server.clients == count
+
+def test_quantize_round_trip_and_wrap():
+    xs = np.array([0.0, 0.004, 123.456, 799.99, 800.0])
+    back = dequantize(quantize(xs, 800.0), 800.0)
+    assert np.all(np.abs(back[:4] - xs[:4]) <= 800.0 / 65536)
+    # the world edge is the same point as 0
+    assert back[4] == 0.0
+
+def test_small_motion_deltas_are_much_smaller_than_keyframes():
+    rng = np.random.default_rng(0)
+    xs, ys = rng.uniform(0, 800, 10000), rng.uniform(0, 600, 10000)
+    base = _frame(1, xs, ys)
+    moved = _frame(2, (xs + rng.normal(0, 0.2, 10000)) % 800, (ys + rng.normal(0, 0.2, 10000)) % 600)
+    keyframe = encode_keyframe(moved)
+    delta = encode_delta(base, moved)
+    assert len(delta) < len(keyframe) / 3
+    # under a byte per coordinate
+    assert len(delta) < 10000 * 2
+
+def test_client_reconstructs_keyframes_and_deltas():
+    rng = np.random.default_rng(1)
+    with StreamServer(colors=["red", "blue"]) as server:
+        client = StreamClient(*server.address)
+        assert client.colors == ["red", "blue"]
+        _wait_for_clients(server, 1)
+        xs, ys = rng.uniform(0, 100, 50), rng.uniform(0, 50, 50)
+        # published out of id order, as after a spatial sort
+        ids = rng.permutation(50)
+        types = ids % 3
+        for step in range(5):
+            server.publish(xs, ys, types, ids, step, 100.0, 50.0)
+            frame = client.read()
+            order = np.argsort(ids)
+            assert frame.step == step and (frame.width, frame.height) == (100.0, 50.0)
+            assert np.array_equal(frame.ids, np.arange(50))
+            assert np.array_equal(frame.types, types[order])
+            assert np.all(np.abs(frame.xs - xs[order]) <= 100.0 / 65536)
+            assert np.all(np.abs(frame.ys - ys[order]) <= 50.0 / 65536)
+            # particles keep crossing the right edge
+            xs = (xs + 7.3) % 100.0
+        assert (client.keyframes, client.deltas) == (1, 4)
+        # a changed particle set needs a keyframe
+        server.publish(xs[:40], ys[:40], types[:40], ids[:40], 5, 100.0, 50.0)
+        frame = client.read()
+        assert len(frame.xs) == 40 and client.keyframes == 2
+        client.close()
+
+def test_slow_client_skips_to_the_newest_frame():
+    rng = np.random.default_rng(2)
+    n = 50000
+    ids = np.arange(n)
+    types = np.zeros(n, dtype=np.int32)
+    with StreamServer() as server:
+        client = StreamClient(*server.address)
+        _wait_for_clients(server, 1)
+        # the client reads nothing while the frames come in
+        for step in range(100):
+            xs, ys = rng.uniform(0, 800, n), rng.uniform(0, 600, n)
+            server.publish(xs, ys, types, ids, step, 800.0, 600.0)
+        steps = []
+        frame = client.read()
+        steps.append(frame.step)
+        while frame.step != 99:
+            frame = client.read()
+            steps.append(frame.step)
+        assert steps == sorted(steps) and len(steps) < 100
+        assert server.stats()["skipped"] > 0
+        # deltas across skipped frames still add up to the newest positions
+        assert np.array_equal(quantize(frame.xs, 800.0), quantize(xs, 800.0))
+        assert np.array_equal(quantize(frame.ys, 600.0), quantize(ys, 600.0))
+        client.close()
+
+def test_disconnected_clients_leave_no_threads_behind():
+    xs = np.zeros(5)
+    with StreamServer() as server:
+        for step in range(3):
+            client = StreamClient(*server.address)
+            _wait_for_clients(server, 1)
+            client.close()
+            # the client thread notices with the next frame
+            server.publish(xs, xs, np.zeros(5, dtype=np.int32), np.arange(5), step, 10.0, 10.0)
+            _wait_for_clients(server, 0)
+        end = time.monotonic() + 5.0
+        while server._threads and time.monotonic() < end:
+            time.sleep(0.01)
+        assert server._threads == []
+
+def test_particle_system_streams_every_n_steps():
+    config = SimulationConfig(seed=3)
+    system = ParticleSystem([], config, 120, 80)
+    system.add_particles(40, [0, 1])
+    host, port = system.serve_stream(every=2)
+    try:
+        client = StreamClient(host, port)
+        assert client.colors == config.particle_colors
+        assert client.read().step == 0
+        system.update_system(0.05)
+        system.update_system(0.05)
+        assert client.read().step == 2
+        system.update_system(0.05)
+        system.update_system(0.05)
+        frame = client.read()
+        order = np.argsort(system.particles.ids)
+        assert frame.step == 4
+        assert np.all(np.abs(frame.xs - system.particles.xs[order]) <= 120.0 / 65536 + 1e-4)
+        assert np.array_equal(frame.types, system.particles.types[order])
+        client.close()
+    finally:
+        system.stop_streaming()
+    system.update_system(0.05)
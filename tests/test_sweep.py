@@ -0,0 +1,74 @@
+import json
+import pytest
+from src.sweep import preset_matrices, random_matrices, sweep_grid, run_one, run_sweep, completed_runs, main
+
+def _small_grid(**options):
+    settings = dict(particles=30, steps=3, dt=0.05, width=100, height=100)
+    settings.update(options)
+    return sweep_grid(random_matrices(2, seed=5), [20.0, 30.0], [0.3], [0.1], [0, 1], **settings)
+
+def test_preset_matrices_loads_repo_presets():
+    presets = preset_matrices()
+    assert "preset:Chaos" in presets
+    assert presets["preset:Chaos"]["interaction_matrix"][0][1] == -0.3
+
+def test_random_matrices_are_reproducible():
+    first = random_matrices(3, seed=7)
+    again = random_matrices(3, seed=7)
+    other = random_matrices(3, seed=8)
+    assert list(first) == ["random:7:0", "random:7:1", "random:7:2"]
+    assert first == again
+    assert first["random:7:0"]["interaction_matrix"] != other["random:8:0"]["interaction_matrix"]
+    values = [v for row in first["random:7:1"]["interaction_matrix"] for v in row]
+    assert all(-1.0 <= v <= 1.0 for v in values)
+
+def test_sweep_grid_is_the_full_product_with_stable_ids():
+    runs = _small_grid()
+    assert len(runs) == 2 * 2 * 1 * 1 * 2
+    assert len({run["run_id"] for run in runs}) == len(runs)
+    assert [run["run_id"] for run in runs] == [run["run_id"] for run in _small_grid()]
+    # other run settings are other runs
+    assert runs[0]["run_id"] != _small_grid(steps=4)[0]["run_id"]
+    # seeds vary fastest, matrices slowest
+    assert (runs[1]["config"]["interaction_radius"], runs[1]["config"]["seed"]) == (20.0, 1)
+    assert (runs[2]["config"]["interaction_radius"], runs[2]["config"]["seed"]) == (30.0, 0)
+    assert runs[4]["matrix"] == "random:5:1"
+
+def test_run_one_reports_metrics():
+    run = _small_grid()[0]
+    result = run_one(run)
+    assert result["run_id"] == run["run_id"] and "config" not in result
+    assert set(result["metrics"]) >= {"mean_speed", "kinetic_energy", "clustering"}
+    assert result["metrics"]["kinetic_energy"] >= 0.0
+    assert run_one(run)["metrics"] == result["metrics"]
+
+def test_run_sweep_streams_results_and_skips_completed(tmp_path):
+    path = str(tmp_path / "results.jsonl")
+    runs = _small_grid()
+    seen = []
+    assert run_sweep(runs[:3], path, processes=2, progress=lambda r, k, n: seen.append((k, n))) == 3
+    assert seen[-1] == (3, 3)
+    # a sweep killed mid-write leaves a cut-off line behind
+    with open(path, "a", encoding="utf-8") as f:
+        f.write('{"run_id": "cut')
+    assert completed_runs(path) == {run["run_id"] for run in runs[:3]}
+    assert run_sweep(runs, path, processes=2) == len(runs) - 3
+    assert run_sweep(runs, path, processes=2) == 0
+    assert completed_runs(path) == {run["run_id"] for run in runs}
+
+def test_failed_runs_are_recorded_and_retried(tmp_path):
+    path = str(tmp_path / "results.jsonl")
+    run = _small_grid()[0]
+    run["config"]["integrator"] = "unknown"
+    assert run_sweep([run], path, processes=1) == 1
+    with open(path, encoding="utf-8") as f:
+        record = json.loads(f.readline())
+    assert "error" in record
+    assert completed_runs(path) == set()
+
+def test_main_runs_presets(tmp_path, capsys):
+    path = str(tmp_path / "out.jsonl")
+    executed = main(["--particles", "10", "--steps", "1", "--processes", "2", "--out", path])
+    assert executed == len(preset_matrices())
+    assert main(["--particles", "10", "--steps", "1", "--out", path]) == 0
+    assert "already in" in capsys.readouterr().out
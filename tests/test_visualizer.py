@@ -127,4 +127,56 @@ def test_resize_event(viz_system):
     viz_system._handle_events()
     
     assert viz_system.width == 1000
-    assert viz_system.height == 800
\ No newline at end of file
+    assert viz_system.height == 800
+
+
+def test_threaded_draws_physics_snapshot(monkeypatch):
+    """With threaded physics the particles are drawn from the published snapshot."""
+    pygame.init()
+    config = SimulationConfig()
+    system = ParticleSystem([], config, 800, 600)
+    system.add_particles(10, [0])
+    viz = Visualizer(system, 800, 600, threaded=True)
+    drawn = []
+    monkeypatch.setattr(pygame.draw, "circle", lambda surface, color, pos, *args, **kwargs: drawn.append(pos))
+    monkeypatch.setattr(pygame.display, "flip", lambda *args, **kwargs: None)
+    snapshot = viz.physics.latest()
+    viz._draw_particles_with_trails()
+    assert drawn[:10] == list(zip(snapshot.xs.astype(int).tolist(), snapshot.ys.astype(int).tolist()))
+
+    # a reset goes through hold() and is published right away
+    viz.initial_particle_count = 4
+    viz._reset_particles()
+    assert len(viz.physics.latest().xs) == 4
+    pygame.quit()
+
+
+def test_selection_is_read_under_the_physics_hold(monkeypatch):
+    """With threaded physics the selected particle is read between ticks, once per frame."""
+    pygame.init()
+    system = ParticleSystem([], SimulationConfig(), 800, 600)
+    system.add_particles(10, [0])
+    viz = Visualizer(system, 800, 600, threaded=True)
+    monkeypatch.setattr(pygame.display, "flip", lambda *args, **kwargs: None)
+    holds = []
+    hold = viz.physics.hold
+    monkeypatch.setattr(viz.physics, "hold", lambda: holds.append(True) or hold())
+    p = system.particles[3]
+    viz.selected_particle = p
+    viz._draw()
+    assert holds == [True]
+    assert viz._selected[:3] == (p.particle_type, p.position_x, p.position_y)
+    pygame.quit()
+
+
+def test_visualizer_opts_into_substeps():
+    """Plain configs take dt as given, the interactive loop splits long frames."""
+    pygame.init()
+    system = ParticleSystem([], SimulationConfig(), 800, 600)
+    assert system.config.max_substep == 0.0
+    Visualizer(system, 800, 600)
+    assert system.config.max_substep == 0.05
+    system.config.max_substep = 0.02
+    Visualizer(system, 800, 600, max_substep=None)
+    assert system.config.max_substep == 0.02
+    pygame.quit()